@@ -0,0 +1,465 @@
+"""Versioned on-disk artifact store for the trained models.
+
+An artifact bundles everything `lifespan` needs to serve requests: the XGBoost
+model, rank_map, cached stats, district aggregates, the cleaned dataset and the
+model comparison payload. Artifacts are keyed by a content hash of the CSV plus
+the hyperparameters in model.py, so workers only retrain on a hash miss. Once
+`train.py --tune` has written <artifact_dir>/TUNED (tuning.py), its XGBoost
+and RF hyperparameters replace the model.py defaults for every artifact built
+in that directory, and so for the model `lifespan` serves.
+
+Each artifact also records how it was trained (cleaning parameters, the byte
+length and hash of the CSV it saw, per-district running sums), which lets
+incremental.py continue it on rows appended to the CSV later.
+
+Layout: <artifact_dir>/<version>/{model.json, trees.npz, metadata.json, dataset.pkl}
+(trees.npz is the XGBoost model flattened to NumPy arrays, see native.py), plus
+an optional grid/ of precomputed predictions added by `train.py --grid` (grid.py)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+import pandas as pd
+
+from dataset import file_sha256
+from grid import PredictionGrid, load_grid
+from model import MODEL_PARAMS, TRAIN_CHUNKSIZE, TrainingSession
+from native import TreeEnsemble, export_xgb
+
+if TYPE_CHECKING:
+    from xgboost import XGBRegressor
+
+# Bump when the on-disk layout changes so stale artifacts are ignored
+ARTIFACT_FORMAT = 7
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(__file__), "data", "apartments.csv")
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "artifacts")
+# A build lock whose file was not touched for this long is taken over (its holder died);
+# the holder touches it every BUILD_LOCK_TIMEOUT_S / 10 while it trains
+BUILD_LOCK_TIMEOUT_S = 600
+# Pointer file naming the most recently published version (watched by running workers)
+LATEST_FILE = "LATEST"
+# Best hyperparameters found by tuning.py (JSON), applied to every later build
+TUNED_FILE = "TUNED"
+
+
+@dataclass
+class Artifact:
+    version: str
+    model: Optional[XGBRegressor]  # None when loaded with with_model=False (native serving)
+    r2: float
+    rank_map: dict[str, float]
+    df_clean: pd.DataFrame
+    stats: dict
+    district_data: list[dict]
+    comparison: dict
+    # {"districts": {name: sums}, "total": sums}, see listing_sums
+    district_sums: dict = field(default_factory=dict)
+    # mode ("full" / "incremental"), parent, steps, segments, split (test-split rule:
+    # "per_segment" train_test_split or "row_hash", see incremental.py), cleaning params, source,
+    # appended (incremental only: rows read / kept after cleaning in the last step),
+    # seconds (wall time per training phase: read, clean, engineer, split, fit_<model>, total),
+    # params (MODEL_PARAMS shape), tuning (cross-validation summary, None when untuned),
+    # xgb (XGB_* options with their fit time / R² tradeoff, see TrainingSession.xgb_report)
+    # and, for incremental artifacts, inherited (full build the comparison table comes from)
+    training: dict = field(default_factory=dict)
+    # model exported for the NumPy evaluator and its feature importances
+    # (FEATURE_COLS order); derived from model unless loaded from disk
+    trees: Optional[TreeEnsemble] = None
+    feature_importances: Optional[list[float]] = None
+    # precomputed prediction grid (memory-mapped), when one was built for this version
+    grid: Optional[PredictionGrid] = None
+
+    def __post_init__(self):
+        if self.trees is None:
+            self.trees = export_xgb(self.model.get_booster())
+        if self.feature_importances is None:
+            self.feature_importances = [float(v) for v in self.model.feature_importances_]
+
+
+def read_tuned(artifact_dir: str = DEFAULT_ARTIFACT_DIR) -> Optional[dict]:
+    """The TUNED record written by tuning.py, or None if the directory was never tuned."""
+    try:
+        with open(os.path.join(artifact_dir, TUNED_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def publish_tuned(tuned: dict, artifact_dir: str = DEFAULT_ARTIFACT_DIR) -> None:
+    """Write the TUNED record (atomic replace)."""
+    os.makedirs(artifact_dir, exist_ok=True)
+    tmp = os.path.join(artifact_dir, f".{TUNED_FILE}.{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(tuned, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(artifact_dir, TUNED_FILE))
+
+
+def model_params(tuned: Optional[dict]) -> dict:
+    """MODEL_PARAMS with the tuned hyperparameters of each tuned model swapped in."""
+    if tuned is None:
+        return MODEL_PARAMS
+    return {**MODEL_PARAMS, **tuned["params"]}
+
+
+def artifact_version(csv_path: str, params: dict = MODEL_PARAMS) -> str:
+    """Cache key: CSV content hash + hyperparameters + artifact format."""
+    digest = hashlib.sha256()
+    digest.update(file_sha256(csv_path).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(str(ARTIFACT_FORMAT).encode())
+    return digest.hexdigest()[:16]
+
+
+def summarize_dataset(df_clean: pd.DataFrame, r2: float) -> tuple[dict, list[dict]]:
+    """Build the cached /api/stats payload and per-district aggregates."""
+    stats = {
+        "total_listings": len(df_clean),
+        "avg_price": float(df_clean["gia"].mean()),
+        "avg_price_per_m2": float(df_clean["gia_m2"].mean()),
+        "num_districts": int(df_clean["quan"].nunique()),
+        "model_r2_score": round(r2, 4),
+    }
+    district_agg = df_clean.groupby("quan", observed=True).agg(
+        avg_price=("gia", "mean"),
+        avg_price_m2=("gia_m2", "mean"),
+        count=("gia", "count"),
+    ).reset_index()
+    district_data = [
+        {"name": row["quan"], "avg_price": round(row["avg_price"]), "avg_price_m2": round(row["avg_price_m2"], 2), "count": int(row["count"])}
+        for _, row in district_agg.sort_values("avg_price", ascending=False).iterrows()
+    ]
+    return stats, district_data
+
+
+def listing_sums(df_clean: pd.DataFrame) -> dict:
+    """Running sums behind rank_map and the stats/district aggregates.
+
+    Sums of disjoint row sets add up (see merge_sums), so appended listings
+    update the aggregates without another groupby over the whole dataset.
+    """
+    gia_m2 = df_clean["gia_m2"]
+    frame = pd.DataFrame({
+        "quan": df_clean["quan"],
+        "gia_m2": gia_m2.fillna(0.0),
+        "gia_m2_count": gia_m2.notna().astype("float64"),
+        "gia": df_clean["gia"],
+        "count": 1.0,
+    })
+    by_district = frame.groupby("quan", observed=True).sum()
+    return {
+        "districts": {name: row.to_dict() for name, row in by_district.iterrows()},
+        "total": frame.drop(columns="quan").sum().to_dict(),
+    }
+
+
+def merge_sums(a: dict, b: dict) -> dict:
+    def add(x: dict, y: dict) -> dict:
+        return {key: x.get(key, 0.0) + y.get(key, 0.0) for key in (*x, *y)}
+
+    districts = dict(a["districts"])
+    for name, sums in b["districts"].items():
+        districts[name] = add(districts.get(name, {}), sums)
+    return {"districts": districts, "total": add(a["total"], b["total"])}
+
+
+def rank_map_from_sums(sums: dict) -> dict[str, float]:
+    """Mean gia_m2 per district (same as the groupby in engineer_features)."""
+    return {
+        name: s["gia_m2"] / s["gia_m2_count"] if s["gia_m2_count"] else float("nan")
+        for name, s in sums["districts"].items()
+    }
+
+
+def summarize_sums(sums: dict, r2: float) -> tuple[dict, list[dict]]:
+    """summarize_dataset from running sums instead of a pass over df_clean."""
+    districts, total = sums["districts"], sums["total"]
+    rank_map = rank_map_from_sums(sums)
+    stats = {
+        "total_listings": int(total["count"]),
+        "avg_price": total["gia"] / total["count"],
+        "avg_price_per_m2": total["gia_m2"] / total["gia_m2_count"],
+        "num_districts": len(districts),
+        "model_r2_score": round(r2, 4),
+    }
+    district_data = [
+        {
+            "name": name,
+            "avg_price": round(s["gia"] / s["count"]),
+            "avg_price_m2": round(rank_map[name], 2),
+            "count": int(s["count"]),
+        }
+        for name, s in sorted(districts.items(), key=lambda item: item[1]["gia"] / item[1]["count"], reverse=True)
+    ]
+    return stats, district_data
+
+
+def build_artifact(csv_path: str, version: Optional[str] = None, tuned: Optional[dict] = None) -> Artifact:
+    """Run the full training pipeline (with the tuned hyperparameters, if any) and bundle the results."""
+    start = time.perf_counter()
+    params = model_params(tuned)
+    version = version or artifact_version(csv_path, params)
+    source = {"bytes": os.path.getsize(csv_path), "sha256": file_sha256(csv_path)}
+    if TRAIN_CHUNKSIZE > 0:
+        from streaming import StreamingSession  # streaming imports model, training-only
+
+        session = StreamingSession(csv_path, TRAIN_CHUNKSIZE, params)
+    else:
+        session = TrainingSession(csv_path, params=params)
+    comparison = session.comparison()  # fits all four models, including the serving XGBoost
+    model, r2 = session.serving_model()
+    if TRAIN_CHUNKSIZE > 0:  # aggregates from the feature store's running sums
+        sums = session.listing_sums()
+        stats, district_data = summarize_sums(sums, r2)
+    else:
+        sums = listing_sums(session.df_clean)
+        stats, district_data = summarize_dataset(session.df_clean, r2)
+    training = {
+        "mode": "full",
+        "parent": None,
+        "steps": 0,
+        "segments": [int(sums["total"]["count"])],
+        # how rows were assigned to the test split, reused by incremental steps
+        "split": "row_hash" if TRAIN_CHUNKSIZE > 0 else "per_segment",
+        "cleaning": session.cleaning,
+        "source": {"rows": session.source_rows, **source},
+        "seconds": {
+            **session.seconds,
+            **{f"fit_{key}": seconds for key, seconds in session.fit_seconds.items()},
+            "total": time.perf_counter() - start,
+        },
+        "params": params,
+        "tuning": None if tuned is None else tuned["cv"],
+        "xgb": session.xgb_report(),
+    }
+    return Artifact(
+        version, model, float(r2), session.rank_map, session.df_clean, stats, district_data, comparison,
+        sums, training,
+    )
+
+
+def artifact_metadata(artifact: Artifact) -> dict:
+    """JSON-serializable fields of an artifact (everything but the model, dataset and arrays)."""
+    return {
+        "r2": artifact.r2,
+        "rank_map": artifact.rank_map,
+        "stats": artifact.stats,
+        "district_data": artifact.district_data,
+        "comparison": artifact.comparison,
+        "district_sums": artifact.district_sums,
+        "training": artifact.training,
+        "feature_importances": artifact.feature_importances,
+    }
+
+
+def artifact_from_metadata(
+    version: str, meta: dict, model: Optional[XGBRegressor], df_clean: pd.DataFrame,
+    trees: TreeEnsemble, grid: Optional[PredictionGrid] = None,
+) -> Artifact:
+    """Inverse of artifact_metadata, given the parts stored outside the metadata."""
+    return Artifact(
+        version, model, meta["r2"], meta["rank_map"], df_clean,
+        meta["stats"], meta["district_data"], meta["comparison"],
+        meta["district_sums"], meta["training"], trees, meta["feature_importances"], grid,
+    )
+
+
+def save_artifact(artifact: Artifact, artifact_dir: str = DEFAULT_ARTIFACT_DIR) -> str:
+    """Write an artifact atomically (temp dir + rename). Returns its directory."""
+    target = os.path.join(artifact_dir, artifact.version)
+    if os.path.isdir(target):
+        return target
+    os.makedirs(artifact_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{artifact.version}-", dir=artifact_dir)
+    try:
+        os.chmod(tmp, 0o755)
+        artifact.model.save_model(os.path.join(tmp, "model.json"))
+        artifact.trees.save(os.path.join(tmp, "trees.npz"))
+        artifact.df_clean.to_pickle(os.path.join(tmp, "dataset.pkl"))
+        metadata = {
+            "version": artifact.version,
+            "format": ARTIFACT_FORMAT,
+            "created_at": time.time(),
+            **artifact_metadata(artifact),
+        }
+        with open(os.path.join(tmp, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        os.rename(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(target):  # lost a race to another worker -> fine
+            raise
+    return target
+
+
+def load_artifact(version: str, artifact_dir: str = DEFAULT_ARTIFACT_DIR, with_model: bool = True) -> Optional[Artifact]:
+    """Load a stored artifact, or None if it does not exist.
+
+    with_model=False skips model.json and never imports xgboost; the artifact
+    can then only be served through its NumPy export (SERVING_BACKEND=native).
+    """
+    path = os.path.join(artifact_dir, version)
+    meta_path = os.path.join(path, "metadata.json")
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != ARTIFACT_FORMAT:
+        return None
+    model = None
+    if with_model:
+        from xgboost import XGBRegressor
+
+        model = XGBRegressor()
+        model.load_model(os.path.join(path, "model.json"))
+    df_clean = pd.read_pickle(os.path.join(path, "dataset.pkl"))
+    trees = TreeEnsemble.load(os.path.join(path, "trees.npz"))
+    return artifact_from_metadata(version, meta, model, df_clean, trees, load_grid(version, artifact_dir))
+
+
+def publish_latest(version: str, artifact_dir: str = DEFAULT_ARTIFACT_DIR) -> None:
+    """Point LATEST at a saved artifact (atomic replace)."""
+    tmp = os.path.join(artifact_dir, f".{LATEST_FILE}.{os.getpid()}")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(artifact_dir, LATEST_FILE))
+
+
+def read_latest(artifact_dir: str = DEFAULT_ARTIFACT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(artifact_dir, LATEST_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_prebuilt(
+    csv_path: str = DEFAULT_CSV_PATH, artifact_dir: str = DEFAULT_ARTIFACT_DIR, with_model: bool = True,
+) -> Artifact:
+    """Serving-only startup: the LATEST artifact, else the one matching the CSV. Never trains."""
+    version = read_latest(artifact_dir) or artifact_version(csv_path, model_params(read_tuned(artifact_dir)))
+    artifact = load_artifact(version, artifact_dir, with_model)
+    if artifact is None:
+        raise RuntimeError(f"No prebuilt artifact {version} in {artifact_dir}; run train.py first")
+    return artifact
+
+
+def _acquire_build_lock(lock_path: str) -> Optional[str]:
+    """Try to create the build lock file; returns its owner token, or None if held.
+
+    Stale locks (not touched for BUILD_LOCK_TIMEOUT_S) are taken over.
+    """
+    token = f"{os.getpid()}:{uuid.uuid4().hex}"
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            stale = time.time() - os.path.getmtime(lock_path) > BUILD_LOCK_TIMEOUT_S
+            if stale:
+                os.remove(lock_path)
+        except FileNotFoundError:  # released (or taken over) meanwhile
+            stale = True
+        return _acquire_build_lock(lock_path) if stale else None
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    return token
+
+
+def _owns_build_lock(lock_path: str, token: str) -> bool:
+    try:
+        with open(lock_path) as f:
+            return f.read() == token
+    except FileNotFoundError:
+        return False
+
+
+def _refresh_build_lock(lock_path: str, token: str, done: threading.Event) -> None:
+    """Touch the lock until `done` so a long build is never taken for a dead one."""
+    while not done.wait(BUILD_LOCK_TIMEOUT_S / 10):
+        if not _owns_build_lock(lock_path, token):
+            return
+        try:
+            os.utime(lock_path)
+        except FileNotFoundError:
+            return
+
+
+def _release_build_lock(lock_path: str, token: str) -> None:
+    """Remove the lock only if it is still ours (it may have been taken over)."""
+    if _owns_build_lock(lock_path, token):
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def load_or_build(
+    csv_path: str = DEFAULT_CSV_PATH,
+    artifact_dir: str = DEFAULT_ARTIFACT_DIR,
+    force: bool = False,
+    base: Optional[Artifact] = None,
+) -> tuple[Artifact, bool]:
+    """Load the artifact matching the CSV + hyperparameters (tuned ones if any), training on a miss.
+
+    With `base`, that artifact is returned as is if it already covers the
+    whole CSV; otherwise a miss first tries to continue it on the rows
+    appended since it was trained (stored under its own incremental version,
+    see incremental.py), falling back to a full build.
+    Returns (artifact, built). Only one process trains at a time; other workers
+    wait for the lock holder to publish the artifact and then load it.
+    """
+    tuned = read_tuned(artifact_dir)
+    version = artifact_version(csv_path, model_params(tuned))
+    if not force:
+        if (
+            base is not None and base.training.get("source", {}).get("sha256") == file_sha256(csv_path)
+            and base.training.get("params") == model_params(tuned)
+        ):
+            return base, False  # base (e.g. an incremental artifact) already covers the whole CSV
+        artifact = load_artifact(version, artifact_dir)
+        if artifact is not None:
+            return artifact, False
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    lock_path = os.path.join(artifact_dir, f".{version}.lock")
+    while (token := _acquire_build_lock(lock_path)) is None:
+        time.sleep(0.5)
+        artifact = None if force else load_artifact(version, artifact_dir)
+        if artifact is not None:
+            return artifact, False
+    done = threading.Event()
+    threading.Thread(
+        target=_refresh_build_lock, args=(lock_path, token, done), name="build-lock", daemon=True,
+    ).start()
+    try:
+        if force:
+            shutil.rmtree(os.path.join(artifact_dir, version), ignore_errors=True)
+        else:
+            # Another worker may have finished between our miss and the lock
+            artifact = load_artifact(version, artifact_dir)
+            if artifact is not None:
+                return artifact, False
+        artifact = None
+        if base is not None:
+            from incremental import update_artifact  # incremental imports this module
+
+            artifact = update_artifact(base, csv_path, model_params(tuned), artifact_dir)
+            if artifact is not None and os.path.isdir(os.path.join(artifact_dir, artifact.version)):
+                return artifact, False  # another worker already continued base on the same rows
+        if artifact is None:
+            artifact = build_artifact(csv_path, version, tuned)
+        save_artifact(artifact, artifact_dir)
+        return artifact, True
+    finally:
+        done.set()
+        _release_build_lock(lock_path, token)
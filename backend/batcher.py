@@ -0,0 +1,83 @@
+"""Dynamic micro-batching for concurrent single /api/predict calls.
+
+Requests that arrive within `max_wait_us` of each other are queued on the
+event loop and scored together with one vectorized booster call (at most
+`max_rows` rows per call), then each awaiting request gets its own price back.
+A batch never mixes model versions: a request for a different serving
+snapshot flushes the pending batch first. Errors from the batch call (e.g. a
+saturated inference executor) are raised in every request of the batch.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+
+class MicroBatcher:
+    """Collects single-row predictions into batches scored by `run_batch(key, rows)`."""
+
+    def __init__(
+        self, run_batch: Callable[[Any, list[dict]], Awaitable[Any]],
+        max_wait_us: int, max_rows: int,
+    ):
+        self.run_batch = run_batch
+        self.max_wait = max_wait_us / 1e6
+        self.max_rows = max_rows
+        self.batches = 0
+        self.rows = 0
+        self.full_batches = 0  # flushed by max_rows rather than the timer
+        self._key: Any = None
+        self._rows: list[dict] = []
+        self._futures: list[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def predict(self, key: Any, row: dict) -> float:
+        """Queue one encode_batch row for the model identified by `key`; returns its price."""
+        if self._rows and key is not self._key:
+            self._flush()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._key = key
+        self._rows.append(row)
+        self._futures.append(future)
+        if len(self._rows) >= self.max_rows:
+            self.full_batches += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._rows:
+            return
+        key, rows, futures = self._key, self._rows, self._futures
+        self._key, self._rows, self._futures = None, [], []
+        self.batches += 1
+        self.rows += len(rows)
+        asyncio.get_running_loop().create_task(self._score(key, rows, futures))
+
+    async def _score(self, key: Any, rows: list[dict], futures: list[asyncio.Future]) -> None:
+        try:
+            prices = await self.run_batch(key, rows)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, price in zip(futures, prices):
+            if not future.done():  # the client may have gone away
+                future.set_result(float(price))
+
+    def stats(self) -> dict:
+        return {
+            "max_wait_us": round(self.max_wait * 1e6),
+            "max_rows": self.max_rows,
+            "batches": self.batches,
+            "rows": self.rows,
+            "full_batches": self.full_batches,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else None,
+        }
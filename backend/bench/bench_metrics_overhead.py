@@ -0,0 +1,95 @@
+"""Cost of the /metrics instrumentation on the hot endpoints.
+
+Runs the app in-process (httpx ASGI transport) in two child interpreters, one
+with METRICS_ENABLED=0 and one with METRICS_ENABLED=1 (the middleware is
+installed at import time), sending sequential /api/predict (result cache off)
+and /api/chart-data requests. Reports the mean time per request in both runs
+and, from the instrumented run, the mean of each /api/predict stage as
+scraped from /metrics.
+
+Usage (from backend/):
+    python bench/bench_metrics_overhead.py [--requests 3000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ("/api/predict", "/api/chart-data")
+
+
+async def drive(n: int) -> dict:
+    import httpx
+
+    import main as app
+    from bench_micro_batching import random_requests
+
+    async with app.lifespan(app.app):
+        bodies = random_requests(n, list(app.state.district_rank_map))
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            calls = {
+                "/api/predict": lambda i: client.post("/api/predict", json=bodies[i]),
+                "/api/chart-data": lambda i: client.get("/api/chart-data"),
+            }
+            result = {}
+            for route, call in calls.items():
+                for i in range(min(200, n)):  # warm-up
+                    await call(i)
+                start = time.perf_counter()
+                for i in range(n):
+                    await call(i)
+                result[route] = (time.perf_counter() - start) / n
+            result["metrics"] = (await client.get("/metrics")).text
+    return result
+
+
+def stage_means(text: str, route: str) -> dict[str, float]:
+    sums, counts = {}, {}
+    pattern = re.compile(rf'api_stage_duration_seconds_(sum|count){{route="{re.escape(route)}",stage="(\w+)"}} (\S+)')
+    for kind, stage, value in pattern.findall(text):
+        (sums if kind == "sum" else counts)[stage] = float(value)
+    return {stage: sums[stage] / counts[stage] for stage in sums if counts.get(stage)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, BACKEND_DIR)
+        print(json.dumps(asyncio.run(drive(args.requests))))
+        return
+
+    runs = {}
+    for enabled in ("0", "1"):
+        env = {**os.environ, "METRICS_ENABLED": enabled, "PREDICT_CACHE_SIZE": "0"}
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", "--requests", str(args.requests)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        runs[enabled] = json.loads(out.splitlines()[-1])
+
+    for route in ROUTES:
+        off, on = runs["0"][route], runs["1"][route]
+        print(
+            f"{route:>16}: {off * 1e6:8.1f} us -> {on * 1e6:8.1f} us per request"
+            f"   ({(on - off) * 1e6:+.1f} us, {(on / off - 1) * 100:+.1f}%)"
+        )
+    print("/api/predict stages (mean):")
+    for stage, seconds in stage_means(runs["1"]["metrics"], "/api/predict").items():
+        print(f"  {stage:>15}: {seconds * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
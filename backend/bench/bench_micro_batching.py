@@ -0,0 +1,105 @@
+"""Throughput of concurrent /api/predict calls with and without micro-batching.
+
+Drives the app in-process (httpx ASGI transport, no network) with `--concurrency`
+clients each sending single predictions, first with micro-batching off and then
+with PREDICT_MICROBATCH_WAIT_US / PREDICT_MICROBATCH_ROWS set. Reports
+requests/s, p50/p99 latency and the average batch size; predicted prices must
+be identical in both runs.
+
+Usage (from backend/):
+    python bench/bench_micro_batching.py [--requests 5000] [--concurrency 64] [--wait-us 500] [--rows 64]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["PREDICT_CACHE_SIZE"] = "0"  # measure the model path, not the result cache
+
+import httpx  # noqa: E402
+
+import main as app  # noqa: E402
+from artifacts import load_or_build  # noqa: E402
+from bench_predict_features import NOI_THAT, PHAP_LY  # noqa: E402
+
+
+def random_requests(n: int, districts: list[str], seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "dien_tich": round(float(rng.uniform(21, 300)), 1),
+            "quan": districts[rng.integers(len(districts))],
+            "so_phong": int(rng.integers(1, 6)),
+            "so_wc": int(rng.integers(1, 5)),
+            "noi_that": NOI_THAT[rng.integers(len(NOI_THAT))],
+            "phap_ly": PHAP_LY[rng.integers(len(PHAP_LY))],
+            "khoang_cach_q1_km": round(float(rng.uniform(0, 25)), 1),
+        }
+        for _ in range(n)
+    ]
+
+
+async def drive(requests: list[dict], concurrency: int) -> tuple[float, np.ndarray, list[float], dict]:
+    latencies, prices = np.empty(len(requests)), [0.0] * len(requests)
+    queue = iter(range(len(requests)))
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker() -> None:
+            for i in queue:
+                start = time.perf_counter()
+                response = await client.post("/api/predict", json=requests[i])
+                latencies[i] = time.perf_counter() - start
+                prices[i] = response.json()["predicted_price"]
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+        stats = (await client.get("/api/predict/executor-stats")).json()
+    return elapsed, latencies, prices, stats
+
+
+async def run(wait_us: int, rows: int, requests: list[dict], concurrency: int):
+    app.PREDICT_MICROBATCH_WAIT_US, app.PREDICT_MICROBATCH_ROWS = wait_us, rows
+    app.batcher = None
+    async with app.lifespan(app.app):
+        await drive(requests[:200], concurrency)  # warm-up
+        return await drive(requests, concurrency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--wait-us", type=int, default=500, help="PREDICT_MICROBATCH_WAIT_US for the batched run")
+    parser.add_argument("--rows", type=int, default=64, help="PREDICT_MICROBATCH_ROWS for the batched run")
+    args = parser.parse_args()
+    app.INFERENCE_QUEUE = max(app.INFERENCE_QUEUE, args.concurrency)  # measure throughput, not 503s
+
+    artifact, _ = load_or_build(
+        os.environ.get("APARTMENTS_CSV", app.DEFAULT_CSV_PATH), os.environ.get("ARTIFACT_DIR", app.DEFAULT_ARTIFACT_DIR),
+    )
+    requests = random_requests(args.requests, list(artifact.rank_map))
+    results = {}
+    for label, wait_us in (("unbatched", 0), ("batched", args.wait_us)):
+        elapsed, latencies, prices, stats = asyncio.run(run(wait_us, args.rows, requests, args.concurrency))
+        results[label] = prices
+        batching = stats["micro_batching"]
+        print(
+            f"{label:>10}: {args.requests / elapsed:8.0f} req/s   p50 = {np.percentile(latencies, 50) * 1e3:6.2f} ms"
+            f"   p99 = {np.percentile(latencies, 99) * 1e3:6.2f} ms"
+            + (f"   avg batch {batching['avg_batch_size']}" if batching else "")
+        )
+    if results["unbatched"] != results["batched"]:
+        sys.exit("Prediction mismatch between batched and unbatched runs")
+    print("Parity: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Microbenchmark: pandas feature builder vs FeatureEncoder on the predict hot path.
+
+Times one single-row prediction per call for both paths over the same random
+inputs and reports p50/p99 latency in microseconds. Predictions must match
+exactly, otherwise the script exits non-zero.
+
+Usage (from backend/):
+    python bench/bench_predict_features.py [--n 5000] [--csv data/apartments.csv]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, load_or_build  # noqa: E402
+from model import build_prediction_features, feature_encoder  # noqa: E402
+
+PHAP_LY = ["Dang_cho_so", "Hop_dong_dat_coc", "Hop_dong_mua_ban", "So_hong_rieng", "Khac"]
+NOI_THAT = ["Cao_cap", "Day_du", "Co_ban", "Tho", "Khong_noi_that"]
+
+
+def random_inputs(n: int, rank_map: dict[str, float], seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    ranks = list(rank_map.values())
+    return [
+        {
+            "dien_tich": float(rng.uniform(20, 300)),
+            "so_phong": int(rng.integers(1, 6)),
+            "so_wc": int(rng.integers(1, 5)),
+            "khoang_cach_q1_km": float(rng.uniform(0, 25)),
+            "rank_quan": float(ranks[rng.integers(len(ranks))]),
+            "phap_ly": PHAP_LY[rng.integers(len(PHAP_LY))],
+            "noi_that": NOI_THAT[rng.integers(len(NOI_THAT))],
+        }
+        for _ in range(n)
+    ]
+
+
+def time_calls(fn, inputs: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """Return (latencies_us, predictions) for fn applied to each input."""
+    latencies = np.empty(len(inputs))
+    preds = np.empty(len(inputs))
+    for i, row in enumerate(inputs):
+        start = time.perf_counter()
+        preds[i] = fn(row)
+        latencies[i] = (time.perf_counter() - start) * 1e6
+    return latencies, preds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=5000, help="Predictions per path")
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--artifact-dir", default=os.environ.get("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR))
+    args = parser.parse_args()
+
+    artifact, _ = load_or_build(args.csv, args.artifact_dir)
+    model, booster = artifact.model, artifact.model.get_booster()
+    inputs = random_inputs(args.n, artifact.rank_map)
+
+    paths = {
+        "pandas": lambda r: model.predict(build_prediction_features(**r))[0],
+        "encoder": lambda r: booster.inplace_predict(feature_encoder.encode(**r))[0],
+    }
+    for fn in paths.values():  # warm-up
+        time_calls(fn, inputs[:200])
+
+    results = {name: time_calls(fn, inputs) for name, fn in paths.items()}
+    for name, (lat, _) in results.items():
+        print(f"{name:>8}: p50 = {np.percentile(lat, 50):8.1f} us   p99 = {np.percentile(lat, 99):8.1f} us")
+    base, fast = results["pandas"][0], results["encoder"][0]
+    print(f" speedup: p50 x{np.percentile(base, 50) / np.percentile(fast, 50):.1f}   p99 x{np.percentile(base, 99) / np.percentile(fast, 99):.1f}")
+
+    if not np.array_equal(results["pandas"][1], results["encoder"][1]):
+        diff = np.abs(results["pandas"][1] - results["encoder"][1]).max()
+        sys.exit(f"Prediction mismatch between paths (max abs diff {diff})")
+    print("Parity: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Per-worker memory with and without the shared serving state (serve.py).
+
+Runs the API with --workers uvicorn workers over a synthetic dataset of
+--rows listings twice: as `uvicorn main:app --workers N` (every worker loads
+its own copy of the artifact) and as `serve.py --workers N` (the parent
+publishes the artifact to shared memory once, workers attach to it). After
+all workers started and served a few requests of every endpoint, reads
+/proc/<pid>/smaps_rollup of each worker and the parent:
+
+- RSS counts shared pages in full in every process that maps them,
+- USS (private pages) is what one more worker costs,
+- PSS splits shared pages between the processes mapping them, so the PSS
+  sum over all processes is the memory the server actually uses on the host.
+
+The artifact for the synthetic CSV is built first (once, in --artifact-dir),
+so both runs start warm.
+
+Usage (from backend/):
+    python bench/bench_shared_state.py [--rows 200000] [--workers 4] [--out shared.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, load_or_build  # noqa: E402
+from load_test import Server, _descendants, request, synthetic_csv  # noqa: E402
+
+MODES = {
+    "private": ("-m", "uvicorn", "main:app"),
+    "shared": ("serve.py",),
+}
+PREDICT_BODY = {
+    "dien_tich": 65, "quan": "Quận 7", "so_phong": 2, "so_wc": 2,
+    "noi_that": "Day_du", "phap_ly": "So_hong_rieng", "khoang_cach_q1_km": 7.5,
+}
+
+
+def memory_kb(pid: int) -> dict[str, int]:
+    """Rss / Pss / Uss (private clean + dirty) of one process, in kB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def workers_of(server: Server) -> list[int]:
+    """uvicorn worker processes (spawned children of the server; not the resource tracker)."""
+    pids = []
+    for pid in _descendants(server.process.pid):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"spawn_main" in f.read():
+                    pids.append(pid)
+        except OSError:
+            continue
+    return pids
+
+
+def wait_for_workers(log_path: str, workers: int, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        with open(log_path, errors="replace") as f:
+            if f.read().count("Startup:") >= workers:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"Not all {workers} workers started within {timeout:g}s, see {log_path}")
+
+
+def run(mode: str, csv_path: str, artifact_dir: str, workers: int, requests: int, timeout: float, log_dir: str) -> dict:
+    log_path = os.path.join(log_dir, f"{mode}.log")
+    server = Server(csv_path, artifact_dir, {}, timeout, log_path, MODES[mode], ("--workers", str(workers)))
+    try:
+        wait_for_workers(log_path, workers, timeout)
+        body = json.dumps(PREDICT_BODY).encode()
+        for _ in range(requests):  # a new connection per request, so they spread over the workers
+            for method, path, payload in (
+                ("GET", "/api/stats", None), ("GET", "/api/chart-data", None),
+                ("GET", "/api/chart-data?district=Qu%E1%BA%ADn%207", None), ("POST", "/api/predict", body),
+            ):
+                status, _ = request(server.connect(), method, path, payload)
+                if status != 200:
+                    raise RuntimeError(f"{method} {path} answered {status} in {mode} mode")
+        pids = workers_of(server)
+        per_worker = [memory_kb(pid) for pid in pids]
+        parent = memory_kb(server.process.pid)
+    finally:
+        server.stop()
+    mean = {key: sum(m[key] for m in per_worker) / len(per_worker) / 1024 for key in ("rss", "pss", "uss")}
+    return {
+        "workers": len(pids),
+        "worker_mb": {key: round(value, 1) for key, value in mean.items()},
+        "parent_mb": {key: round(value / 1024, 1) for key, value in parent.items()},
+        "total_pss_mb": round((sum(m["pss"] for m in per_worker) + parent["pss"]) / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="Synthetic listings (0 = use --csv as is)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=50, help="Rounds of requests before measuring")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for the workers")
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--artifact-dir", default=os.environ.get("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR))
+    parser.add_argument("--out", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    csv_path = synthetic_csv(args.csv, args.rows) if args.rows else args.csv
+    artifact, built = load_or_build(csv_path, args.artifact_dir)
+    print(f"Artifact {artifact.version} ({'built' if built else 'cached'}): {len(artifact.df_clean)} rows")
+    del artifact
+
+    results = {"rows": args.rows, "workers": args.workers}
+    with tempfile.TemporaryDirectory() as log_dir:
+        for mode in MODES:
+            results[mode] = run(mode, csv_path, args.artifact_dir, args.workers, args.requests, args.timeout, log_dir)
+            r = results[mode]
+            print(
+                f"{mode:>8}: {r['workers']} workers, per worker RSS {r['worker_mb']['rss']:7.1f} MB,"
+                f" PSS {r['worker_mb']['pss']:7.1f} MB, USS {r['worker_mb']['uss']:7.1f} MB;"
+                f" parent PSS {r['parent_mb']['pss']:6.1f} MB; total PSS {r['total_pss_mb']:7.1f} MB"
+            )
+    private, shared = results["private"], results["shared"]
+    print(
+        f"Shared state saves {private['worker_mb']['uss'] - shared['worker_mb']['uss']:.1f} MB private memory per worker,"
+        f" {private['total_pss_mb'] - shared['total_pss_mb']:.1f} MB in total (PSS)"
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Training time vs accuracy of the XGBoost training options (XGB_* in model.py).
+
+Cleans and splits the dataset once (the CSV, or --rows synthetic listings),
+then fits the serving XGBoost model under each setting in turn, one option
+at a time, and all of them combined:
+
+- tree_method exact / approx / hist, max_bin for hist,
+- nthread 1 vs every core,
+- early stopping on a hold-out of XGB_VALIDATION_FRACTION of the training split,
+- QuantileDMatrix: sketch once, then fit from the prebuilt matrices (what a
+  reused matrix saves each later fit, e.g. every tuning trial on a fold).
+
+For each it reports the best fit time of --repeat runs, the trees kept and the
+test R², next to the default options.
+
+Usage (from backend/):
+    python bench/bench_xgb_training.py [--rows 200000] [--repeat 3] [--out xgb.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_CSV_PATH  # noqa: E402
+from load_test import synthetic_csv  # noqa: E402
+from model import (  # noqa: E402
+    SPLIT_PARAMS, XGB_PARAMS, XGB_VALIDATION_FRACTION, TrainingSession, new_model, train_xgb, xgb_matrices,
+)
+
+CPUS = os.cpu_count() or 1
+
+
+def settings(early_stopping_rounds: int) -> dict[str, dict]:
+    """name -> {"params": XGBRegressor overrides, "early_stopping": rounds, "quantile_dmatrix": bool}."""
+    hist64 = {"tree_method": "hist", "max_bin": 64}
+    return {
+        "default": {},
+        "tree_method=exact": {"params": {"tree_method": "exact"}},
+        "tree_method=approx": {"params": {"tree_method": "approx"}},
+        "hist, max_bin=64": {"params": hist64},
+        "hist, max_bin=1024": {"params": {"tree_method": "hist", "max_bin": 1024}},
+        "nthread=1": {"params": {"n_jobs": 1}},
+        f"early_stopping={early_stopping_rounds}": {"early_stopping": early_stopping_rounds},
+        "quantile_dmatrix (reused)": {"quantile_dmatrix": True},
+        "combined": {"params": hist64, "early_stopping": early_stopping_rounds, "quantile_dmatrix": True},
+    }
+
+
+def run(session: TrainingSession, setting: dict, repeat: int) -> dict:
+    from sklearn.metrics import r2_score
+    from sklearn.model_selection import train_test_split
+
+    params = {**XGB_PARAMS, "n_jobs": CPUS, **setting.get("params", {})}
+    X, y = session.X_train, session.y_train
+    X_val = y_val = None
+    rounds = setting.get("early_stopping", 0)
+    if rounds:
+        X, X_val, y, y_val = train_test_split(X, y, test_size=XGB_VALIDATION_FRACTION, random_state=SPLIT_PARAMS["random_state"])
+    result = {}
+    matrices = None
+    if setting.get("quantile_dmatrix"):
+        start = time.perf_counter()
+        matrices = xgb_matrices(X, y, X_val, y_val, params.get("max_bin"))
+        result["matrix_seconds"] = time.perf_counter() - start
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model = train_xgb(new_model("xgb", params), X, y, X_val, y_val, rounds, matrices)
+        best = min(best, time.perf_counter() - start)
+    r2 = r2_score(session.y_test, model.predict(session.X_test))
+    return {**result, "fit_seconds": best, "trees": model.get_booster().num_boosted_rounds(), "r2": float(r2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="Synthetic listings (0 = use --csv as is)")
+    parser.add_argument("--repeat", type=int, default=3, help="Fits per setting (best time kept)")
+    parser.add_argument("--early-stopping", type=int, default=10, help="Rounds for the early-stopping settings")
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--out", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    csv_path = synthetic_csv(args.csv, args.rows) if args.rows else args.csv
+    session = TrainingSession(csv_path)
+    print(f"{len(session.X_train)} training rows, {len(session.X_test)} test rows, {CPUS} CPUs")
+    results = {}
+    for name, setting in settings(args.early_stopping).items():
+        results[name] = run(session, setting, args.repeat)
+    base = results["default"]
+    print(f"{'setting':<28} {'fit s':>7} {'speedup':>8} {'trees':>6} {'test R²':>8} {'ΔR²':>8}")
+    for name, r in results.items():
+        matrix = f"  (+{r['matrix_seconds']:.2f}s to build the matrices once)" if "matrix_seconds" in r else ""
+        print(
+            f"{name:<28} {r['fit_seconds']:7.2f} {base['fit_seconds'] / r['fit_seconds']:7.2f}x {r['trees']:6d}"
+            f" {r['r2']:8.4f} {r['r2'] - base['r2']:+8.4f}{matrix}"
+        )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"rows": len(session.X_train), "cpus": CPUS, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Check that clean_listings' fused outlier filter matches the notebook's sequential one.
+
+reference_clean_listings below is the notebook pipeline as clean_listings
+implemented it before the fused mask: dropna, IQR filter on gia, IQR filter
+on dien_tich recomputed over the rows left, business rules, each a filtered
+DataFrame copy. Both run on the same raw frames and must return identical
+frames (values, dtypes, categories, index) and identical fitted params:
+
+- the CSV as is, and --rows synthetic listings (see synthetic.py),
+- random samples with NaNs injected into gia / dien_tich / so_wc and values
+  duplicated into ties, including 0-3 row samples,
+- incremental cleaning: params fitted on one half applied to the other.
+
+Also reports wall time and peak traced memory of both on each full dataset.
+
+Usage (from backend/):
+    python bench/check_cleaning_parity.py [--rows 200000] [--samples 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_CSV_PATH  # noqa: E402
+from dataset import read_apartments  # noqa: E402
+from load_test import synthetic_csv  # noqa: E402
+from model import NOI_THAT_MAP, PHAP_LY_MAP, clean_listings  # noqa: E402
+
+
+def reference_clean_listings(df_clean: pd.DataFrame, params: Optional[dict] = None) -> tuple[pd.DataFrame, dict]:
+    """The sequential pipeline (one filtered copy per step)."""
+    def iqr_bounds(values: pd.Series) -> tuple[float, float]:
+        q1 = values.quantile(0.25)
+        q3 = values.quantile(0.75)
+        iqr = q3 - q1
+        return float(q1 - 1.5 * iqr), float(q3 + 1.5 * iqr)
+
+    fit = params is None
+    if fit:
+        params = {"so_wc_median": float(df_clean["so_wc"].median()), "bounds": {}}
+    df_clean["phap_ly"] = df_clean["phap_ly"].map(PHAP_LY_MAP).fillna("Khac").astype("category")
+    df_clean["noi_that"] = df_clean["noi_that"].map(NOI_THAT_MAP).fillna("Khong_noi_that").astype("category")
+    df_clean["so_wc"] = df_clean["so_wc"].fillna(params["so_wc_median"])
+    df_clean = df_clean.dropna(subset=["gia", "dien_tich"])
+    for column in ("gia", "dien_tich"):
+        if fit:
+            params["bounds"][column] = iqr_bounds(df_clean[column])
+        lo, hi = params["bounds"][column]
+        df_clean = df_clean[(df_clean[column] >= lo) & (df_clean[column] <= hi)]
+    df_clean = df_clean[(df_clean["gia"] > 500_000_000) & (df_clean["dien_tich"] > 20)]
+    for col in ("quan", "phap_ly", "noi_that"):
+        df_clean[col] = df_clean[col].cat.remove_unused_categories()
+    return df_clean, params
+
+
+def assert_same(raw: pd.DataFrame, params: Optional[dict] = None, label: str = "") -> int:
+    """Clean copies of raw both ways and compare; returns the cleaned row count."""
+    expected, expected_params = reference_clean_listings(raw.copy(), None if params is None else dict(params))
+    actual, actual_params = clean_listings(raw.copy(), None if params is None else dict(params))
+    try:
+        pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+    except AssertionError as e:
+        raise AssertionError(f"{label}: cleaned frames differ\n{e}") from None
+    # NaN fences (no rows left to fit on) compare unequal to themselves, so compare as strings
+    assert repr(actual_params) == repr(expected_params), f"{label}: params differ: {actual_params} != {expected_params}"
+    return len(actual)
+
+
+def perturbed(raw: pd.DataFrame, n: int, rng: np.random.Generator) -> pd.DataFrame:
+    """n random rows of raw with NaNs and ties injected."""
+    sample = raw.iloc[rng.choice(len(raw), size=min(n, len(raw)), replace=False)].copy()
+    for column, dtype in (("gia", np.float64), ("dien_tich", np.float64), ("so_wc", sample["so_wc"].dtype)):
+        values = sample[column].to_numpy(dtype=dtype, copy=True)
+        values[rng.random(len(values)) < 0.05] = np.nan
+        ties = rng.random(len(values)) < 0.2
+        if ties.any() and len(values):
+            values[ties] = values[rng.integers(len(values))]
+        sample[column] = values
+    return sample
+
+
+def measure(fn, raw: pd.DataFrame, repeat: int = 5) -> tuple[float, int]:
+    """Best wall time of `repeat` runs and peak traced memory of one run."""
+    best = float("inf")
+    for _ in range(repeat):
+        frame = raw.copy()
+        start = time.perf_counter()
+        fn(frame)
+        best = min(best, time.perf_counter() - start)
+    frame = raw.copy()
+    tracemalloc.start()
+    fn(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--rows", type=int, default=200_000, help="Synthetic listings to also check (0 = skip)")
+    parser.add_argument("--samples", type=int, default=200, help="Random perturbed samples to check")
+    args = parser.parse_args()
+
+    sources = {"csv": args.csv}
+    if args.rows:
+        sources[f"synthetic {args.rows}"] = synthetic_csv(args.csv, args.rows)
+    for label, path in sources.items():
+        raw = read_apartments(path)
+        rows = assert_same(raw, label=label)
+        half = len(raw) // 2
+        _, params = clean_listings(raw.iloc[:half].copy())
+        assert_same(raw.iloc[half:], params, label=f"{label}, incremental")
+        seq, seq_peak = measure(reference_clean_listings, raw)
+        fused, fused_peak = measure(clean_listings, raw)
+        print(
+            f"{label}: {len(raw)} -> {rows} rows; sequential {seq * 1e3:7.1f} ms peak {seq_peak / 1e6:6.1f} MB,"
+            f" fused {fused * 1e3:7.1f} ms peak {fused_peak / 1e6:6.1f} MB ({seq / fused:.1f}x)"
+        )
+
+    warnings.filterwarnings("ignore", "Mean of empty slice")  # so_wc median of samples without so_wc
+    raw = read_apartments(args.csv)
+    rng = np.random.default_rng(0)
+    for i in range(args.samples):
+        n = int(rng.integers(0, 4)) if i % 10 == 0 else int(rng.integers(4, len(raw) + 1))
+        sample = perturbed(raw, n, rng)
+        assert_same(sample, label=f"sample {i} ({n} rows)")
+        if n:
+            _, params = clean_listings(perturbed(raw, n, rng))
+            assert_same(sample, params, label=f"sample {i} ({n} rows), incremental")
+    print(f"Parity: OK ({len(sources)} datasets, {args.samples} perturbed samples)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Accuracy and latency of the precomputed prediction grid (grid.py).
+
+Loads the LATEST artifact (or the one matching the CSV) with its grid, draws
+random inputs over PredictionInput's ranges and compares the interpolated grid
+price with the model's prediction. For each tolerance it reports the share of
+inputs /api/predict would answer from the grid with PREDICT_GRID_MAX_ERROR set
+to it, the actual error of those answers, and how often that error exceeds the
+tolerance (the stored per-cell error is an estimate, not a bound). Also times
+one grid point lookup and one surface slice against a single-row model call.
+
+Usage (from backend/, after `python train.py --grid`):
+    python bench/check_grid.py [--n 20000] [--tolerance 0.01 0.02 0.05]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, load_prebuilt  # noqa: E402
+from grid import NOI_THAT, PHAP_LY  # noqa: E402
+from model import feature_encoder  # noqa: E402
+
+
+def random_listings(n: int, districts: list[str], seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "quan": districts[rng.integers(len(districts))],
+            "dien_tich": float(rng.uniform(20, 300)),
+            "so_phong": int(rng.integers(1, 6)),
+            "so_wc": int(rng.integers(1, 5)),
+            "khoang_cach_q1_km": float(rng.uniform(0, 25)),
+            "noi_that": NOI_THAT[rng.integers(len(NOI_THAT))],
+            "phap_ly": PHAP_LY[rng.integers(len(PHAP_LY))],
+        }
+        for _ in range(n)
+    ]
+
+
+def mean_us(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000, help="Random inputs to compare")
+    parser.add_argument("--tolerance", type=float, nargs="+", default=[0.01, 0.02, 0.05])
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--artifact-dir", default=os.environ.get("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR))
+    args = parser.parse_args()
+
+    artifact = load_prebuilt(args.csv, args.artifact_dir)
+    grid = artifact.grid
+    if grid is None:
+        sys.exit(f"Artifact {artifact.version} has no prediction grid; run train.py --grid")
+    print(
+        f"Grid {grid.prices.shape}: {len(grid.area)} dien_tich x {len(grid.distance)} khoang_cach_q1_km nodes, "
+        f"{(grid.prices.nbytes + grid.error.nbytes) / 2**20:.1f} MiB"
+    )
+
+    listings = random_listings(args.n, sorted(artifact.rank_map))
+    rows = [
+        {**{k: v for k, v in item.items() if k != "quan"}, "rank_quan": artifact.rank_map[item["quan"]]}
+        for item in listings
+    ]
+    booster = artifact.model.get_booster()
+    expected = booster.inplace_predict(feature_encoder.encode_batch(rows)).astype(np.float64)
+    keys = [grid.key(i["quan"], i["so_phong"], i["so_wc"], i["noi_that"], i["phap_ly"]) for i in listings]
+    points = [grid.point(k, i["dien_tich"], i["khoang_cach_q1_km"]) for k, i in zip(keys, listings)]
+    price = np.array([p for p, _ in points])
+    estimate = np.array([e for _, e in points])
+    actual = np.abs(price - expected) / expected
+    print(f"All inputs: actual relative error p50 {np.median(actual):.2%}, p99 {np.quantile(actual, 0.99):.2%}")
+    for tolerance in args.tolerance:
+        answered = estimate <= tolerance
+        within = actual[answered]
+        print(
+            f"  tolerance {tolerance:5.1%}: {answered.mean():6.1%} answered from the grid, actual error"
+            f" p50 {np.median(within):.2%} p99 {np.quantile(within, 0.99):.2%},"
+            f" {(within > tolerance).mean():.2%} over the tolerance"
+        )
+
+    sample = list(zip(keys, listings))[:2000]
+    grid_us = mean_us(lambda item: grid.point(item[0], item[1]["dien_tich"], item[1]["khoang_cach_q1_km"]), sample)
+    surface_us = mean_us(lambda item: grid.curve(item[0]), sample)
+    model_us = mean_us(lambda row: booster.inplace_predict(feature_encoder.encode(**row)), rows[:2000])
+    print(f"Point: {grid_us:.1f} us (grid) vs {model_us:.1f} us (single-row model call); surface slice: {surface_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Import-time budget for the API module.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters, takes the
+fastest of --repeat runs, and fails if importing main exceeds --budget-ms or
+pulls in any training-only dependency (scikit-learn, xgboost, scipy, joblib,
+threadpoolctl, or the training modules). Those must only be imported once a
+training or XGBoost code path actually runs.
+
+Usage (from backend/):
+    python bench/check_import_time.py [--budget-ms 2000] [--repeat 3] [--top 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORBIDDEN = ("sklearn", "xgboost", "scipy", "joblib", "threadpoolctl", "incremental", "streaming")
+
+
+def import_profile(module: str) -> dict[str, tuple[int, int]]:
+    """{module: (self_us, cumulative_us)} from one -X importtime run."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=2000.0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs; the fastest one is reported")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules (self time) to list")
+    args = parser.parse_args()
+
+    profile = min((import_profile(args.module) for _ in range(args.repeat)), key=lambda p: p[args.module][1])
+    total_ms = profile[args.module][1] / 1000
+    print(f"import {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms), {len(profile)} modules")
+    for name, (self_us, _) in sorted(profile.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    leaked = sorted({name.split(".")[0] for name in profile} & set(FORBIDDEN))
+    if leaked:
+        sys.exit(f"Training-only modules imported by {args.module}: {', '.join(leaked)}")
+    if total_ms > args.budget_ms:
+        sys.exit(f"import {args.module} took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    print("Import budget: OK")
+
+
+if __name__ == "__main__":
+    main()
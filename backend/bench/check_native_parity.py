@@ -0,0 +1,91 @@
+"""Check the NumPy tree evaluator against XGBoost and scikit-learn.
+
+Exports the serving XGBoost model (and a freshly fitted comparison random
+forest) with native.py and compares predictions on random inputs, with a share
+of NaN features to exercise default_left, against model.predict /
+Booster.inplace_predict / RandomForestRegressor.predict. Predictions must be
+identical; also reports single-row p50 latency and batch throughput.
+
+Usage (from backend/):
+    python bench/check_native_parity.py [--n 20000] [--csv data/apartments.csv] [--skip-rf]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, load_or_build  # noqa: E402
+from bench_predict_features import random_inputs  # noqa: E402
+from model import FEATURE_COLS, TrainingSession, feature_encoder  # noqa: E402
+from native import export_sklearn_forest  # noqa: E402
+
+
+def p50_single_us(predict, X: np.ndarray) -> float:
+    latencies = []
+    for row in X[:2000]:
+        start = time.perf_counter()
+        predict(row[None, :])
+        latencies.append(time.perf_counter() - start)
+    return float(np.percentile(latencies, 50) * 1e6)
+
+
+def compare(name: str, reference, native, X: np.ndarray) -> bool:
+    start = time.perf_counter()
+    expected = reference(X)
+    t_ref = time.perf_counter() - start
+    start = time.perf_counter()
+    got = native(X)
+    t_native = time.perf_counter() - start
+    same = np.array_equal(expected, got)
+    print(
+        f"{name:>22}: {'OK' if same else 'MISMATCH'} (max abs diff {np.abs(expected - got).max():.3g})"
+        f"   batch of {len(X)}: {t_ref * 1e3:7.1f} ms -> {t_native * 1e3:7.1f} ms"
+    )
+    return same
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000, help="Random rows to compare")
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--artifact-dir", default=os.environ.get("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR))
+    parser.add_argument("--skip-rf", action="store_true", help="Do not fit and check the random forest")
+    args = parser.parse_args()
+
+    artifact, _ = load_or_build(args.csv, args.artifact_dir)
+    X = feature_encoder.encode_batch(random_inputs(args.n, artifact.rank_map))
+    X[np.random.default_rng(1).random(X.shape) < 0.05] = np.nan
+    frame = pd.DataFrame(X, columns=FEATURE_COLS)
+
+    booster, trees = artifact.model.get_booster(), artifact.trees
+    print(f"XGBoost export: {trees.n_trees} trees, {len(trees.feature)} nodes, depth {trees.depth}")
+    ok = compare("XGBoost inplace", booster.inplace_predict, trees.inplace_predict, X)
+    ok &= compare("XGBRegressor.predict", artifact.model.predict, lambda _: trees.inplace_predict(X), frame)
+    print(
+        f"{'single row p50':>22}: {p50_single_us(booster.inplace_predict, X):7.1f} us (xgboost)"
+        f" -> {p50_single_us(trees.inplace_predict, X):7.1f} us (native)"
+    )
+
+    if not args.skip_rf:
+        session = TrainingSession(args.csv)
+        session.fit(["rf"])
+        forest = export_sklearn_forest(session.models["rf"])
+        print(f"RF export: {forest.n_trees} trees, {len(forest.feature)} nodes, depth {forest.depth}")
+        X_test = session.X_test.to_numpy(np.float32)
+        ok &= compare("RandomForest.predict", session.models["rf"].predict, lambda _: forest.inplace_predict(X_test), session.X_test)
+
+    if not ok:
+        sys.exit("Native evaluator predictions differ")
+    print("Parity: OK")
+
+
+if __name__ == "__main__":
+    main()
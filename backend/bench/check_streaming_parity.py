@@ -0,0 +1,102 @@
+"""Check that the chunked training pipeline matches the in-memory one.
+
+Runs both paths on the same CSV (or --rows synthetic listings) and asserts:
+
+- the cleaned frames and district rank maps are identical,
+- the feature store's float32 rows (rank_quan filled from the running sums)
+  equal engineer_features of the in-memory frame,
+- the external-memory XGBoost fit predicts like an in-memory fit on the same
+  rows of the row-hash split.
+
+It then trains the serving model both ways, each in a fresh process, and
+reports wall time and peak RSS (xgboost allocates outside tracemalloc's view; Linux),
+plus the test R² of each split.
+
+Usage (from backend/):
+    python bench/check_streaming_parity.py [--rows 0] [--chunksize 50000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_CSV_PATH  # noqa: E402
+from load_test import synthetic_csv  # noqa: E402
+from model import FEATURE_COLS, SPLIT_PARAMS, XGB_PARAMS, engineer_features, load_and_clean, new_model  # noqa: E402
+from streaming import StreamingSession, build_feature_store, train_xgb_from_store  # noqa: E402
+
+
+def train_in_child(mode: str, csv_path: str, chunksize: int, store_dir: str) -> tuple[float, float, int]:
+    """Fit the serving model one way. Returns (seconds, test R², peak RSS bytes) of this process."""
+    start = time.perf_counter()
+    if mode == "streaming":
+        _, r2 = StreamingSession(csv_path, chunksize, store_dir=store_dir).serving_model()
+    else:
+        from model import TrainingSession
+
+        _, r2 = TrainingSession(csv_path).serving_model()
+    seconds = time.perf_counter() - start
+    with open("/proc/self/status") as f:  # VmHWM: peak RSS of this process image (ru_maxrss survives exec)
+        peak = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+    return seconds, float(r2), peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--rows", type=int, default=0, help="Synthetic listings (0 = use --csv as is)")
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    args = parser.parse_args()
+    csv_path = synthetic_csv(args.csv, args.rows) if args.rows else args.csv
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        in_memory = load_and_clean(csv_path)
+        store = build_feature_store(csv_path, store_dir, args.chunksize)
+        streamed = store.to_frame()
+        print(f"{len(in_memory)} cleaned rows (chunksize {args.chunksize}, exact quantiles: {store.manifest['exact_quantiles']})")
+
+        pd.testing.assert_frame_equal(in_memory, streamed, check_index_type=False)
+        X_mem, y_mem, expected = engineer_features(in_memory)
+        running = store.rank_map
+        assert expected.keys() == running.keys(), "district sets differ"
+        worst = max(abs(expected[d] - running[d]) / abs(expected[d]) for d in expected)
+        assert np.isclose(worst, 0, atol=1e-12), f"rank_map differs (max rel diff {worst})"
+        print(f"Cleaning: OK (rank_map from running sums, max rel diff {worst:.1e})")
+
+        parts = list(store.iter_features(SPLIT_PARAMS))
+        X_store = np.concatenate([p[0] for p in parts])
+        test = np.concatenate([p[3] for p in parts])
+        X_mem = X_mem.to_numpy(np.float32)
+        rank = FEATURE_COLS.index("rank_quan")
+        others = [i for i in range(len(FEATURE_COLS)) if i != rank]
+        np.testing.assert_array_equal(X_store[:, others], X_mem[:, others])
+        np.testing.assert_allclose(X_store[:, rank], X_mem[:, rank], rtol=1e-6)
+        np.testing.assert_array_equal(np.concatenate([p[1] for p in parts]), y_mem.to_numpy())
+        print(f"Features: OK ({X_store.shape[1]} float32 columns, {test.mean():.3f} of the rows in the hashed test split)")
+
+        streamed_model = train_xgb_from_store(store, XGB_PARAMS, SPLIT_PARAMS, os.path.join(store_dir, "xgb-cache"))
+        reference = new_model("xgb").fit(pd.DataFrame(X_store[~test], columns=FEATURE_COLS), y_mem.to_numpy()[~test])
+        diff = np.abs(streamed_model.predict(X_store) - reference.predict(X_store)).max()
+        assert diff <= 1e-3 * np.abs(y_mem).max(), f"external-memory fit differs (max abs diff {diff})"
+        print(f"External-memory fit: OK (max abs prediction diff {diff:.3g} VND vs an in-memory fit on the same rows)")
+
+    ctx = multiprocessing.get_context("spawn")
+    for mode in ("in-memory", "streaming"):
+        with tempfile.TemporaryDirectory() as store_dir, ctx.Pool(1) as pool:
+            seconds, r2, peak = pool.apply(train_in_child, (mode, csv_path, args.chunksize, store_dir))
+        print(f"{mode:<10} serving model: {seconds:7.2f}s  peak RSS {peak / 2**20:8.1f} MiB  test R² {r2:.4f}")
+
+
+if __name__ == "__main__":
+    main()
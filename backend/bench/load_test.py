@@ -0,0 +1,362 @@
+"""Load test of the HTTP API against a synthetic dataset of configurable size.
+
+1. Writes a synthetic apartments CSV with --rows listings (10k-5M, see
+   synthetic.py) to data/.cache/, reused by later runs with the same size,
+   seed and source CSV.
+2. Starts `uvicorn main:app` on it twice in a fresh artifact directory: a cold
+   start that trains, then a warm start that loads the saved artifact. Startup
+   time is measured until /health answers; peak RSS is VmHWM from /proc for the
+   server and its child processes.
+3. Drives the warm server with --concurrency client threads (stdlib
+   http.client, keep-alive) for --duration seconds per scenario:
+   /api/predict, /api/predict/batch (--batch-size listings per call),
+   /api/chart-data and /api/chart-data?district=X.
+4. Prints RPS and p50/p95/p99 per scenario and writes everything as JSON
+   (--out), which --compare diffs against an earlier run.
+
+The server runs with PREDICT_CACHE_SIZE=0 unless overridden with --env, so
+/api/predict measures the model path rather than the result cache.
+
+Usage (from backend/):
+    python bench/load_test.py [--rows 100000] [--duration 10] [--concurrency 8] [--out load.json]
+                              [--compare baseline.json] [--env INFERENCE_MODE=process ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_CSV_PATH  # noqa: E402
+from bench_predict_features import NOI_THAT, PHAP_LY  # noqa: E402
+from dataset import DEFAULT_CACHE_DIR, file_sha256  # noqa: E402
+from synthetic import ListingModel, write_listings  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("predict", "predict_batch", "chart_data", "chart_data_district")
+
+
+# --- Synthetic dataset ---
+def synthetic_csv(source_csv: str, rows: int, seed: int = 0) -> str:
+    """`rows` listings generated by synthetic.py from the source CSV, cached per size/seed/source."""
+    path = os.path.join(DEFAULT_CACHE_DIR, f"synthetic-{rows}-{seed}-{file_sha256(source_csv)[:8]}.csv")
+    if not os.path.isfile(path):
+        write_listings(ListingModel.fit(source_csv, seed), rows, path, seed=seed)
+    return path
+
+
+# --- Server process ---
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _descendants(pid: int) -> list[int]:
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    found, frontier = [], [pid]
+    while frontier:
+        children = [child for child, parent in parents.items() if parent in frontier]
+        found += children
+        frontier = children
+    return found
+
+
+def _peak_rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class Server:
+    """`uvicorn main:app` subprocess; startup_seconds measured until /health answers.
+
+    `entrypoint` replaces the `-m uvicorn main:app` arguments (e.g. serve.py),
+    `args` are appended (e.g. --workers 4).
+    """
+
+    def __init__(
+        self, csv_path: str, artifact_dir: str, env: dict[str, str], timeout: float, log_path: str,
+        entrypoint: tuple[str, ...] = ("-m", "uvicorn", "main:app"), args: tuple[str, ...] = (),
+    ):
+        self.port = _free_port()
+        self.log = open(log_path, "ab")
+        start = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, *entrypoint, "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning", *args],
+            cwd=BACKEND_DIR, stdout=self.log, stderr=subprocess.STDOUT,
+            env={**os.environ, "APARTMENTS_CSV": csv_path, "ARTIFACT_DIR": artifact_dir, **env},
+        )
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with {self.process.returncode}, see {log_path}")
+            if time.perf_counter() - start > timeout:
+                self.stop()
+                raise RuntimeError(f"Server not ready after {timeout:g}s, see {log_path}")
+            try:
+                status, _ = request(self.connect(), "GET", "/health")
+                if status == 200:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.05)
+        self.startup_seconds = time.perf_counter() - start
+
+    def connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+
+    def peak_rss_mb(self) -> dict:
+        children = {pid: _peak_rss_mb(pid) for pid in _descendants(self.process.pid)}
+        server = _peak_rss_mb(self.process.pid)
+        return {"server": round(server, 1), "children": round(sum(children.values()), 1), "n_children": len(children)}
+
+    def stop(self) -> None:
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+
+# --- Load generation ---
+def request(conn: http.client.HTTPConnection, method: str, path: str, body: bytes = None) -> tuple[int, bytes]:
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def random_listings(n: int, districts: list[str], rng: np.random.Generator) -> list[dict]:
+    return [
+        {
+            "dien_tich": round(float(rng.uniform(21, 300)), 1),
+            "quan": districts[rng.integers(len(districts))],
+            "so_phong": int(rng.integers(1, 6)),
+            "so_wc": int(rng.integers(1, 5)),
+            "noi_that": NOI_THAT[rng.integers(len(NOI_THAT))],
+            "phap_ly": PHAP_LY[rng.integers(len(PHAP_LY))],
+            "khoang_cach_q1_km": round(float(rng.uniform(0, 25)), 1),
+        }
+        for _ in range(n)
+    ]
+
+
+def build_scenarios(districts: list[str], batch_size: int, seed: int = 0) -> dict[str, list[tuple]]:
+    """Scenario -> request list (method, path, body), cycled by the client threads."""
+    rng = np.random.default_rng(seed)
+    return {
+        "predict": [
+            ("POST", "/api/predict", json.dumps(item).encode()) for item in random_listings(20_000, districts, rng)
+        ],
+        "predict_batch": [
+            ("POST", "/api/predict/batch", json.dumps(random_listings(batch_size, districts, rng)).encode())
+            for _ in range(50)
+        ],
+        "chart_data": [("GET", "/api/chart-data", None)],
+        "chart_data_district": [("GET", f"/api/chart-data?district={quote(d)}", None) for d in districts],
+    }
+
+
+def drive(server: Server, requests: list[tuple], concurrency: int, duration: float, warmup: float) -> dict:
+    """Closed-loop load: each thread sends its next request as soon as the last one returns.
+
+    Every thread first completes one unmeasured request (the first call can be
+    slow, e.g. process workers loading the model), then all start together and
+    run `warmup` more unmeasured seconds before the measured `duration`.
+    """
+    latencies: list[list[float]] = [[] for _ in range(concurrency)]
+    statuses: list[dict[int, int]] = [{} for _ in range(concurrency)]
+    errors = [0] * concurrency
+    window = {}
+
+    def start_clock() -> None:
+        window["begin"] = time.perf_counter() + warmup
+        window["deadline"] = window["begin"] + duration
+
+    ready = threading.Barrier(concurrency, action=start_clock)
+
+    def worker(k: int) -> None:
+        conn = server.connect()
+        request(conn, *requests[k % len(requests)])
+        ready.wait()
+        begin, deadline = window["begin"], window["deadline"]
+        i = k
+        while (now := time.perf_counter()) < deadline:
+            method, path, body = requests[i % len(requests)]
+            i += concurrency
+            try:
+                status, _ = request(conn, method, path, body)
+            except (OSError, http.client.HTTPException):
+                errors[k] += 1
+                conn.close()
+                conn = server.connect()
+                continue
+            if now >= begin:  # drop the warm-up
+                latencies[k].append(time.perf_counter() - now)
+                statuses[k][status] = statuses[k].get(status, 0) + 1
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    merged = np.array([x for per_thread in latencies for x in per_thread])
+    status_counts: dict[str, int] = {}
+    for per_thread in statuses:
+        for status, count in per_thread.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+    ok = sum(count for status, count in status_counts.items() if status.startswith("2"))
+    p50, p95, p99 = np.percentile(merged, [50, 95, 99]) * 1000 if len(merged) else (float("nan"),) * 3
+    return {
+        "requests": len(merged),
+        "rps": round(ok / duration, 1),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(merged.mean()) * 1000, 3) if len(merged) else None,
+        "statuses": status_counts,
+        "connection_errors": sum(errors),
+    }
+
+
+# --- Reporting ---
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result: dict, baseline: dict = None) -> None:
+    def delta(*path) -> str:
+        if baseline is None:
+            return ""
+        old = baseline
+        for part in path:
+            old = (old or {}).get(part)
+        new = result
+        for part in path:
+            new = new[part]
+        return f" ({(new / old - 1) * 100:+5.1f}%)" if old else " (   n/a)"
+
+    print(f"commit {result['commit']}, {result['rows']} rows, {result['concurrency']} clients x {result['duration']:g}s")
+    for phase in ("cold", "warm"):
+        print(
+            f"{phase:>5} start: {result['startup'][phase]['seconds']:7.2f}s{delta('startup', phase, 'seconds')}"
+            f"   peak RSS {result['startup'][phase]['peak_rss_mb']['server']:7.1f} MB"
+            f"{delta('startup', phase, 'peak_rss_mb', 'server')}"
+            f" (+{result['startup'][phase]['peak_rss_mb']['children']:.1f} MB in children)"
+        )
+    for name, r in result["endpoints"].items():
+        print(
+            f"{name:>20}: {r['rps']:8.1f} rps{delta('endpoints', name, 'rps')}"
+            f"   p50 {r['p50_ms']:8.2f}   p95 {r['p95_ms']:8.2f}   p99 {r['p99_ms']:8.2f} ms"
+            f"{delta('endpoints', name, 'p99_ms')}   statuses {r['statuses']}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="Synthetic listings (10k-5M)")
+    parser.add_argument("--source-csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=100, help="Listings per /api/predict/batch call")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--startup-timeout", type=float, default=3600.0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra server env (repeatable)")
+    parser.add_argument("--out", help="Write the results as JSON")
+    parser.add_argument("--compare", help="Earlier --out JSON to diff against")
+    args = parser.parse_args()
+
+    env = {"PREDICT_CACHE_SIZE": "0", **dict(item.split("=", 1) for item in args.env)}
+    start = time.perf_counter()
+    csv_path = synthetic_csv(args.source_csv, args.rows, args.seed)
+    print(f"Dataset {csv_path} ({os.path.getsize(csv_path) / 1e6:.1f} MB) ready in {time.perf_counter() - start:.1f}s")
+
+    result = {
+        "commit": _git_commit(),
+        "timestamp": time.time(),
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        "rows": args.rows,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "batch_size": args.batch_size,
+        "server_env": env,
+        "startup": {},
+        "endpoints": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="load-test-") as tmp:
+        artifact_dir, log_path = os.path.join(tmp, "artifacts"), os.path.join(tmp, "server.log")
+        for phase in ("cold", "warm"):  # cold trains into the empty artifact dir, warm loads from it
+            server = Server(csv_path, artifact_dir, env, args.startup_timeout, log_path)
+            result["startup"][phase] = {"seconds": round(server.startup_seconds, 3), "peak_rss_mb": server.peak_rss_mb()}
+            print(f"{phase} start: {server.startup_seconds:.2f}s")
+            if phase == "cold":
+                server.stop()
+        try:
+            _, body = request(server.connect(), "GET", "/api/districts")
+            districts = [d["name"] for d in json.loads(body)]
+            scenarios = build_scenarios(districts, args.batch_size, args.seed)
+            for name in args.scenarios:
+                result["endpoints"][name] = drive(server, scenarios[name], args.concurrency, args.duration, args.warmup)
+                print(f"{name}: {result['endpoints'][name]['rps']} rps")
+            result["peak_rss_mb"] = server.peak_rss_mb()
+        finally:
+            server.stop()
+
+    print()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"vs {args.compare} (commit {baseline.get('commit')}):")
+    print_report(result, baseline)
+    print(
+        f"peak RSS after load: {result['peak_rss_mb']['server']:.1f} MB"
+        f" (+{result['peak_rss_mb']['children']:.1f} MB in {result['peak_rss_mb']['n_children']} children)"
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Bytes per listing of the serving dataset: cleaned DataFrame vs ListingStore.
+
+Until the ListingStore (listings.py), every ServingState kept the cleaned
+training DataFrame. This report loads an artifact (the one matching the CSV,
+trained on a miss) and prints, column by column, the deep memory_usage of
+that DataFrame (index included) next to the arrays of the ListingStore built
+from it, with the dtype each one got. It also rebuilds the chart payloads
+from an all-float64 store and checks they equal the ones from the narrowed
+store, i.e. that the float32 columns lost nothing.
+
+Usage (from backend/):
+    python bench/report_memory.py [--rows 0] [--out memory.json]
+
+--rows N runs on a synthetic CSV of N listings (see synthetic.py) instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from dataclasses import replace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, load_or_build  # noqa: E402
+from charts import build_chart_index  # noqa: E402
+from listings import ListingStore  # noqa: E402
+from load_test import synthetic_csv  # noqa: E402
+
+# ListingStore array -> the DataFrame column it replaces
+STORE_COLUMNS = {"district_code": "quan", "legal_code": "phap_ly", "area": "dien_tich", "price": "gia"}
+
+
+def report(df, store: ListingStore) -> dict:
+    rows = len(df)
+    usage = df.memory_usage(deep=True, index=True)
+    frame = {
+        ("<index>" if name == "Index" else name): {
+            "dtype": str(df.index.dtype if name == "Index" else df[name].dtype),
+            "bytes_per_row": round(int(nbytes) / rows, 2),
+        }
+        for name, nbytes in usage.items()
+    }
+    slim = {
+        name: {"column": column, "dtype": str(getattr(store, name).dtype), "bytes_per_row": getattr(store, name).nbytes / rows}
+        for name, column in STORE_COLUMNS.items()
+    }
+    return {
+        "rows": rows,
+        "dataframe": {"columns": frame, "bytes_per_row": round(int(usage.sum()) / rows, 2), "mib": round(int(usage.sum()) / 2**20, 1)},
+        "listing_store": {"arrays": slim, "bytes_per_row": round(store.nbytes / rows, 2), "mib": round(store.nbytes / 2**20, 1)},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=0, help="Synthetic listings (0 = use --csv as is)")
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--artifact-dir", default=os.environ.get("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR))
+    parser.add_argument("--out", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    csv_path = synthetic_csv(args.csv, args.rows) if args.rows else args.csv
+    artifact, _ = load_or_build(csv_path, args.artifact_dir)
+    store = ListingStore.from_frame(artifact.df_clean)
+    results = {"artifact": artifact.version, **report(artifact.df_clean, store)}
+
+    importances = np.array(artifact.feature_importances)
+    wide = replace(store, area=store.area.astype(np.float64), price=store.price.astype(np.float64))
+    narrowed, exact = (build_chart_index(s, importances, artifact.district_data) for s in (store, wide))
+    results["charts_identical"] = (narrowed.all_districts, narrowed.by_district) == (exact.all_districts, exact.by_district)
+
+    frame, slim = results["dataframe"], results["listing_store"]
+    print(f"Artifact {artifact.version}: {results['rows']} rows")
+    print("DataFrame (deep, with index):")
+    for name, column in frame["columns"].items():
+        print(f"  {name:<18} {column['dtype']:<9} {column['bytes_per_row']:6.2f} B/row")
+    print(f"  {'total':<28} {frame['bytes_per_row']:6.2f} B/row ({frame['mib']} MiB)")
+    print("ListingStore:")
+    for name, array in slim["arrays"].items():
+        print(f"  {name:<18} {array['dtype']:<9} {array['bytes_per_row']:6.2f} B/row  ({array['column']})")
+    print(f"  {'total':<28} {slim['bytes_per_row']:6.2f} B/row ({slim['mib']} MiB)")
+    print(
+        f"{frame['bytes_per_row'] / slim['bytes_per_row']:.1f}x smaller;"
+        f" chart payloads {'identical' if results['charts_identical'] else 'DIFFER'} to an all-float64 store"
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if not results["charts_identical"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
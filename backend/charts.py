@@ -0,0 +1,108 @@
+"""Precomputed /api/chart-data payloads.
+
+Everything the dashboard charts need is derived from the cleaned listings
+(listings.ListingStore) and the trained model, both fixed for the lifetime of
+an artifact. ChartIndex buckets rows per district once (row-index arrays,
+fixed scatter samples, histogram edges) and builds the all-district blocks
+once, so each request is a dict lookup.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from listings import ListingStore
+from model import FEATURE_COLS
+
+SCATTER_MAX_POINTS = 500
+SCATTER_RANDOM_STATE = 42
+HISTOGRAM_BINS = 10
+
+
+def _area_price_data(area: np.ndarray, price: np.ndarray) -> list[dict]:
+    """Scatter sample (max 500 points), same rows as df.sample(n, random_state=42)."""
+    n = len(area)
+    if n == 0:
+        return []
+    # DataFrame.sample draws positions with RandomState.choice(..., replace=False)
+    picks = np.random.RandomState(SCATTER_RANDOM_STATE).choice(n, size=min(SCATTER_MAX_POINTS, n), replace=False)
+    return [{"area": round(float(a), 1), "price": float(p)} for a, p in zip(area[picks], price[picks])]
+
+
+def _price_bins(price: np.ndarray) -> list[dict]:
+    """Price histogram in billions VND (10 bins)."""
+    if len(price) == 0:
+        return []
+    counts, edges = np.histogram(price / 1e9, bins=HISTOGRAM_BINS)
+    return [
+        {"range": f"{edges[i]:.1f}-{edges[i+1]:.1f}", "count": int(counts[i])}
+        for i in range(len(counts))
+    ]
+
+
+@dataclass
+class ChartIndex:
+    shared: dict  # blocks that never depend on the district filter
+    by_district: dict[str, dict]  # district -> {"area_price_data", "price_bins"}
+    all_districts: dict
+    unknown_district: dict
+
+    def get(self, district: Optional[str]) -> dict:
+        """Chart payload for one district (or all districts when falsy)."""
+        if not district:
+            filtered = self.all_districts
+        else:
+            filtered = self.by_district.get(district, self.unknown_district)
+        return {
+            "price_by_district": self.shared["price_by_district"],
+            "area_price_data": filtered["area_price_data"],
+            "price_bins": filtered["price_bins"],
+            "feature_importance": self.shared["feature_importance"],
+            "legal_status_distribution": self.shared["legal_status_distribution"],
+        }
+
+
+def build_chart_index(listings: ListingStore, feature_importances: np.ndarray, district_data: list[dict]) -> ChartIndex:
+    """Precompute all chart blocks for every district."""
+    area, price = listings.area, listings.price
+
+    # 1. Price by district (always show all districts)
+    price_by_district = sorted(
+        [{"district": d["name"], "avg_price_m2": d["avg_price_m2"]} for d in district_data],
+        key=lambda x: x["avg_price_m2"], reverse=True,
+    )
+
+    # 4. Feature importance from XGBoost
+    feature_importance = sorted(
+        [{"feature": name, "importance": round(float(imp), 4)} for name, imp in zip(FEATURE_COLS, feature_importances)],
+        key=lambda x: x["importance"], reverse=True,
+    )
+
+    # 5. Legal status distribution (from full dataset, not filtered)
+    legal_counts = listings.legal_status_counts()
+    legal_status_distribution = [
+        {"status": str(status), "count": int(count)}
+        for status, count in legal_counts.items()
+    ]
+
+    # 2 + 3. Scatter and histogram, per district from positional row indices
+    by_district = {}
+    for district, rows in listings.district_rows().items():
+        by_district[district] = {
+            "area_price_data": _area_price_data(area[rows], price[rows]),
+            "price_bins": _price_bins(price[rows]),
+        }
+
+    return ChartIndex(
+        shared={
+            "price_by_district": price_by_district,
+            "feature_importance": feature_importance,
+            "legal_status_distribution": legal_status_distribution,
+        },
+        by_district=by_district,
+        all_districts={"area_price_data": _area_price_data(area, price), "price_bins": _price_bins(price)},
+        unknown_district={"area_price_data": [], "price_bins": []},
+    )
@@ -0,0 +1,111 @@
+"""Schema-driven loading of the raw apartment listings.
+
+Only the columns the cleaning pipeline uses are parsed, with explicit compact
+dtypes: category for districts, float32 for model-only features, float64 for
+gia / gia_m2 / dien_tich. Those three feed outlier quantiles, aggregates and
+chart values, where float32 rounding would change the results (VND prices are
+not exact in float32, and e.g. 61.65 m² would round to 61.7 instead of 61.6).
+Long text columns (tieu_de, link, nguoi_ban, ...) are never materialized.
+
+When pyarrow is installed (pinned in requirements.txt, optional), the typed
+table is written once to an uncompressed Arrow IPC (Feather v2) file keyed by
+typed_cache_key (CSV content hash + schema + DATA_CACHE_FORMAT); later starts
+memory-map that file instead of parsing the CSV again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+
+import pandas as pd
+
+# Raw CSV columns read by load_and_clean and their storage dtypes.
+# phap_ly / noi_that hold numeric codes (NaN = unknown), mapped to labels later.
+APARTMENT_SCHEMA = {
+    "gia": "float64",
+    "gia_m2": "float64",
+    "dien_tich": "float64",
+    "noi_that": "float32",
+    "phap_ly": "float32",
+    "so_phong": "float32",
+    "so_wc": "float32",
+    "quan": "category",
+    "khoang_cach_q1_km": "float32",
+}
+
+# Bump when read_csv_typed changes in a way APARTMENT_SCHEMA does not capture
+# (parse options, column mapping), so stale cache files are ignored
+DATA_CACHE_FORMAT = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", ".cache")
+# "arrow" (default, needs pyarrow) or "off"
+DATA_CACHE = os.environ.get("DATA_CACHE", "arrow")
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file, read in chunks (memoized per path/size/mtime)."""
+    stat = os.stat(path)
+    return _file_sha256(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, chunk_size)
+
+
+@lru_cache(maxsize=16)
+def _file_sha256(path: str, size: int, mtime_ns: int, chunk_size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def typed_cache_key(csv_path: str) -> str:
+    """Key of files derived from the typed CSV: content hash + schema + DATA_CACHE_FORMAT."""
+    digest = hashlib.sha256()
+    digest.update(file_sha256(csv_path).encode())
+    digest.update(json.dumps(APARTMENT_SCHEMA).encode())  # column order included
+    digest.update(str(DATA_CACHE_FORMAT).encode())
+    return digest.hexdigest()[:16]
+
+
+def read_csv_typed(csv_path: str, **kwargs) -> pd.DataFrame:
+    """Parse only the schema columns, with schema dtypes."""
+    return pd.read_csv(
+        csv_path,
+        usecols=list(APARTMENT_SCHEMA),
+        dtype=APARTMENT_SCHEMA,
+        encoding="utf-8-sig",
+        **kwargs,
+    )
+
+
+def _arrow_cache_path(csv_path: str, cache_dir: str) -> str:
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f"{name}.{typed_cache_key(csv_path)}.arrow")
+
+
+def read_apartments(csv_path: str, cache_dir: str = DEFAULT_CACHE_DIR, cache: str = DATA_CACHE) -> pd.DataFrame:
+    """Load the typed raw listings, through the Arrow cache when available."""
+    if cache != "arrow":
+        return read_csv_typed(csv_path)
+    try:
+        from pyarrow import feather
+    except ImportError:
+        return read_csv_typed(csv_path)
+
+    path = _arrow_cache_path(csv_path, cache_dir)
+    if os.path.isfile(path):
+        return feather.read_table(path, memory_map=True).to_pandas()
+
+    df = read_csv_typed(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".arrow.tmp", dir=cache_dir)
+    os.close(fd)
+    try:
+        feather.write_feather(df, tmp, compression="uncompressed")
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return df
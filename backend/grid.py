@@ -0,0 +1,229 @@
+"""Precomputed prediction grid for the area / distance sliders of the predict UI.
+
+For every (district, so_phong, so_wc, noi_that, phap_ly) combination the model
+is evaluated offline on a regular dien_tich x khoang_cach_q1_km grid. A whole
+price curve or surface is then a slice of that grid, and single predictions
+can be answered by bilinear interpolation instead of a model call.
+
+Tree ensembles are piecewise constant, so the interpolation error concentrates
+in the cells crossed by split thresholds. Each cell therefore also stores the
+largest relative error of the interpolation against the model over a lattice
+of GRID_ERROR_PROBES x GRID_ERROR_PROBES probe points inside it (quantized up
+to ERROR_UNIT steps); point queries only use the grid where that error is
+within the caller's tolerance. A step between probes can still be missed, so
+it is an estimate, not a strict bound (bench/check_grid.py measures how often
+it is exceeded).
+
+Layout: <artifact_dir>/<version>/grid/{prices.npy, error.npy, grid.json}.
+prices.npy is float32 with shape (districts + 1, so_phong, so_wc, noi_that,
+phap_ly, dien_tich, khoang_cach_q1_km), the extra district being the fallback
+rank used for unknown districts; error.npy is uint8 with one cell less along
+both slider axes. Both are memory-mapped, so every worker on a host shares the
+same page-cache pages.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from itertools import product
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from model import FEATURE_COLS, feature_encoder
+
+if TYPE_CHECKING:
+    from artifacts import Artifact
+
+# Bump when the grid files change layout so stale grids are ignored
+GRID_FORMAT = 1
+GRID_DIR = "grid"
+
+# Categorical axes: the values PredictionInput accepts, in its order
+SO_PHONG = (1, 2, 3, 4, 5)
+SO_WC = (1, 2, 3, 4)
+NOI_THAT = ("Cao_cap", "Day_du", "Co_ban", "Tho", "Khong_noi_that")
+PHAP_LY = ("Dang_cho_so", "Hop_dong_dat_coc", "Hop_dong_mua_ban", "So_hong_rieng", "Khac")
+# Slider axes: PredictionInput's ranges and the bin width of the grid along each
+AREA_RANGE = (20.0, 300.0)
+DISTANCE_RANGE = (0.0, 25.0)
+GRID_AREA_STEP = float(os.environ.get("GRID_AREA_STEP", "5"))
+GRID_DISTANCE_STEP = float(os.environ.get("GRID_DISTANCE_STEP", "1"))
+# Probe points per axis and cell for the error estimate (n -> fractions 1/(n+1) .. n/(n+1));
+# build time grows with n², 3 keeps the estimate's violations around 1% at a 1% tolerance
+GRID_ERROR_PROBES = int(os.environ.get("GRID_ERROR_PROBES", "3"))
+# error.npy stores ceil(relative error / ERROR_UNIT), saturating at 255
+ERROR_UNIT = 0.001
+# District key of the fallback-rank slice (unknown districts)
+FALLBACK_DISTRICT = "<fallback>"
+
+_AREA_COL = FEATURE_COLS.index("dien_tich")
+_DISTANCE_COL = FEATURE_COLS.index("khoang_cach_q1_km")
+
+
+def grid_axis(bounds: tuple[float, float], step: float) -> np.ndarray:
+    """Evenly spaced nodes from bounds[0] to bounds[1] (inclusive), at most `step` apart."""
+    lo, hi = bounds
+    return np.linspace(lo, hi, int(np.ceil((hi - lo) / step - 1e-9)) + 1)
+
+
+def _combo_rows(rank_quan: float) -> list[dict]:
+    """encode_batch rows for every categorical combination of one district (slider columns 0)."""
+    return [
+        {"dien_tich": 0.0, "so_phong": p, "so_wc": w, "khoang_cach_q1_km": 0.0,
+         "rank_quan": rank_quan, "noi_that": n, "phap_ly": l}
+        for p, w, n, l in product(SO_PHONG, SO_WC, NOI_THAT, PHAP_LY)
+    ]
+
+
+def _evaluate(predictor, base: np.ndarray, area: np.ndarray, distance: np.ndarray) -> np.ndarray:
+    """Model prices for every base row over area x distance -> (rows, len(area), len(distance))."""
+    cells = len(area) * len(distance)
+    X = np.repeat(base, cells, axis=0)
+    X[:, _AREA_COL] = np.tile(np.repeat(area, len(distance)), len(base))
+    X[:, _DISTANCE_COL] = np.tile(distance, len(base) * len(area))
+    return np.asarray(predictor.inplace_predict(X), dtype=np.float32).reshape(len(base), len(area), len(distance))
+
+
+def _interpolation_error(
+    predictor, base: np.ndarray, area: np.ndarray, distance: np.ndarray, nodes: np.ndarray, probes: int,
+) -> np.ndarray:
+    """Max relative error of the interpolation against the model over each cell's probes, in ERROR_UNIT steps."""
+    worst = np.zeros((len(base), len(area) - 1, len(distance) - 1), dtype=np.float32)
+    fractions = [k / (probes + 1) for k in range(1, probes + 1)]
+    for u, v in product(fractions, fractions):
+        model = _evaluate(predictor, base, area[:-1] + u * np.diff(area), distance[:-1] + v * np.diff(distance))
+        interpolated = (
+            (1 - u) * ((1 - v) * nodes[:, :-1, :-1] + v * nodes[:, :-1, 1:])
+            + u * ((1 - v) * nodes[:, 1:, :-1] + v * nodes[:, 1:, 1:])
+        )
+        np.maximum(worst, np.abs(interpolated - model) / np.maximum(np.abs(model), 1.0), out=worst)
+    return np.minimum(np.ceil(worst / ERROR_UNIT), 255).astype(np.uint8)
+
+
+def _locate(axis: np.ndarray, x: float) -> Optional[tuple[int, float]]:
+    """(cell index, fraction within the cell) of x on axis, or None outside it."""
+    if not axis[0] <= x <= axis[-1]:
+        return None
+    i = min(int(np.searchsorted(axis, x, side="right")) - 1, len(axis) - 2)
+    return i, float((x - axis[i]) / (axis[i + 1] - axis[i]))
+
+
+@dataclass(frozen=True)
+class PredictionGrid:
+    version: str  # artifact version the prices were computed with
+    districts: dict[str, int]  # district -> index along the first axis; FALLBACK_DISTRICT last
+    area: np.ndarray  # dien_tich nodes
+    distance: np.ndarray  # khoang_cach_q1_km nodes
+    prices: np.ndarray  # float32, see module docstring
+    error: np.ndarray  # uint8, interpolation error per cell in ERROR_UNIT steps
+
+    def key(self, quan: str, so_phong: int, so_wc: int, noi_that: str, phap_ly: str) -> Optional[tuple]:
+        """Index of one combination's surface; None when a value is off the grid."""
+        try:
+            return (
+                self.districts.get(quan, self.districts[FALLBACK_DISTRICT]), SO_PHONG.index(so_phong),
+                SO_WC.index(so_wc), NOI_THAT.index(noi_that), PHAP_LY.index(phap_ly),
+            )
+        except ValueError:
+            return None
+
+    def point(self, key: tuple, dien_tich: float, khoang_cach_q1_km: float) -> Optional[tuple[float, float]]:
+        """(interpolated price, relative error estimate of its cell), or None off the grid."""
+        a, d = _locate(self.area, dien_tich), _locate(self.distance, khoang_cach_q1_km)
+        if a is None or d is None:
+            return None
+        (i, u), (j, v) = a, d
+        cell = self.prices[key][i:i + 2, j:j + 2].astype(np.float64)
+        price = (1 - u) * ((1 - v) * cell[0, 0] + v * cell[0, 1]) + u * ((1 - v) * cell[1, 0] + v * cell[1, 1])
+        return float(price), int(self.error[key][i, j]) * ERROR_UNIT
+
+    def curve(self, key: tuple, dien_tich: Optional[float] = None, khoang_cach_q1_km: Optional[float] = None):
+        """Prices along the free slider axes: a surface (area x distance) or one curve.
+
+        Returns (prices, max relative error estimate over the cells used), or
+        None when the fixed coordinate is off the grid.
+        """
+        prices, error = self.prices[key], self.error[key]
+        if dien_tich is None and khoang_cach_q1_km is None:
+            return np.asarray(prices), int(error.max()) * ERROR_UNIT
+        axis, x, along = (self.area, dien_tich, 0) if dien_tich is not None else (self.distance, khoang_cach_q1_km, 1)
+        located = _locate(axis, x)
+        if located is None:
+            return None
+        i, t = located
+        lo, hi = np.take(prices, i, axis=along), np.take(prices, i + 1, axis=along)
+        return (1 - t) * lo.astype(np.float64) + t * hi, int(np.take(error, i, axis=along).max()) * ERROR_UNIT
+
+
+def build_grid(
+    artifact: Artifact, area_step: float = GRID_AREA_STEP, distance_step: float = GRID_DISTANCE_STEP,
+    probes: int = GRID_ERROR_PROBES,
+) -> PredictionGrid:
+    """Evaluate the artifact's model over the whole grid (one district per model call)."""
+    predictor = artifact.model.get_booster() if artifact.model is not None else artifact.trees
+    area, distance = grid_axis(AREA_RANGE, area_step), grid_axis(DISTANCE_RANGE, distance_step)
+    names = sorted(artifact.rank_map)
+    ranks = [artifact.rank_map[name] for name in names] + [float(np.median(list(artifact.rank_map.values())))]
+    combos = (len(SO_PHONG), len(SO_WC), len(NOI_THAT), len(PHAP_LY))
+    prices = np.empty((len(ranks), *combos, len(area), len(distance)), dtype=np.float32)
+    error = np.empty((len(ranks), *combos, len(area) - 1, len(distance) - 1), dtype=np.uint8)
+    for d, rank in enumerate(ranks):
+        base = feature_encoder.encode_batch(_combo_rows(rank))
+        nodes = _evaluate(predictor, base, area, distance)
+        prices[d] = nodes.reshape(*combos, len(area), len(distance))
+        cells = _interpolation_error(predictor, base, area, distance, nodes, probes)
+        error[d] = cells.reshape(*combos, len(area) - 1, len(distance) - 1)
+    districts = {name: i for i, name in enumerate([*names, FALLBACK_DISTRICT])}
+    return PredictionGrid(artifact.version, districts, area, distance, prices, error)
+
+
+def save_grid(grid: PredictionGrid, artifact_dir: str) -> str:
+    """Write the grid next to its artifact atomically (temp dir + rename), replacing an older one."""
+    version_dir = os.path.join(artifact_dir, grid.version)
+    target = os.path.join(version_dir, GRID_DIR)
+    tmp = tempfile.mkdtemp(prefix=f".{GRID_DIR}-", dir=version_dir)
+    try:
+        os.chmod(tmp, 0o755)
+        np.save(os.path.join(tmp, "prices.npy"), grid.prices)
+        np.save(os.path.join(tmp, "error.npy"), grid.error)
+        meta = {
+            "format": GRID_FORMAT,
+            "version": grid.version,
+            "districts": list(grid.districts),
+            "area": grid.area.tolist(),
+            "distance": grid.distance.tolist(),
+            "error_unit": ERROR_UNIT,
+        }
+        with open(os.path.join(tmp, "grid.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        shutil.rmtree(target, ignore_errors=True)
+        os.rename(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return target
+
+
+def load_grid(version: str, artifact_dir: str) -> Optional[PredictionGrid]:
+    """Memory-map the grid stored with an artifact, or None if it has none (or a stale one)."""
+    path = os.path.join(artifact_dir, version, GRID_DIR)
+    try:
+        with open(os.path.join(path, "grid.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    if meta.get("format") != GRID_FORMAT or meta.get("version") != version or meta.get("error_unit") != ERROR_UNIT:
+        return None
+    return PredictionGrid(
+        version,
+        {name: i for i, name in enumerate(meta["districts"])},
+        np.array(meta["area"]),
+        np.array(meta["distance"]),
+        np.load(os.path.join(path, "prices.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "error.npy"), mmap_mode="r"),
+    )
@@ -0,0 +1,77 @@
+"""Pre-serialized responses with ETag / If-None-Match support.
+
+The analytics endpoints only change when a new model artifact is loaded, so
+their JSON bodies are serialized once per (endpoint, query params, model
+version) and served as raw bytes. ETags are strong and derived from the
+artifact version plus a body digest, so every worker (and a CDN in front of
+them) agrees on them; matching If-None-Match requests get an empty 304.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from metrics import lap
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+def _serialize(payload: Any) -> bytes:
+    """Same bytes FastAPI's JSONResponse would render."""
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison: ignore W/ prefixes, accept '*'."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag == "*" or tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class ResponseCache:
+    """Serialized response bodies for one model version."""
+
+    def __init__(self, version: str, max_age: int = 0, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.version = version
+        self.cache_control = f"public, max-age={max_age}, must-revalidate"
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[tuple, tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key: tuple, build: Callable[[], Any]) -> tuple[bytes, str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            lap("cache_lookup")
+            return entry
+        payload = build()
+        lap("build")
+        body = _serialize(payload)
+        etag = f'"{self.version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+        entry = (body, etag)
+        with self._lock:
+            self.misses += 1
+            if len(self._entries) < self.max_entries:
+                self._entries[key] = entry
+        lap("serialization")
+        return entry
+
+    def respond(self, request: Request, key: tuple, build: Callable[[], Any]) -> Response:
+        """Serve the cached body for key, or 304 when the client already has it."""
+        body, etag = self._entry(key, build)
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
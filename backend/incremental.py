@@ -0,0 +1,197 @@
+"""Incremental retraining on listings appended to the CSV.
+
+The crawler only appends to the listings CSV, so a new artifact can be derived
+from the previous one instead of retraining from scratch:
+
+1. Verify the CSV still starts with the exact bytes the base artifact was
+   trained on, and parse only the rows after that offset.
+2. Clean them with the base artifact's so_wc fill value and IQR bounds.
+3. Update rank_map, stats and district aggregates from running sums.
+4. Continue boosting the base XGBoost model for INCREMENTAL_ROUNDS trees on the
+   new rows (model.fit_xgb with xgb_model=base booster, so the XGB_* options
+   apply as in a full build).
+
+R² is measured on the held-out rows of every segment, assigned by the rule
+the full build used (training["split"]): train_test_split per segment after
+an in-memory build, or the CSV row-number hash of streaming.py after a
+chunked one, so rows the base model trained on never count as held out and
+R² stays comparable across steps. Artifacts that do not record their rule
+are not continued. The comparison payload (LR/Ridge/RF) is carried
+over from the last full build, recorded under training["inherited"], while
+training["xgb"] describes the continuation itself; after
+INCREMENTAL_MAX_STEPS steps, when the CSV was rewritten rather than appended
+to, or when the continued model's R² is more than INCREMENTAL_MAX_R2_DROP
+below the base artifact's, update_artifact returns None and the caller falls
+back to a full build.
+
+A continued artifact is stored under its own version (incremental_version:
+parent version + appended byte range), never under the artifact_version a
+full build of the same CSV gets, so a later full-key lookup cannot mistake it
+for a full build.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+from artifacts import (
+    ARTIFACT_FORMAT, DEFAULT_ARTIFACT_DIR, Artifact, listing_sums, load_artifact, merge_sums, rank_map_from_sums,
+    summarize_sums,
+)
+from dataset import read_csv_typed
+from model import MODEL_PARAMS, clean_listings, engineer_features, fit_xgb, new_model, xgb_options
+
+# Trees added per incremental step
+INCREMENTAL_ROUNDS = int(os.environ.get("INCREMENTAL_ROUNDS", "20"))
+# Incremental steps before the next update falls back to a full retrain
+INCREMENTAL_MAX_STEPS = int(os.environ.get("INCREMENTAL_MAX_STEPS", "10"))
+# Largest held-out R² drop vs the base artifact a continued model may show; beyond it, retrain fully
+INCREMENTAL_MAX_R2_DROP = float(os.environ.get("INCREMENTAL_MAX_R2_DROP", "0.02"))
+
+_CATEGORY_COLS = ("quan", "phap_ly", "noi_that")
+
+
+def read_appended(csv_path: str, source: dict) -> Optional[tuple[pd.DataFrame, dict]]:
+    """Typed rows appended after `source` (a previous training's byte length/hash).
+
+    Returns (rows, new_source), or None if the CSV was not simply appended to.
+    Rows are indexed by absolute row number, like a full read_csv. A line still
+    being written (no trailing newline yet) is left for the next update.
+    """
+    offset = source["bytes"]
+    with open(csv_path, "rb") as f:
+        digest, chunk = hashlib.sha256(), b""
+        remaining = offset
+        while remaining:
+            chunk = f.read(min(1 << 20, remaining))
+            if not chunk:
+                return None  # file shrank
+            digest.update(chunk)
+            remaining -= len(chunk)
+        if digest.hexdigest() != source["sha256"] or not chunk.endswith(b"\n"):
+            return None
+        tail = f.read()
+    tail = tail[:tail.rfind(b"\n") + 1]
+    if not tail:
+        return None
+
+    digest.update(tail)
+    columns = list(pd.read_csv(csv_path, nrows=0, encoding="utf-8-sig").columns)
+    rows = read_csv_typed(io.BytesIO(tail), header=None, names=columns)
+    rows.index = pd.RangeIndex(source["rows"], source["rows"] + len(rows))
+    return rows, {"rows": source["rows"] + len(rows), "bytes": offset + len(tail), "sha256": digest.hexdigest()}
+
+
+def incremental_version(parent: str, start: dict, end: dict) -> str:
+    """Cache key of `parent` continued on the CSV bytes between two training sources."""
+    key = {
+        "parent": parent, "bytes": [start["bytes"], end["bytes"]], "sha256": end["sha256"],
+        "rounds": INCREMENTAL_ROUNDS, "format": ARTIFACT_FORMAT,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _test_mask(rule: str, segments: list[int], rows: np.ndarray, split: dict) -> np.ndarray:
+    """Held-out rows under the full build's split rule (training["split"]).
+
+    "per_segment": `split` applied to each segment separately by
+    train_test_split; "row_hash": hashed_test_mask of the CSV row numbers.
+    """
+    if rule == "row_hash":
+        from streaming import hashed_test_mask  # training-only module
+
+        return hashed_test_mask(rows, split)
+    mask, start = np.zeros(sum(segments), dtype=bool), 0
+    for n in segments:
+        if n >= 2:
+            mask[start + train_test_split(np.arange(n), **split)[1]] = True
+        start += n
+    return mask
+
+
+def update_artifact(
+    base: Artifact, csv_path: str, params: dict = MODEL_PARAMS, artifact_dir: str = DEFAULT_ARTIFACT_DIR,
+) -> Optional[Artifact]:
+    """Continue `base` on the rows appended to the CSV since it was trained.
+
+    The result has its incremental_version; if `artifact_dir` already holds it
+    (another worker continued `base` on the same rows), that one is loaded.
+    Returns None when a full build is needed instead, including when `base`
+    was trained with other hyperparameters than `params` (e.g. after tuning)
+    or the continued model scores too far below it (INCREMENTAL_MAX_R2_DROP).
+    """
+    training = base.training
+    if not training or training["steps"] >= INCREMENTAL_MAX_STEPS:
+        return None
+    if training.get("params", MODEL_PARAMS) != params:
+        return None
+    if training.get("split") not in ("per_segment", "row_hash"):
+        return None  # split rule unknown: the held-out rows cannot be rebuilt
+    start = time.perf_counter()
+    appended = read_appended(csv_path, training["source"])
+    if appended is None:
+        return None
+    raw, source = appended
+    version = incremental_version(base.version, training["source"], source)
+    existing = load_artifact(version, artifact_dir)
+    if existing is not None:
+        return existing
+    seconds = {"read": time.perf_counter() - start}
+
+    new_rows, _ = clean_listings(raw, training["cleaning"])
+    sums = merge_sums(base.district_sums, listing_sums(new_rows))
+    rank_map = rank_map_from_sums(sums)
+
+    df_clean = pd.concat([base.df_clean, new_rows])
+    for col in _CATEGORY_COLS:  # union of both category sets, sorted like a full read
+        df_clean[col] = df_clean[col].astype("category")
+    seconds["clean"] = time.perf_counter() - start - sum(seconds.values())
+    X, y, _ = engineer_features(df_clean, rank_map)
+    seconds["engineer"] = time.perf_counter() - start - sum(seconds.values())
+
+    model = base.model
+    segments = [*training["segments"], len(new_rows)]
+    test = _test_mask(training["split"], segments, df_clean.index.to_numpy(), params["split"])
+    new_train = np.flatnonzero(~test[len(base.df_clean):]) + len(base.df_clean)
+    if len(new_train):
+        model = new_model("xgb", {**params["xgb"], "n_estimators": INCREMENTAL_ROUNDS})
+        model = fit_xgb(model, X.iloc[new_train], y.iloc[new_train], xgb_model=base.model.get_booster())
+    seconds["fit_xgb"] = time.perf_counter() - start - sum(seconds.values())
+
+    r2 = float(r2_score(y[test], model.predict(X[test])))
+    if base.r2 - r2 > INCREMENTAL_MAX_R2_DROP:
+        return None
+    stats, district_data = summarize_sums(sums, r2)
+    base_trees = base.model.get_booster().num_boosted_rounds()
+    return Artifact(
+        version, model, r2, rank_map, df_clean, stats, district_data, base.comparison, sums,
+        {
+            **training,
+            "mode": "incremental",
+            "parent": base.version,
+            "steps": training["steps"] + 1,
+            "segments": segments,
+            "source": source,
+            "appended": {"rows": len(raw), "cleaned": len(new_rows)},
+            "seconds": {**seconds, "total": time.perf_counter() - start},
+            "xgb": {
+                "options": xgb_options(),
+                "trees": model.get_booster().num_boosted_rounds(),
+                "max_trees": base_trees + (INCREMENTAL_ROUNDS if len(new_train) else 0),
+                "seconds": round(seconds["fit_xgb"], 3),
+                "r2": round(r2, 4),
+                "continued_from": base.version,
+            },
+            # full build whose comparison table this artifact still carries
+            "inherited": {"comparison": training.get("inherited", {}).get("comparison", base.version)},
+        },
+    )
@@ -0,0 +1,207 @@
+"""Dedicated, bounded executor for CPU-bound prediction work.
+
+Prediction handlers hand feature encoding + inplace_predict to this
+executor instead of the shared AnyIO threadpool, so a burst of predictions
+cannot starve the other endpoints of threads. Admission is bounded: at most
+`workers` jobs run and `max_queue` wait; beyond that the caller gets
+ExecutorSaturated (mapped to 503 + Retry-After in main.py) instead of an
+ever-growing backlog. Queue wait and service times are recorded per job.
+
+mode="process" runs jobs in a spawn-based process pool instead, sidestepping
+the GIL. The serving predictor (XGBoost booster or native TreeEnsemble) is
+serialized once per model version into a multiprocessing.shared_memory block;
+workers load it from there on first use and keep it until the version
+changes, so tasks only ship the feature rows.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, Union
+
+import numpy as np
+
+from model import feature_encoder
+from native import TreeEnsemble
+
+if TYPE_CHECKING:
+    from xgboost import Booster
+
+# Completed jobs kept for the latency percentiles in stats()
+LATENCY_WINDOW = 2048
+
+
+class ExecutorSaturated(Exception):
+    """All workers are busy and the wait queue is full."""
+
+
+class SharedModel(NamedTuple):
+    """Picklable reference to a predictor serialized into shared memory."""
+
+    name: str
+    size: int
+    native: bool  # TreeEnsemble .npz instead of an XGBoost UBJSON model
+
+
+Predictor = Union["Booster", TreeEnsemble]  # both expose inplace_predict(X)
+ModelRef = Union[Predictor, SharedModel]
+
+
+def _serialize(predictor: Predictor) -> bytes:
+    if isinstance(predictor, TreeEnsemble):
+        buffer = io.BytesIO()
+        predictor.save(buffer)
+        return buffer.getvalue()
+    return bytes(predictor.save_raw("ubj"))
+
+
+# --- Worker side (runs in pool threads, or in pool processes with mode="process") ---
+_worker_model: dict[str, Predictor] = {}
+
+
+def _predictor(ref: ModelRef) -> Predictor:
+    if not isinstance(ref, SharedModel):
+        return ref
+    predictor = _worker_model.get(ref.name)
+    if predictor is None:
+        shm = SharedMemory(name=ref.name)
+        try:
+            raw = bytes(shm.buf[:ref.size])
+        finally:
+            shm.close()
+        if ref.native:
+            predictor = TreeEnsemble.load(io.BytesIO(raw))
+        else:
+            from xgboost import Booster
+
+            predictor = Booster()
+            predictor.load_model(bytearray(raw))
+            predictor.set_param({"nthread": 1})  # the pool already provides the parallelism
+        _worker_model.clear()  # one version per worker
+        _worker_model[ref.name] = predictor
+    return predictor
+
+
+def predict_one(ref: ModelRef, features: dict) -> float:
+    """Price for one input; `features` holds FeatureEncoder.encode's keyword arguments."""
+    return float(_predictor(ref).inplace_predict(feature_encoder.encode(**features))[0])
+
+
+def predict_many(ref: ModelRef, rows: list[dict]) -> np.ndarray:
+    """Prices for a batch of encode_batch rows."""
+    if not rows:
+        return np.zeros(0, dtype=np.float32)
+    return _predictor(ref).inplace_predict(feature_encoder.encode_batch(rows))
+
+
+def _timed(fn: Callable, args: tuple) -> tuple[Any, float, float]:
+    start = time.monotonic()  # system-wide clock, comparable across processes
+    result = fn(*args)
+    return result, start, time.monotonic()
+
+
+# --- Executor ---
+class InferenceExecutor:
+    """Bounded thread or process pool with queue-depth and latency counters."""
+
+    def __init__(self, workers: int, max_queue: int, mode: str = "thread", retry_after: int = 1):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference mode {mode!r} (expected 'thread' or 'process')")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.mode = mode
+        self.retry_after = retry_after
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._in_flight = 0
+        self._latencies: deque[tuple[float, float]] = deque(maxlen=LATENCY_WINDOW)  # (queue wait, service)
+        self._lock = threading.Lock()
+        self._shared: dict[str, tuple[SharedMemory, SharedModel]] = {}  # version -> serialized booster
+        self._pool: Executor
+        if mode == "process":
+            self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            for _ in range(workers):  # start the workers (and their imports) now, not on the first request
+                self._pool.submit(_timed, int, ())
+        else:
+            self._pool = ThreadPoolExecutor(workers, thread_name_prefix="inference")
+
+    def model_ref(self, version: str, predictor: Predictor) -> ModelRef:
+        """What to pass to predict_one / predict_many for this model version."""
+        if self.mode == "thread":
+            return predictor
+        with self._lock:
+            entry = self._shared.get(version)
+            if entry is None:
+                raw = _serialize(predictor)
+                shm = SharedMemory(create=True, size=len(raw))
+                shm.buf[:len(raw)] = raw
+                # Keep the previous version around for jobs that are still queued
+                for old in list(self._shared)[:-1]:
+                    self._release(self._shared.pop(old)[0])
+                ref = SharedModel(shm.name, len(raw), isinstance(predictor, TreeEnsemble))
+                entry = self._shared[version] = (shm, ref)
+        return entry[1]
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run fn(*args) on the pool, or raise ExecutorSaturated if the queue is full."""
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated()
+            self._in_flight += 1
+        submitted = time.monotonic()
+        try:
+            result, start, end = await asyncio.get_running_loop().run_in_executor(self._pool, _timed, fn, args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        with self._lock:
+            self.completed += 1
+            self._latencies.append((start - submitted, end - start))
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = self._in_flight
+            latencies = np.array(self._latencies) if self._latencies else np.zeros((0, 2))
+            counters = {"completed": self.completed, "rejected": self.rejected, "failed": self.failed}
+
+        def percentiles(values: np.ndarray) -> dict:
+            if not len(values):
+                return {"p50_ms": None, "p99_ms": None}
+            p50, p99 = np.percentile(values, [50, 99]) * 1000
+            return {"p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3)}
+
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "queue_depth": max(0, in_flight - self.workers),
+            **counters,
+            "queue_wait": percentiles(latencies[:, 0]),
+            "service_time": percentiles(latencies[:, 1]),
+        }
+
+    @staticmethod
+    def _release(shm: SharedMemory) -> None:
+        shm.close()
+        shm.unlink()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        for shm, _ in self._shared.values():
+            self._release(shm)
+        self._shared.clear()
@@ -0,0 +1,67 @@
+"""Slim read-only store of the listing columns the API reads at serving time.
+
+The cleaned DataFrame carries every column training needs, but serving only
+reads four of them, to build the /api/chart-data payloads: quan, dien_tich,
+gia and phap_ly. ListingStore keeps just those as flat NumPy arrays (struct
+of arrays, no index):
+
+- quan and phap_ly dictionary-encoded as int8/int16 codes into tuples of
+  category names (-1 = missing, as in pandas),
+- dien_tich and gia as float32 when every value round-trips exactly,
+  otherwise float64, since the scatter chart returns them verbatim.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+
+def _codes(series: pd.Series) -> tuple[tuple[str, ...], np.ndarray]:
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    return tuple(series.cat.categories), series.cat.codes.to_numpy()
+
+
+def _narrow(series: pd.Series) -> np.ndarray:
+    """float32 if that represents every value exactly, else the float64 values unchanged."""
+    values = series.to_numpy(dtype=np.float64)
+    narrow = values.astype(np.float32)
+    return narrow if np.array_equal(narrow, values, equal_nan=True) else values
+
+
+@dataclass(frozen=True)
+class ListingStore:
+    districts: tuple[str, ...]
+    district_code: np.ndarray  # index into districts per listing
+    legal_statuses: tuple[str, ...]
+    legal_code: np.ndarray  # index into legal_statuses per listing
+    area: np.ndarray  # dien_tich, m²
+    price: np.ndarray  # gia, VND
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> ListingStore:
+        districts, district_code = _codes(df["quan"])
+        legal_statuses, legal_code = _codes(df["phap_ly"])
+        return cls(districts, district_code, legal_statuses, legal_code, _narrow(df["dien_tich"]), _narrow(df["gia"]))
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the per-listing arrays (the category tuples are shared and tiny)."""
+        return sum(getattr(self, f.name).nbytes for f in fields(self) if f.name.endswith(("code", "area", "price")))
+
+    def district_rows(self) -> dict[str, np.ndarray]:
+        """Ascending row positions per district present, in category order (like groupby(...).indices)."""
+        order = np.argsort(self.district_code, kind="stable")
+        codes, starts = np.unique(self.district_code[order], return_index=True)
+        groups = np.split(order, starts[1:])
+        return {self.districts[code]: rows for code, rows in zip(codes, groups) if code >= 0}
+
+    def legal_status_counts(self) -> pd.Series:
+        """Listings per legal status, most common first (same order as DataFrame value_counts)."""
+        return pd.Series(pd.Categorical.from_codes(self.legal_code, self.legal_statuses)).value_counts()
@@ -1,39 +1,118 @@
 """FastAPI backend for HCM Apartment Price Prediction.
 
-Trains XGBoost model on startup, serves 4 API endpoints + health check.
+Loads (or trains on a cache miss) the model artifact on startup, or attaches
+to the copy serve.py shares between its workers, serves 4 API endpoints (plus
+batch prediction) + health check, and can hot-swap a new artifact at runtime
+(admin endpoint or file watch, see reloader.py). Prometheus metrics are
+served on /metrics (see metrics.py). Price curves over the area / distance
+sliders come from a precomputed grid (see grid.py).
 """
 
 from __future__ import annotations
 
 import os
+import secrets
+import time
 from contextlib import asynccontextmanager
-from typing import Literal, Optional
+from typing import Annotated, AsyncIterator, Literal, Optional
 
 import numpy as np
-import pandas as pd
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 
-from model import train_model, train_all_models, build_prediction_features, FEATURE_COLS
+from artifacts import (
+    DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, Artifact, load_artifact, load_or_build, load_prebuilt, publish_latest,
+    read_latest,
+)
+from batcher import MicroBatcher
+from grid import AREA_RANGE, DISTANCE_RANGE, GRID_AREA_STEP, GRID_DISTANCE_STEP, grid_axis
+from inference import ExecutorSaturated, InferenceExecutor, predict_many, predict_one
+from metrics import CONTENT_TYPE, HttpMetrics, MetricsMiddleware, Registry, gauge, lap
+from predict_cache import PredictionCache
+from reloader import ModelReloader
+from serving import ServingState
+from shared_state import attach
 
 # --- Global state populated on startup ---
-model = None
-cached_stats: dict = {}
-district_data: list[dict] = []
-district_rank_map: dict[str, float] = {}
-df_clean_global: pd.DataFrame = pd.DataFrame()
-comparison_data: dict = {}
+# Current serving snapshot. Handlers read it once into a local and use only that;
+# reloads replace the whole reference, never mutate it.
+state: Optional[ServingState] = None
+reloader: Optional[ModelReloader] = None
+inference: Optional[InferenceExecutor] = None
+batcher: Optional[MicroBatcher] = None
+# Wall time per startup phase of lifespan (api_startup_phase_seconds)
+startup_seconds: dict[str, float] = {}
+# Training phases inside the "build" startup phase, when built at startup (api_build_phase_seconds)
+build_seconds: dict[str, float] = {}
+
+# Max listings per /api/predict/batch request
+MAX_BATCH_SIZE = int(os.environ.get("PREDICT_BATCH_MAX", "10000"))
+# Max /api/predict/batch body size, checked against Content-Length and while reading; default 1 KiB per listing
+MAX_BATCH_BYTES = int(os.environ.get("PREDICT_BATCH_MAX_BYTES", str(MAX_BATCH_SIZE * 1024)))
+# Max bytes of one NDJSON line (one listing)
+MAX_NDJSON_LINE_BYTES = 16 * 1024
+# Cache-Control max-age (seconds) for the analytics endpoints; 0 = always revalidate via ETag
+RESPONSE_MAX_AGE = int(os.environ.get("RESPONSE_MAX_AGE", "0"))
+# Shared secret for /api/admin/* (X-Admin-Token header); admin API is disabled when unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# Poll LATEST every N seconds and hot-reload on change; 0 = off
+RELOAD_WATCH_INTERVAL = float(os.environ.get("RELOAD_WATCH_INTERVAL", "0"))
+# Check the CSV every N seconds and retrain in the background when it changed; 0 = off
+RETRAIN_INTERVAL = float(os.environ.get("RETRAIN_INTERVAL", "0"))
+# "incremental" (continue the served model on appended rows) or "full"
+RETRAIN_MODE = os.environ.get("RETRAIN_MODE", "incremental")
+
+# /api/predict result cache (size 0 disables it); cleared whenever the model version changes
+predict_cache = PredictionCache(
+    max_size=int(os.environ.get("PREDICT_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.environ.get("PREDICT_CACHE_TTL", "3600")),
+)
+
 
+# Predict with the XGBoost booster ("xgboost") or its NumPy tree export ("native", see native.py)
+SERVING_BACKEND = os.environ.get("SERVING_BACKEND", "xgboost")
+# Serving-only workers load prebuilt artifacts (train.py) and never train, so scikit-learn
+# and the training code are never imported (nor xgboost with SERVING_BACKEND=native)
+SERVING_ONLY = os.environ.get("SERVING_ONLY", "0") == "1"
+# Shared memory block with the artifact, published by serve.py for all its workers (see shared_state.py)
+SHARED_STATE = os.environ.get("SHARED_STATE", "")
+# Dedicated prediction executor: "thread" or "process" pool, worker count, and how many
+# jobs may wait before /api/predict* answers 503 with Retry-After
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "thread")
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_QUEUE = int(os.environ.get("INFERENCE_QUEUE", "64"))
+INFERENCE_RETRY_AFTER = int(os.environ.get("INFERENCE_RETRY_AFTER", "1"))
+# Opt-in micro-batching of concurrent /api/predict calls: collect for up to N µs (0 = off) or M rows
+PREDICT_MICROBATCH_WAIT_US = int(os.environ.get("PREDICT_MICROBATCH_WAIT_US", "0"))
+PREDICT_MICROBATCH_ROWS = int(os.environ.get("PREDICT_MICROBATCH_ROWS", "64"))
+# Per-route latency histograms and per-stage timings on /metrics; 0 = only the scrape-time gauges
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+registry = Registry()
+http_metrics = HttpMetrics(registry)
+
+
+# Answer /api/predict from the prediction grid when the interpolation error estimate of the
+# input's cell is at most this (relative, e.g. 0.01 = 1%); 0 = always call the model
+PREDICT_GRID_MAX_ERROR = float(os.environ.get("PREDICT_GRID_MAX_ERROR", "0"))
+# /api/predict calls answered from the grid ("hits") or passed on to the model ("misses")
+grid_lookups = {"hits": 0, "misses": 0}
 
 # --- Pydantic schemas ---
+NoiThat = Literal["Cao_cap", "Day_du", "Co_ban", "Tho", "Khong_noi_that"]
+PhapLy = Literal["Dang_cho_so", "Hop_dong_dat_coc", "Hop_dong_mua_ban", "So_hong_rieng", "Khac"]
+
+
 class PredictionInput(BaseModel):
     dien_tich: float = Field(gt=20, le=300, description="Area in m²")
     quan: str = Field(description="District name")
     so_phong: int = Field(ge=1, le=5, description="Number of bedrooms")
     so_wc: int = Field(ge=1, le=4, description="Number of bathrooms")
-    noi_that: Literal["Cao_cap", "Day_du", "Co_ban", "Tho", "Khong_noi_that"]
-    phap_ly: Literal["Dang_cho_so", "Hop_dong_dat_coc", "Hop_dong_mua_ban", "So_hong_rieng", "Khac"]
+    noi_that: NoiThat
+    phap_ly: PhapLy
     khoang_cach_q1_km: float = Field(ge=0, le=25, description="Distance to District 1 in km")
 
 
@@ -45,45 +124,109 @@ class PredictionOutput(BaseModel):
     input_summary: dict
 
 
+class BatchPredictionOutput(BaseModel):
+    predictions: list[PredictionOutput]
+
+
+# max_length makes validation stop at the first listing past the cap
+_batch_adapter = TypeAdapter(Annotated[list[PredictionInput], Field(max_length=MAX_BATCH_SIZE)])
+
+
 # --- Startup / shutdown ---
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    global model, cached_stats, district_data, district_rank_map, df_clean_global, comparison_data
-
-    csv_path = os.path.join(os.path.dirname(__file__), "data", "apartments.csv")
-    print(f"Training model from {csv_path}...")
-
-    model, r2, df_clean, rank_map = train_model(csv_path)
-    df_clean_global = df_clean
-    district_rank_map = rank_map
-    print(f"Model trained. R² = {r2:.4f}, rows = {len(df_clean)}")
-
-    # Cache stats
-    cached_stats = {
-        "total_listings": len(df_clean),
-        "avg_price": float(df_clean["gia"].mean()),
-        "avg_price_per_m2": float(df_clean["gia_m2"].mean()),
-        "num_districts": df_clean["quan"].nunique(),
-        "model_r2_score": round(r2, 4),
-    }
+def _swap_state(artifact: Artifact) -> None:
+    """Build a snapshot for artifact and publish it with one reference assignment."""
+    global state
+    state = ServingState.from_artifact(artifact, response_max_age=RESPONSE_MAX_AGE, backend=SERVING_BACKEND)
 
-    # Build district data
-    district_agg = df_clean.groupby("quan").agg(
-        avg_price=("gia", "mean"),
-        avg_price_m2=("gia_m2", "mean"),
-        count=("gia", "count"),
-    ).reset_index()
-    district_data = [
-        {"name": row["quan"], "avg_price": round(row["avg_price"]), "avg_price_m2": round(row["avg_price_m2"], 2), "count": int(row["count"])}
-        for _, row in district_agg.sort_values("avg_price", ascending=False).iterrows()
-    ]
 
-    # Train all models for comparison page
-    print("Training comparison models...")
-    comparison_data = train_all_models(csv_path)
-    print(f"Comparison models trained: {len(comparison_data['metrics'])} models")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global reloader, inference, batcher
+
+    csv_path = os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH)
+    artifact_dir = os.environ.get("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+    print(f"Loading model artifact for {csv_path}...")
+    startup_seconds.clear()
+    build_seconds.clear()
+    started = last = time.perf_counter()
+
+    def phase(name: str) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        startup_seconds[name] = now - last
+        last = now
+
+    with_model = SERVING_BACKEND != "native"
+    if SHARED_STATE:
+        artifact, built = attach(SHARED_STATE, with_model), False
+    elif SERVING_ONLY:
+        artifact, built = load_prebuilt(csv_path, artifact_dir, with_model), False
+    else:
+        # Continue the published version (what SERVING_ONLY workers and serve.py load) on appended rows
+        latest = read_latest(artifact_dir) if RETRAIN_MODE == "incremental" else None
+        base = load_artifact(latest, artifact_dir) if latest else None
+        artifact, built = load_or_build(csv_path, artifact_dir, base=base)
+        del base
+        if built:
+            publish_latest(artifact.version, artifact_dir)
+    if built:  # read / clean / engineer / split / fit_<model> ran inside "build"
+        build_seconds.update((k, v) for k, v in artifact.training["seconds"].items() if k != "total")
+    phase("build" if built else "attach" if SHARED_STATE else "load")
+    _swap_state(artifact)
+    phase("serving_state")
+    action = "trained" if built else f"attached from {SHARED_STATE}" if SHARED_STATE else "loaded"
+    print(f"Model {action} (artifact {artifact.version}). R² = {artifact.r2:.4f}, rows = {len(artifact.df_clean)}")
+    if built and artifact.training["mode"] == "incremental":
+        appended = artifact.training["appended"]
+        print(
+            f"Incremental step {artifact.training['steps']} on {artifact.training['parent']}: "
+            f"+{appended['rows']} rows ({appended['cleaned']} after cleaning)"
+        )
+    inherited = artifact.training.get("inherited", {})  # incremental artifacts, see incremental.py
+    origin = f" (from full build {inherited['comparison']})" if "comparison" in inherited else ""
+    print(f"Comparison models: {len(artifact.comparison['metrics'])} models{origin}")
+    xgb = artifact.training.get("xgb")
+    if xgb:  # recorded when the artifact was built, see TrainingSession.xgb_report
+        options = ", ".join(f"{name}={value}" for name, value in xgb["options"].items())
+        tradeoff = f"{xgb['trees']}/{xgb['max_trees']} trees in {xgb['seconds']:.2f}s, R² = {xgb['r2']:.4f}"
+        if "default" in xgb:
+            d = xgb["default"]
+            tradeoff += f" (all options combined vs default options: {d['trees']} trees in {d['seconds']:.2f}s, R² = {d['r2']:.4f})"
+        if "continued_from" in xgb:  # incremental step: trees added to the parent's
+            tradeoff += f" (continued from {xgb['continued_from']})"
+        print(f"XGBoost training: {options} -> {tradeoff}")
+    del artifact  # the snapshot keeps only state.listings; let the training DataFrame go
+    print(f"Listing store: {state.listings.nbytes / 2**20:.1f} MiB, {state.listings.nbytes / max(len(state.listings), 1):.1f} B/row")
+
+    reloader = ModelReloader(
+        csv_path, artifact_dir, on_loaded=_swap_state, current_version=lambda: state.version,
+        retrain_mode=RETRAIN_MODE, serving_only=SERVING_ONLY, with_model=with_model,
+    )
+    if RELOAD_WATCH_INTERVAL > 0:
+        reloader.watch(RELOAD_WATCH_INTERVAL)
+        print(f"Watching {artifact_dir}/LATEST every {RELOAD_WATCH_INTERVAL:g}s")
+    if RETRAIN_INTERVAL > 0 and SERVING_ONLY:
+        print("RETRAIN_INTERVAL ignored in serving-only mode (retrain with train.py and watch LATEST)")
+    elif RETRAIN_INTERVAL > 0:
+        reloader.schedule(RETRAIN_INTERVAL)
+        print(f"Retraining ({RETRAIN_MODE}) when {csv_path} changes, checked every {RETRAIN_INTERVAL:g}s")
+
+    inference = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE, INFERENCE_MODE, INFERENCE_RETRY_AFTER)
+    print(f"Inference executor: {INFERENCE_WORKERS} {INFERENCE_MODE} workers, queue {INFERENCE_QUEUE}")
+    if PREDICT_MICROBATCH_WAIT_US > 0:
+        batcher = MicroBatcher(
+            lambda s, rows: _infer(predict_many, s, rows), PREDICT_MICROBATCH_WAIT_US, PREDICT_MICROBATCH_ROWS,
+        )
+        print(f"Micro-batching /api/predict: up to {PREDICT_MICROBATCH_WAIT_US}us or {PREDICT_MICROBATCH_ROWS} rows")
+    phase("executor")
+    startup_seconds["total"] = time.perf_counter() - started
+    print("Startup: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_seconds.items()))
+    if build_seconds:
+        print("Build: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in build_seconds.items()))
 
     yield  # app runs
+    reloader.stop()
+    inference.shutdown()
     print("Shutting down...")
 
 
@@ -93,110 +236,61 @@ app.add_middleware(
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=http_metrics)
 
 
 # --- Endpoints ---
 @app.get("/health")
 def health():
-    return {"status": "healthy", "model_loaded": model is not None}
+    return {"status": "healthy", "model_loaded": state is not None, "model_version": state and state.version}
 
 
 @app.get("/api/stats")
-def get_stats():
-    return cached_stats
+def get_stats(request: Request):
+    lap("validation")
+    s = state
+    return s.response_cache.respond(request, ("stats",), lambda: s.cached_stats)
 
 
 @app.get("/api/districts")
-def get_districts():
-    return district_data
+def get_districts(request: Request):
+    lap("validation")
+    s = state
+    return s.response_cache.respond(request, ("districts",), lambda: s.district_data)
 
 
 @app.get("/api/model-comparison")
-def get_model_comparison():
+def get_model_comparison(request: Request):
     """Return pre-computed model comparison data."""
-    return comparison_data
+    lap("validation")
+    s = state
+    return s.response_cache.respond(request, ("model-comparison",), lambda: s.comparison_data)
 
 
 @app.get("/api/chart-data")
-def get_chart_data(district: Optional[str] = Query(default=None)):
+def get_chart_data(request: Request, district: Optional[str] = Query(default=None)):
     """Return pre-aggregated chart data. Optionally filter by district."""
-    df = df_clean_global
-    if district:
-        df_filtered = df[df["quan"] == district]
-    else:
-        df_filtered = df
+    lap("validation")
+    s = state
+    # Unknown districts all get the same empty payload -> one shared cache entry
+    cache_key = district if not district or district in s.chart_index.by_district else "<unknown>"
+    return s.response_cache.respond(request, ("chart-data", cache_key), lambda: s.chart_index.get(district))
 
-    # 1. Price by district (always show all districts)
-    price_by_district = sorted(
-        [{"district": d["name"], "avg_price_m2": d["avg_price_m2"]} for d in district_data],
-        key=lambda x: x["avg_price_m2"], reverse=True,
-    )
 
-    # 2. Scatter: area vs price (max 500 points)
-    sample = df_filtered.sample(n=min(500, len(df_filtered)), random_state=42) if len(df_filtered) > 0 else df_filtered
-    area_price_data = [
-        {"area": round(float(r["dien_tich"]), 1), "price": float(r["gia"])}
-        for _, r in sample.iterrows()
-    ]
+def _rank_for(s: ServingState, quan: str) -> float:
+    """rank_quan for a district; unknown districts fall back to the median rank."""
+    return s.district_rank_map.get(quan, s.fallback_rank)
 
-    # 3. Price histogram (10 bins)
-    if len(df_filtered) > 0:
-        prices = df_filtered["gia"] / 1e9  # convert to billions
-        counts, edges = np.histogram(prices, bins=10)
-        price_bins = [
-            {"range": f"{edges[i]:.1f}-{edges[i+1]:.1f}", "count": int(counts[i])}
-            for i in range(len(counts))
-        ]
-    else:
-        price_bins = []
 
-    # 4. Feature importance from XGBoost
-    importances = model.feature_importances_
-    feature_importance = sorted(
-        [{"feature": name, "importance": round(float(imp), 4)} for name, imp in zip(FEATURE_COLS, importances)],
-        key=lambda x: x["importance"], reverse=True,
-    )
-
-    # 5. Legal status distribution (from full dataset, not filtered)
-    legal_counts = df_clean_global["phap_ly"].value_counts()
-    legal_status_distribution = [
-        {"status": str(status), "count": int(count)}
-        for status, count in legal_counts.items()
-    ]
-
-    return {
-        "price_by_district": price_by_district,
-        "area_price_data": area_price_data,
-        "price_bins": price_bins,
-        "feature_importance": feature_importance,
-        "legal_status_distribution": legal_status_distribution,
-    }
-
-
-@app.post("/api/predict", response_model=PredictionOutput)
-def predict(input_data: PredictionInput):
-    # Get rank_quan for the selected district
-    rank_quan = district_rank_map.get(input_data.quan)
-    if rank_quan is None:
-        # Fallback: use median rank if district not found
-        rank_quan = float(np.median(list(district_rank_map.values())))
-
-    features = build_prediction_features(
-        dien_tich=input_data.dien_tich,
-        so_phong=input_data.so_phong,
-        so_wc=input_data.so_wc,
-        khoang_cach_q1_km=input_data.khoang_cach_q1_km,
-        rank_quan=rank_quan,
-        phap_ly=input_data.phap_ly,
-        noi_that=input_data.noi_that,
-    )
-
-    predicted_price = float(model.predict(features)[0])
+def _build_output(s: ServingState, input_data: PredictionInput, predicted_price: float) -> PredictionOutput:
+    """Wrap a raw model prediction into the API response (district comparison etc.)."""
     price_per_m2 = predicted_price / input_data.dien_tich
 
     # Find district avg price for comparison
-    district_avg = next((d["avg_price"] for d in district_data if d["name"] == input_data.quan), predicted_price)
+    district_avg = s.district_avg_price.get(input_data.quan, predicted_price)
     if predicted_price > district_avg * 1.05:
         comparison = "Cao hơn trung bình quận"
     elif predicted_price < district_avg * 0.95:
@@ -216,3 +310,338 @@ def predict(input_data: PredictionInput):
             "bathrooms": input_data.so_wc,
         },
     )
+
+
+def _cache_key(input_data: PredictionInput) -> tuple:
+    """Canonical input tuple (pydantic has already coerced types, e.g. 65 -> 65.0)."""
+    return (
+        input_data.quan, input_data.dien_tich, input_data.so_phong, input_data.so_wc,
+        input_data.noi_that, input_data.phap_ly, input_data.khoang_cach_q1_km,
+    )
+
+
+async def _infer(fn, s: ServingState, payload):
+    """Run a prediction job on the inference executor (503 + Retry-After when saturated)."""
+    try:
+        return await inference.run(fn, inference.model_ref(s.version, s.predictor), payload)
+    except ExecutorSaturated:
+        raise HTTPException(
+            status_code=503, detail="Prediction queue is full, retry later",
+            headers={"Retry-After": str(inference.retry_after)},
+        )
+
+
+def _grid_price(s: ServingState, input_data: PredictionInput) -> Optional[float]:
+    """Interpolated grid price, if enabled and the input's cell is within PREDICT_GRID_MAX_ERROR."""
+    if PREDICT_GRID_MAX_ERROR <= 0 or s.grid is None:
+        return None
+    key = s.grid.key(input_data.quan, input_data.so_phong, input_data.so_wc, input_data.noi_that, input_data.phap_ly)
+    hit = key and s.grid.point(key, input_data.dien_tich, input_data.khoang_cach_q1_km)
+    lap("grid_lookup")
+    if hit is None or hit[1] > PREDICT_GRID_MAX_ERROR:
+        grid_lookups["misses"] += 1
+        return None
+    grid_lookups["hits"] += 1
+    return hit[0]
+
+
+async def _model_price(s: ServingState, input_data: PredictionInput) -> float:
+    rank_quan = _rank_for(s, input_data.quan)
+    lap("rank_lookup")
+    features = {
+        "dien_tich": input_data.dien_tich,
+        "so_phong": input_data.so_phong,
+        "so_wc": input_data.so_wc,
+        "khoang_cach_q1_km": input_data.khoang_cach_q1_km,
+        "rank_quan": rank_quan,
+        "phap_ly": input_data.phap_ly,
+        "noi_that": input_data.noi_that,
+    }
+    lap("feature_build")
+    # Executor queue wait + encoding + inplace_predict (+ micro-batch wait)
+    if batcher is not None:
+        predicted_price = await batcher.predict(s, features)
+    else:
+        predicted_price = await _infer(predict_one, s, features)
+    lap("model_predict")
+    return predicted_price
+
+
+@app.post("/api/predict", response_model=PredictionOutput)
+async def predict(input_data: PredictionInput):
+    lap("validation")  # body read + pydantic validation, before the handler runs
+    s = state
+    if predict_cache.enabled:
+        key = _cache_key(input_data)
+        cached = predict_cache.get(key, s.version)
+        lap("cache_lookup")
+        if cached is not None:
+            return cached
+
+    predicted_price = _grid_price(s, input_data)
+    if predicted_price is None:
+        predicted_price = await _model_price(s, input_data)
+    output = _build_output(s, input_data, predicted_price)
+    if predict_cache.enabled:
+        predict_cache.put(key, s.version, output)
+    lap("response_build")
+    return output
+
+
+@app.get("/api/predict/grid")
+async def get_prediction_grid(
+    quan: str = Query(description="District name"),
+    so_phong: int = Query(ge=1, le=5),
+    so_wc: int = Query(ge=1, le=4),
+    noi_that: NoiThat = Query(),
+    phap_ly: PhapLy = Query(),
+    dien_tich: Optional[float] = Query(default=None, gt=20, le=300, description="Fix the area: curve over distance"),
+    khoang_cach_q1_km: Optional[float] = Query(default=None, ge=0, le=25, description="Fix the distance: curve over area"),
+):
+    """Predicted prices over the area / distance sliders for one listing profile.
+
+    With neither slider fixed, returns the whole surface (prices[i][j] for
+    dien_tich[i], khoang_cach_q1_km[j]); with one fixed, the curve along the
+    other. Read from the precomputed grid, with max_error the largest
+    interpolation error estimate among the cells used; model versions without
+    a grid are evaluated on the model over the same default axes instead.
+    """
+    lap("validation")
+    if dien_tich is not None and khoang_cach_q1_km is not None:
+        raise HTTPException(status_code=400, detail="Fix at most one slider; use /api/predict for a single point")
+    s = state
+    key = s.grid and s.grid.key(quan, so_phong, so_wc, noi_that, phap_ly)
+    if key is not None:
+        prices, max_error = s.grid.curve(key, dien_tich, khoang_cach_q1_km)
+        area, distance, source = s.grid.area, s.grid.distance, "grid"
+        lap("grid_lookup")
+    else:
+        area = grid_axis(AREA_RANGE, GRID_AREA_STEP) if dien_tich is None else [dien_tich]
+        distance = grid_axis(DISTANCE_RANGE, GRID_DISTANCE_STEP) if khoang_cach_q1_km is None else [khoang_cach_q1_km]
+        rank_quan = _rank_for(s, quan)
+        rows = [
+            {"dien_tich": float(a), "so_phong": so_phong, "so_wc": so_wc, "khoang_cach_q1_km": float(d),
+             "rank_quan": rank_quan, "phap_ly": phap_ly, "noi_that": noi_that}
+            for a in area for d in distance
+        ]
+        lap("feature_build")
+        prices = (await _infer(predict_many, s, rows)).reshape(len(area), len(distance)).squeeze()
+        max_error, source = 0.0, "model"
+        lap("model_predict")
+    payload = {
+        "model_version": s.version,
+        "source": source,
+        "dien_tich": dien_tich if dien_tich is not None else [float(a) for a in area],
+        "khoang_cach_q1_km": khoang_cach_q1_km if khoang_cach_q1_km is not None else [float(d) for d in distance],
+        "prices": np.rint(prices).astype(np.int64).tolist(),
+        "max_error": max_error,
+    }
+    lap("response_build")
+    return payload
+
+
+@app.get("/api/predict/cache-stats")
+def get_predict_cache_stats():
+    """Hit/miss/eviction counters of the /api/predict result cache."""
+    return predict_cache.stats()
+
+
+@app.get("/api/predict/executor-stats")
+def get_predict_executor_stats():
+    """Queue depth, rejections and queue-wait / service-time percentiles of the inference executor."""
+    return {**inference.stats(), "micro_batching": batcher.stats() if batcher is not None else None}
+
+
+def _batch_rows(s: ServingState, inputs: list[PredictionInput]) -> list[dict]:
+    return [{**item.model_dump(exclude={"quan"}), "rank_quan": _rank_for(s, item.quan)} for item in inputs]
+
+
+def _batch_output(s: ServingState, inputs: list[PredictionInput], prices) -> BatchPredictionOutput:
+    return BatchPredictionOutput(
+        predictions=[_build_output(s, item, float(p)) for item, p in zip(inputs, prices)]
+    )
+
+
+def _batch_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} listings")
+
+
+async def _read_capped(request: Request) -> AsyncIterator[bytes]:
+    """Body chunks, answering 413 once Content-Length or the bytes received exceed MAX_BATCH_BYTES."""
+    too_large = HTTPException(status_code=413, detail=f"Batch body exceeds {MAX_BATCH_BYTES} bytes")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > MAX_BATCH_BYTES:
+        raise too_large
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_BATCH_BYTES:
+            raise too_large
+        yield chunk
+
+
+async def _read_json_batch(request: Request) -> list[PredictionInput]:
+    """Parse a JSON array body; the listing cap is enforced during validation."""
+    body = b"".join([chunk async for chunk in _read_capped(request)])
+    try:
+        return _batch_adapter.validate_json(body)
+    except ValidationError as e:
+        errors = e.errors(include_url=False)
+        if any(err["type"] == "too_long" and err["loc"] == () for err in errors):
+            raise _batch_too_large()
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in errors])
+
+
+async def _read_ndjson(request: Request) -> list[PredictionInput]:
+    """Parse an NDJSON body line by line while it streams in, enforcing the caps early."""
+    inputs: list[PredictionInput] = []
+    buffer = b""
+
+    def parse(line: bytes) -> None:
+        if not line.strip():
+            return
+        if len(inputs) >= MAX_BATCH_SIZE:
+            raise _batch_too_large()
+        try:
+            inputs.append(PredictionInput.model_validate_json(line))
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**err, "loc": ("body", len(inputs), *err["loc"])} for err in e.errors(include_url=False)]
+            )
+
+    async for chunk in _read_capped(request):
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse(line)
+        if len(buffer) > MAX_NDJSON_LINE_BYTES:  # a line that never ends
+            raise HTTPException(status_code=413, detail=f"NDJSON line exceeds {MAX_NDJSON_LINE_BYTES} bytes")
+    parse(buffer)
+    return inputs
+
+
+@app.post("/api/predict/batch", response_model=BatchPredictionOutput)
+async def predict_batch(request: Request):
+    """Predict many listings in one call.
+
+    Accepts a JSON array of PredictionInput objects, or NDJSON (one object per
+    line) with Content-Type application/x-ndjson. Results keep input order.
+    More than MAX_BATCH_SIZE listings, a body over MAX_BATCH_BYTES or an
+    NDJSON line over MAX_NDJSON_LINE_BYTES get a 413.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("application/x-ndjson", "application/jsonl")):
+        inputs = await _read_ndjson(request)
+    else:
+        inputs = await _read_json_batch(request)
+    lap("validation")
+    # Only the model call goes to the inference executor; request/response shaping stays on the AnyIO pool
+    s = state
+    rows = await run_in_threadpool(_batch_rows, s, inputs)
+    lap("feature_build")
+    prices = await _infer(predict_many, s, rows)
+    lap("model_predict")
+    output = await run_in_threadpool(_batch_output, s, inputs, prices)
+    lap("response_build")
+    return output
+
+
+# --- Metrics ---
+@registry.collector
+def _serving_metrics():
+    """Scrape-time gauges: startup and build phases, served model, caches, inference executor."""
+    families = [
+        gauge(
+            "api_startup_phase_seconds", "Wall time per lifespan startup phase",
+            (({"phase": name}, seconds) for name, seconds in startup_seconds.items()),
+        ),
+        gauge(
+            "api_build_phase_seconds", "Wall time per training phase inside the build startup phase (when built at startup)",
+            (({"phase": name}, seconds) for name, seconds in build_seconds.items()),
+        ),
+    ]
+    s = state
+    if s is None:
+        return families
+    predict_stats = predict_cache.stats()
+    caches = {
+        "predict": (predict_stats["hits"], predict_stats["misses"]),
+        "response": (s.response_cache.hits, s.response_cache.misses),  # current model version only
+        "grid": (grid_lookups["hits"], grid_lookups["misses"]),  # /api/predict answered from the grid
+    }
+    families += [
+        gauge("api_model_info", "Served model artifact (always 1)", [(
+            {"version": s.version, "backend": SERVING_BACKEND, "training_mode": s.training_mode}, 1,
+        )]),
+        gauge("api_model_r2", "Test R² of the served model", [({}, s.r2)]),
+        gauge("api_model_loaded_timestamp_seconds", "When the served model was swapped in", [({}, s.loaded_at)]),
+        gauge(
+            "api_model_training_seconds", "Wall time per training phase of the served model",
+            (({"phase": name}, seconds) for name, seconds in s.training_seconds.items()),
+        ),
+        gauge("api_cache_hits_total", "Cache hits", (({"cache": c}, h) for c, (h, _) in caches.items()), "counter"),
+        gauge("api_cache_misses_total", "Cache misses", (({"cache": c}, m) for c, (_, m) in caches.items()), "counter"),
+        gauge(
+            "api_cache_hit_ratio", "Hits / lookups since the cache was created",
+            (({"cache": c}, h / (h + m) if h + m else 0.0) for c, (h, m) in caches.items()),
+        ),
+    ]
+    if inference is not None:
+        executor = inference.stats()
+        families += [
+            gauge("api_inference_in_flight", "Prediction jobs running or queued", [({}, executor["in_flight"])]),
+            gauge("api_inference_queue_depth", "Prediction jobs waiting for a worker", [({}, executor["queue_depth"])]),
+            gauge(
+                "api_inference_jobs_total", "Prediction jobs by outcome",
+                (({"outcome": key}, executor[key]) for key in ("completed", "rejected", "failed")), "counter",
+            ),
+            gauge(
+                "api_inference_latency_seconds", "Queue wait / service time percentiles over recent jobs",
+                (
+                    ({"phase": phase, "quantile": q}, executor[phase][f"{p}_ms"] / 1000)
+                    for phase in ("queue_wait", "service_time") for q, p in (("0.5", "p50"), ("0.99", "p99"))
+                    if executor[phase][f"{p}_ms"] is not None
+                ),
+            ),
+        ]
+    if batcher is not None:
+        batching = batcher.stats()
+        families += [
+            gauge("api_microbatch_batches_total", "Micro-batches scored", [({}, batching["batches"])], "counter"),
+            gauge("api_microbatch_rows_total", "Rows scored through micro-batches", [({}, batching["rows"])], "counter"),
+        ]
+    return families
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus text exposition of all metrics."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+# --- Admin ---
+def _require_admin(token: Optional[str]) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled (set ADMIN_TOKEN)")
+    if not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.post("/api/admin/reload", status_code=202)
+def reload_model(
+    version: Optional[str] = Query(
+        default=None, pattern=r"^[0-9a-f]{16}$", description="Artifact version; default = artifact for the current CSV",
+    ),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Load a new model artifact in the background and swap it in atomically."""
+    _require_admin(x_admin_token)
+    if not reloader.trigger(version):
+        raise HTTPException(status_code=409, detail="A reload is already running")
+    return {"status": "started", "current_version": state.version}
+
+
+@app.get("/api/admin/reload")
+def get_reload_status(x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    return {**reloader.status, "current_version": state.version, "loaded_at": state.loaded_at}
@@ -0,0 +1,233 @@
+"""Prometheus metrics for the API, rendered in the text exposition format.
+
+No client library: the few metric types the API needs are implemented here so
+the per-request cost stays at a couple of dict lookups, a bisect and a lock
+per observation. Two kinds of metrics end up on /metrics:
+
+- Histograms and counters updated on the request path: per-route latency and
+  status counts (MetricsMiddleware), and per-stage timings inside a request.
+  Handlers call `lap(stage)` after each internal stage (validation, rank
+  lookup, feature build, model predict, ...); the middleware adds the time
+  from the handler's last lap to the response start as "serialization".
+- Gauges read at scrape time from the serving state, caches and executors
+  (collectors registered with Registry.collector).
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable, NamedTuple, Optional
+
+# Upper bounds (seconds) of the histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 2.5,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Route label for requests that matched no route (keeps label cardinality bounded)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Family(NamedTuple):
+    """One metric family as rendered: samples are (suffix, labels, value)."""
+
+    name: str
+    type: str  # "counter", "gauge" or "histogram"
+    help: str
+    samples: list[tuple[str, dict, float]]
+
+
+def gauge(name: str, help: str, samples: Iterable[tuple[dict, float]], kind: str = "gauge") -> Family:
+    """Family of plain samples ({labels}, value), e.g. built by a collector at scrape time."""
+    return Family(name, kind, help, [("", labels, value) for labels, value in samples])
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render(families: Iterable[Family]) -> str:
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.type}")
+        for suffix, labels, value in family.samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{family.name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{family.name}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...]):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def collect(self) -> Family:
+        with self._lock:
+            values = list(self._values.items())
+        return gauge(self.name, self.help, ((dict(zip(self.labelnames, k)), v) for k, v in values), "counter")
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # labels -> [count per bucket (+Inf last)..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)  # first bucket with value <= bound
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> Family:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        samples = []
+        for labels, values in series:
+            label_dict = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), values):
+                cumulative += count
+                samples.append(("_bucket", {**label_dict, "le": _format_value(bound)}, cumulative))
+            samples.append(("_sum", label_dict, values[-1]))
+            samples.append(("_count", label_dict, cumulative))
+        return Family(self.name, "histogram", self.help, samples)
+
+
+class Registry:
+    """Metrics updated in place plus collectors evaluated on every scrape."""
+
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...], buckets: tuple[float, ...]) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Family]]) -> Callable[[], Iterable[Family]]:
+        """Register fn (usable as a decorator); it runs on every scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        families = [metric.collect() for metric in self._metrics]
+        for collect in self._collectors:
+            families.extend(collect())
+        return render(families)
+
+
+# --- Per-request stage timing ---
+class RequestTimer:
+    """Time spent per stage of one request; each lap closes the stage that just ended."""
+
+    __slots__ = ("start", "last", "stages")
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+_timer: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+
+def lap(stage: str) -> None:
+    """Close `stage` of the current request (time since the previous lap, or since it arrived).
+
+    A stage lapped twice accumulates. No-op outside an instrumented request.
+    """
+    timer = _timer.get()
+    if timer is not None:
+        timer.lap(stage)
+
+
+class HttpMetrics:
+    """Request latency, status counts and stage timings, per route template."""
+
+    def __init__(self, registry: Registry):
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "Time from request arrival to the end of the response body",
+            ("method", "route"), LATENCY_BUCKETS,
+        )
+        self.requests = registry.counter("http_requests_total", "Requests by status code", ("method", "route", "status"))
+        self.stages = registry.histogram(
+            "api_stage_duration_seconds", "Time per internal stage of successful requests",
+            ("route", "stage"), STAGE_BUCKETS,
+        )
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware task hop) feeding HttpMetrics.
+
+    Stage timings are only recorded for responses below 400: a rejected
+    request never reaches its handler, so its time would land in whatever
+    stage is lapped last.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timer = RequestTimer()
+        token = _timer.set(timer)
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timer.lap("serialization")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _timer.reset(token)
+            elapsed = time.perf_counter() - timer.start
+            route = scope.get("route")  # set by the router on a match
+            path = route.path if route is not None else UNMATCHED_ROUTE
+            method = scope["method"]
+            self.metrics.latency.observe((method, path), elapsed)
+            self.metrics.requests.inc((method, path, str(status)))
+            if status < 400:
+                for stage, seconds in timer.stages.items():
+                    self.metrics.stages.observe((path, stage), seconds)
@@ -1,7 +1,7 @@
 """XGBoost model training and prediction for HCM apartment prices.
 
 Replicates the exact feature engineering pipeline from the thesis notebook:
-1. Drop unnecessary columns
+1. Read only the needed columns (the notebook drops the rest, see dataset.py)
 2. Map phap_ly/noi_that codes to strings
 3. Fill NaN, remove outliers (IQR + business rules)
 4. Target encoding for districts (rank_quan)
@@ -11,21 +11,21 @@ Replicates the exact feature engineering pipeline from the thesis notebook:
 
 from __future__ import annotations
 
+import importlib
 import os
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
-from sklearn.linear_model import LinearRegression, Ridge
-from sklearn.ensemble import RandomForestRegressor
-from xgboost import XGBRegressor
-
-# Columns to drop during cleaning (matching notebook exactly)
-COLS_TO_DROP = [
-    "huong_nha", "huong_ban_cong", "gia_hien_thi", "nguoi_ban",
-    "ngay_dang", "loai_tin", "link", "tieu_de", "duong", "phuong",
-    "thanh_pho", "latitude", "longitude",
-]
+
+from dataset import read_apartments
+
+# scikit-learn, xgboost, joblib and threadpoolctl are imported inside the training
+# functions, so serving (FeatureEncoder, constants) only pays for numpy/pandas
+if TYPE_CHECKING:
+    from xgboost import XGBRegressor
 
 PHAP_LY_MAP = {2: "Dang_cho_so", 4: "Hop_dong_dat_coc", 5: "Hop_dong_mua_ban", 6: "So_hong_rieng"}
 NOI_THAT_MAP = {1: "Cao_cap", 2: "Day_du", 3: "Co_ban", 4: "Tho"}
@@ -39,45 +39,124 @@ FEATURE_COLS = [
     *ONEHOT_PHAP_LY, *ONEHOT_NOI_THAT,
 ]
 
-
-def _remove_outliers_iqr(df: pd.DataFrame, column: str) -> pd.DataFrame:
-    """Remove outliers using IQR method (matching notebook)."""
-    q1 = df[column].quantile(0.25)
-    q3 = df[column].quantile(0.75)
+# XGBoost training options (serving model, comparison row, tuning trials); unset = xgboost defaults.
+# Tree construction: "hist", "approx" or "exact" (xgboost 2.x defaults to hist)
+XGB_TREE_METHOD = os.environ.get("XGB_TREE_METHOD", "")
+# Histogram bins per feature for hist/approx; 0 = xgboost default (256)
+XGB_MAX_BIN = int(os.environ.get("XGB_MAX_BIN", "0"))
+# Threads per XGBoost fit; 0 = the share of the cores fit_models gives each concurrent fit
+XGB_NTHREAD = int(os.environ.get("XGB_NTHREAD", "0"))
+# > 0: hold out XGB_VALIDATION_FRACTION of the training split and stop after N rounds
+# without improvement; the model keeps the trees up to its best iteration
+XGB_EARLY_STOPPING_ROUNDS = int(os.environ.get("XGB_EARLY_STOPPING_ROUNDS", "0"))
+XGB_VALIDATION_FRACTION = float(os.environ.get("XGB_VALIDATION_FRACTION", "0.1"))
+# 1: train from QuantileDMatrix built once per dataset (the validation rows reuse its
+# quantile cuts, tuning trials reuse one per fold) instead of per fit; same trees
+XGB_QUANTILE_DMATRIX = os.environ.get("XGB_QUANTILE_DMATRIX", "0") == "1"
+# 1: each build also fits the serving model once with default options and records the
+# combined time/R² difference (one extra fit; per-option numbers: bench/bench_xgb_training.py)
+XGB_COMPARE_DEFAULTS = os.environ.get("XGB_COMPARE_DEFAULTS", "0") == "1"
+
+# Hyperparameters (part of the artifact cache key, see artifacts.py)
+SPLIT_PARAMS = {"test_size": 0.2, "random_state": 42}
+XGB_PARAMS = {
+    "n_estimators": 100, "learning_rate": 0.1, "max_depth": 6, "random_state": 42,
+    **({"tree_method": XGB_TREE_METHOD} if XGB_TREE_METHOD else {}),
+    **({"max_bin": XGB_MAX_BIN} if XGB_MAX_BIN else {}),
+}
+RF_PARAMS = {"n_estimators": 100, "random_state": 42}
+RIDGE_PARAMS = {"alpha": 1.0}
+MODEL_PARAMS = {"split": SPLIT_PARAMS, "xgb": XGB_PARAMS, "rf": RF_PARAMS, "ridge": RIDGE_PARAMS}
+if XGB_EARLY_STOPPING_ROUNDS > 0:  # only keyed when on, so default artifact versions stay put
+    MODEL_PARAMS["xgb_early_stopping"] = {"rounds": XGB_EARLY_STOPPING_ROUNDS, "validation_fraction": XGB_VALIDATION_FRACTION}
+
+# Comparison-model training executor: "sequential", "threading" or "loky" (process pool)
+TRAIN_BACKEND = os.environ.get("TRAIN_BACKEND", "loky")
+# Concurrent fits; -1 = one per model, capped at the CPU count
+TRAIN_N_JOBS = int(os.environ.get("TRAIN_N_JOBS", "-1"))
+# Rows per chunk for the bounded-memory training pipeline (streaming.py); 0 = in-memory
+TRAIN_CHUNKSIZE = int(os.environ.get("TRAIN_CHUNKSIZE", "0"))
+# Chunked mode: LR / Ridge / RF of the comparison table fit on a sample of at most this many rows
+TRAIN_COMPARISON_ROWS = int(os.environ.get("TRAIN_COMPARISON_ROWS", "200000"))
+if TRAIN_CHUNKSIZE > 0:  # row-hash split and sampled comparison give a different artifact
+    MODEL_PARAMS["streaming"] = {"chunksize": TRAIN_CHUNKSIZE, "comparison_rows": TRAIN_COMPARISON_ROWS}
+
+
+def _iqr_fences(values: np.ndarray) -> tuple[float, float]:
+    """IQR fences for outlier removal (matching notebook), from one np.quantile call."""
+    if len(values) == 0:  # Series.quantile of no rows is NaN, which then keeps no rows
+        return float("nan"), float("nan")
+    q1, q3 = np.quantile(values, [0.25, 0.75])
     iqr = q3 - q1
-    return df[(df[column] >= q1 - 1.5 * iqr) & (df[column] <= q3 + 1.5 * iqr)]
+    return float(q1 - 1.5 * iqr), float(q3 + 1.5 * iqr)
 
 
-def load_and_clean(csv_path: str) -> pd.DataFrame:
-    """Load CSV and apply full cleaning pipeline from notebook."""
-    df = pd.read_csv(csv_path)
-    df_clean = df.drop(columns=[c for c in COLS_TO_DROP if c in df.columns])
+def _outlier_mask(gia: np.ndarray, dien_tich: np.ndarray, bounds: dict, fit: bool) -> np.ndarray:
+    """Rows kept by the notebook's row filters, as one boolean mask.
+
+    Same rows as filtering the DataFrame step by step: dropna on gia and
+    dien_tich, IQR on gia, IQR on dien_tich over the rows left after that,
+    then the business rules. Fitted fences are written into `bounds`.
+    """
+    keep = ~(np.isnan(gia) | np.isnan(dien_tich))
+    for column, values in (("gia", gia), ("dien_tich", dien_tich)):
+        if fit:
+            bounds[column] = _iqr_fences(values[keep])
+        lo, hi = bounds[column]
+        keep &= (values >= lo) & (values <= hi)
+    return keep & (gia > 500_000_000) & (dien_tich > 20)
+
+
+def clean_listings(df_clean: pd.DataFrame, params: Optional[dict] = None) -> tuple[pd.DataFrame, dict]:
+    """Apply the notebook cleaning pipeline to typed raw listings.
+
+    The so_wc fill value and IQR bounds are fitted on the given rows unless
+    `params` from an earlier run are passed, in which case they are applied
+    as-is (incremental training cleans appended rows like the rows they join).
+    Returns (df_clean, params).
+    """
+    fit = params is None
+    if fit:
+        params = {"so_wc_median": float(df_clean["so_wc"].median()), "bounds": {}}
 
     # Map categorical codes to strings
-    df_clean["phap_ly"] = df_clean["phap_ly"].map(PHAP_LY_MAP).fillna("Khac")
-    df_clean["noi_that"] = df_clean["noi_that"].map(NOI_THAT_MAP).fillna("Khong_noi_that")
+    df_clean["phap_ly"] = df_clean["phap_ly"].map(PHAP_LY_MAP).fillna("Khac").astype("category")
+    df_clean["noi_that"] = df_clean["noi_that"].map(NOI_THAT_MAP).fillna("Khong_noi_that").astype("category")
 
     # Handle missing values
-    df_clean["so_wc"] = df_clean["so_wc"].fillna(df_clean["so_wc"].median())
-    df_clean = df_clean.dropna(subset=["gia", "dien_tich"])
+    df_clean["so_wc"] = df_clean["so_wc"].fillna(params["so_wc_median"])
 
-    # Outlier removal: IQR then business rules
-    df_clean = _remove_outliers_iqr(df_clean, "gia")
-    df_clean = _remove_outliers_iqr(df_clean, "dien_tich")
-    df_clean = df_clean[(df_clean["gia"] > 500_000_000) & (df_clean["dien_tich"] > 20)]
+    # Missing gia/dien_tich, outliers (IQR on gia, then on dien_tich over the remaining
+    # rows) and business rules: one mask over the raw columns, one filtered copy
+    gia = df_clean["gia"].to_numpy(dtype=np.float64)
+    dien_tich = df_clean["dien_tich"].to_numpy(dtype=np.float64)
+    df_clean = df_clean.take(np.flatnonzero(_outlier_mask(gia, dien_tich, params["bounds"], fit)))
 
-    return df_clean
+    # Filtered-out labels must not show up in groupby / get_dummies / value_counts
+    for col in ("quan", "phap_ly", "noi_that"):
+        df_clean[col] = df_clean[col].cat.remove_unused_categories()
+    return df_clean, params
+
+
+def load_and_clean(csv_path: str) -> pd.DataFrame:
+    """Load CSV (schema columns only) and apply full cleaning pipeline from notebook."""
+    return clean_listings(read_apartments(csv_path))[0]
 
 
-def engineer_features(df_clean: pd.DataFrame) -> tuple[pd.DataFrame, dict[str, float]]:
+def engineer_features(
+    df_clean: pd.DataFrame, rank_map: Optional[dict[str, float]] = None,
+) -> tuple[pd.DataFrame, dict[str, float]]:
     """Apply feature engineering: rank_quan, tong_tien_ich, one-hot encoding.
 
+    `rank_map` skips the district groupby when the means are already known
+    (e.g. from running sums during incremental training).
     Returns (feature_df_with_target, district_rank_map).
     """
     # Target encoding: avg gia_m2 per district
-    rank_map = df_clean.groupby("quan")["gia_m2"].mean().to_dict()
+    if rank_map is None:
+        rank_map = df_clean.groupby("quan", observed=True)["gia_m2"].mean().to_dict()
     df_clean = df_clean.copy()
-    df_clean["rank_quan"] = df_clean["quan"].map(rank_map)
+    df_clean["rank_quan"] = df_clean["quan"].map(rank_map).astype("float64")
     df_clean["tong_tien_ich"] = df_clean["so_phong"] + df_clean["so_wc"]
 
     # Prepare X with one-hot encoding
@@ -94,72 +173,184 @@ def engineer_features(df_clean: pd.DataFrame) -> tuple[pd.DataFrame, dict[str, f
     return X, df_clean["gia"], rank_map
 
 
-def train_model(csv_path: str) -> tuple[XGBRegressor, float, pd.DataFrame, dict]:
-    """Full pipeline: load → clean → engineer → train. Returns (model, r2, df_clean, rank_map)."""
-    df_clean = load_and_clean(csv_path)
-    X, y, rank_map = engineer_features(df_clean)
+def xgb_options() -> dict:
+    """The XGB_* training options in effect (logged at startup and stored with each artifact)."""
+    return {
+        "tree_method": XGB_TREE_METHOD or "default",
+        "max_bin": XGB_MAX_BIN or "default",
+        "nthread": XGB_NTHREAD or "auto",
+        "early_stopping_rounds": XGB_EARLY_STOPPING_ROUNDS,
+        "validation_fraction": XGB_VALIDATION_FRACTION if XGB_EARLY_STOPPING_ROUNDS > 0 else None,
+        "quantile_dmatrix": XGB_QUANTILE_DMATRIX,
+    }
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    model = XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=6, random_state=42)
-    model.fit(X_train, y_train)
+def xgb_matrices(X_train, y_train, X_val=None, y_val=None, max_bin: Optional[int] = None) -> tuple:
+    """(dtrain, dval) QuantileDMatrix pair; dval (None without X_val) reuses dtrain's quantile cuts."""
+    from xgboost import QuantileDMatrix
 
-    y_pred = model.predict(X_test)
-    r2 = r2_score(y_test, y_pred)
+    kwargs = {"max_bin": max_bin} if max_bin else {}
+    dtrain = QuantileDMatrix(X_train, y_train, **kwargs)
+    dval = None if X_val is None else QuantileDMatrix(X_val, y_val, ref=dtrain, **kwargs)
+    return dtrain, dval
 
-    return model, r2, df_clean, rank_map
 
+def train_xgb(
+    model: XGBRegressor, X_train, y_train, X_val=None, y_val=None,
+    early_stopping_rounds: int = 0, matrices: Optional[tuple] = None, xgb_model=None,
+) -> XGBRegressor:
+    """Fit an XGBRegressor, early-stopped on (X_val, y_val) when rounds > 0.
 
-def train_all_models(csv_path: str) -> dict:
-    """Train LR, Ridge, RF, XGBoost and return comparison data."""
-    df_clean = load_and_clean(csv_path)
-    X, y, rank_map = engineer_features(df_clean)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # District avg prices for direction accuracy
-    district_avg_map = df_clean.groupby("quan")["gia"].mean().to_dict()
-    # Map test indices back to district names
-    test_districts = df_clean.loc[y_test.index, "quan"]
-    test_district_avgs = test_districts.map(district_avg_map).values
-
-    models = {
-        "lr": LinearRegression(),
-        "ridge": Ridge(alpha=1.0),
-        "rf": RandomForestRegressor(n_estimators=100, random_state=42),
-        "xgb": XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=6, random_state=42),
-    }
-    model_names = {
-        "lr": "Hồi quy tuyến tính",
-        "ridge": "Ridge",
-        "rf": "Random Forest",
-        "xgb": "XGBoost",
-    }
+    With XGB_QUANTILE_DMATRIX (or prebuilt `matrices` from xgb_matrices, reused
+    across fits on the same rows) it trains through xgboost.train on
+    QuantileDMatrix; the trees are the same as from model.fit. An early-stopped
+    model is cut to its best iteration, so inplace_predict, native.export_xgb
+    and the feature importances all see the trees model.predict uses.
+    `xgb_model` (a Booster) continues boosting it instead of starting over.
+    """
+    import xgboost
+
+    stop = early_stopping_rounds if X_val is not None or (matrices and matrices[1] is not None) else 0
+    params = model.get_params()
+    if matrices is None and not XGB_QUANTILE_DMATRIX:
+        if stop:
+            model.set_params(early_stopping_rounds=stop)
+            model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False, xgb_model=xgb_model)
+        else:
+            model.fit(X_train, y_train, xgb_model=xgb_model)
+        if not stop:
+            return model
+        booster = model.get_booster()
+    else:
+        dtrain, dval = matrices or xgb_matrices(X_train, y_train, X_val, y_val, params.get("max_bin"))
+        booster = xgboost.train(
+            model.get_xgb_params(), dtrain, num_boost_round=params["n_estimators"] or 100,
+            evals=[(dval, "validation")] if stop else (), early_stopping_rounds=stop or None, verbose_eval=False,
+            xgb_model=xgb_model,
+        )
+    if stop:
+        booster = booster[:booster.best_iteration + 1]
+    fitted = xgboost.XGBRegressor(**{**params, "n_estimators": booster.num_boosted_rounds(), "early_stopping_rounds": None})
+    fitted.load_model(bytearray(booster.save_raw("ubj")))
+    return fitted
+
+
+def fit_xgb(model: XGBRegressor, X_train: pd.DataFrame, y_train: pd.Series, xgb_model=None) -> XGBRegressor:
+    """Fit the serving XGBoost model with the XGB_* options (hold-out split when early stopping).
+
+    `xgb_model` continues a previous booster (incremental.py) under the same options.
+    """
+    if XGB_NTHREAD > 0:
+        model.set_params(n_jobs=XGB_NTHREAD)
+    if XGB_EARLY_STOPPING_ROUNDS <= 0 or len(X_train) < 2:
+        return train_xgb(model, X_train, y_train, xgb_model=xgb_model)
+    from sklearn.model_selection import train_test_split
+
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X_train, y_train, test_size=XGB_VALIDATION_FRACTION, random_state=SPLIT_PARAMS["random_state"],
+    )
+    return train_xgb(model, X_fit, y_fit, X_val, y_val, XGB_EARLY_STOPPING_ROUNDS, xgb_model=xgb_model)
+
+
+def _fit_timed(key: str, mdl, X_train: pd.DataFrame, y_train: pd.Series, n_threads: int):
+    """Fit one model under a thread budget. Returns (key, fitted_model, seconds)."""
+    from threadpoolctl import threadpool_limits
+
+    with threadpool_limits(limits=n_threads):
+        start = time.perf_counter()
+        if key == "xgb":
+            mdl = fit_xgb(mdl, X_train, y_train)
+        else:
+            mdl.fit(X_train, y_train)
+    return key, mdl, time.perf_counter() - start
+
+
+def fit_models(
+    models: dict, X_train: pd.DataFrame, y_train: pd.Series,
+    backend: str = TRAIN_BACKEND, n_jobs: int = TRAIN_N_JOBS,
+) -> list[tuple]:
+    """Fit several models concurrently. Returns [(key, fitted_model, seconds)] in input order.
+
+    Cores are split evenly between concurrent fits: each model gets
+    cpu_count // workers threads (its n_jobs plus a BLAS/OpenMP limit), so RF
+    and XGBoost running side by side don't oversubscribe the machine.
+    """
+    from joblib import Parallel, delayed
+
+    cpus = os.cpu_count() or 1
+    workers = 1 if backend == "sequential" else min(len(models), cpus if n_jobs < 1 else n_jobs)
+    n_threads = max(1, cpus // workers)
+    for mdl in models.values():
+        if "n_jobs" in mdl.get_params():
+            mdl.set_params(n_jobs=n_threads)
+
+    jobs = [(key, mdl, X_train, y_train, n_threads) for key, mdl in models.items()]
+    if workers == 1:
+        return [_fit_timed(*job) for job in jobs]
+    return Parallel(n_jobs=workers, backend=backend)(delayed(_fit_timed)(*job) for job in jobs)
+
+
+MODEL_NAMES = {
+    "lr": "Hồi quy tuyến tính",
+    "ridge": "Ridge",
+    "rf": "Random Forest",
+    "xgb": "XGBoost",
+}
+# key -> (module, estimator class, params)
+_MODEL_SPECS = {
+    "lr": ("sklearn.linear_model", "LinearRegression", {}),
+    "ridge": ("sklearn.linear_model", "Ridge", RIDGE_PARAMS),
+    "rf": ("sklearn.ensemble", "RandomForestRegressor", RF_PARAMS),
+    "xgb": ("xgboost", "XGBRegressor", XGB_PARAMS),
+}
+
+
+def new_model(key: str, params: Optional[dict] = None):
+    """Unfitted estimator for a MODEL_NAMES key, importing its library on first use.
+
+    `params` replaces the default hyperparameters (e.g. tuned ones, see tuning.py).
+    """
+    module, name, defaults = _MODEL_SPECS[key]
+    return getattr(importlib.import_module(module), name)(**(defaults if params is None else params))
 
+
+def comparison_payload(
+    models: dict, fit_seconds: dict[str, float], X_test, y_test, test_district_avgs: np.ndarray,
+) -> dict:
+    """Comparison table of fitted MODEL_NAMES models on one test set.
+
+    `test_district_avgs` holds the average price of each test row's district,
+    the reference for direction accuracy.
+    """
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    y_test_arr = np.asarray(y_test)
     metrics = []
     predictions_by_model = {}
     direction_accuracy = []
 
-    for key, mdl in models.items():
-        mdl.fit(X_train, y_train)
-        y_pred = mdl.predict(X_test)
+    for key, name in MODEL_NAMES.items():
+        y_pred = models[key].predict(X_test)
         predictions_by_model[key] = y_pred
 
-        r2 = r2_score(y_test, y_pred)
-        rmse = float(np.sqrt(mean_squared_error(y_test, y_pred)))
-        mae = float(mean_absolute_error(y_test, y_pred))
-        metrics.append({"name": model_names[key], "r2": round(r2, 4), "rmse": round(rmse), "mae": round(mae)})
+        r2 = r2_score(y_test_arr, y_pred)
+        rmse = float(np.sqrt(mean_squared_error(y_test_arr, y_pred)))
+        mae = float(mean_absolute_error(y_test_arr, y_pred))
+        metrics.append({
+            "name": name, "r2": round(r2, 4), "rmse": round(rmse), "mae": round(mae),
+            "fit_seconds": round(fit_seconds[key], 3),
+        })
 
         # Direction accuracy: predicted above/below district avg vs actual
         pred_above = y_pred > test_district_avgs
-        actual_above = y_test.values > test_district_avgs
+        actual_above = y_test_arr > test_district_avgs
         acc = float(np.mean(pred_above == actual_above))
-        direction_accuracy.append({"name": model_names[key], "accuracy": round(acc, 4)})
+        direction_accuracy.append({"name": name, "accuracy": round(acc, 4)})
 
     # Sample 50 test points for scatter chart
-    n_samples = min(50, len(y_test))
+    n_samples = min(50, len(y_test_arr))
     rng = np.random.RandomState(42)
-    sample_idx = rng.choice(len(y_test), size=n_samples, replace=False)
-    y_test_arr = y_test.values
+    sample_idx = rng.choice(len(y_test_arr), size=n_samples, replace=False)
     predictions = []
     for i in sample_idx:
         predictions.append({
@@ -188,6 +379,111 @@ def train_all_models(csv_path: str) -> dict:
     }
 
 
+class TrainingSession:
+    """One in-memory training run over one dataset: load → clean → engineer → split, once.
+
+    Fitted models are cached per key, so the XGBoost fit serves both as the
+    serving model and as the XGBoost row of the comparison table. `params` has
+    the shape of MODEL_PARAMS (split settings plus per-model hyperparameters).
+    """
+
+    def __init__(self, csv_path: str, params: dict = MODEL_PARAMS):
+        from sklearn.model_selection import train_test_split
+
+        self.params = params
+        # Wall time per phase (read, clean, engineer, split); fits are in fit_seconds
+        self.seconds: dict[str, float] = {}
+        start = time.perf_counter()
+
+        def phase(name: str) -> None:
+            nonlocal start
+            now = time.perf_counter()
+            self.seconds[name] = now - start
+            start = now
+
+        # Cleaning params and raw row count are kept for incremental updates (incremental.py)
+        raw = read_apartments(csv_path)
+        self.source_rows = len(raw)
+        phase("read")
+        self.df_clean, self.cleaning = clean_listings(raw)
+        phase("clean")
+        self.X, self.y, self.rank_map = engineer_features(self.df_clean)
+        phase("engineer")
+        self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(self.X, self.y, **params["split"])
+        phase("split")
+        self.models: dict = {}
+        self.fit_seconds: dict[str, float] = {}
+
+    def fit(self, keys: list[str]) -> None:
+        """Fit the given models (concurrently) unless already fitted."""
+        pending = {key: new_model(key, self.params.get(key)) for key in keys if key not in self.models}
+        if not pending:
+            return
+        for key, mdl, seconds in fit_models(pending, self.X_train, self.y_train):
+            self.models[key] = mdl
+            self.fit_seconds[key] = seconds
+
+    def serving_model(self) -> tuple[XGBRegressor, float]:
+        """The XGBoost model served by the API and its test R²."""
+        from sklearn.metrics import r2_score
+
+        self.fit(["xgb"])
+        model = self.models["xgb"]
+        return model, r2_score(self.y_test, model.predict(self.X_test))
+
+    def xgb_report(self) -> dict:
+        """XGB_* options of the serving fit with its trees, fit seconds and test R².
+
+        With XGB_COMPARE_DEFAULTS, when any option differs from the xgboost
+        defaults, the same hyperparameters are also fitted once with default
+        options: one combined comparison of all the configured options, logged
+        at startup (bench/bench_xgb_training.py measures them one at a time).
+        """
+        from sklearn.metrics import r2_score
+
+        model, r2 = self.serving_model()
+        report = {
+            "options": xgb_options(),
+            "trees": model.get_booster().num_boosted_rounds(),
+            "max_trees": self.params["xgb"]["n_estimators"],
+            "seconds": round(self.fit_seconds["xgb"], 3),
+            "r2": round(float(r2), 4),
+        }
+        configured = XGB_TREE_METHOD or XGB_MAX_BIN or XGB_NTHREAD or XGB_EARLY_STOPPING_ROUNDS > 0 or XGB_QUANTILE_DMATRIX
+        if XGB_COMPARE_DEFAULTS and configured:
+            params = {k: v for k, v in self.params["xgb"].items() if k not in ("tree_method", "max_bin")}
+            default = new_model("xgb", {**params, "n_jobs": model.get_params()["n_jobs"]})
+            start = time.perf_counter()
+            default.fit(self.X_train, self.y_train)
+            report["default"] = {
+                "trees": default.get_booster().num_boosted_rounds(),
+                "seconds": round(time.perf_counter() - start, 3),
+                "r2": round(float(r2_score(self.y_test, default.predict(self.X_test))), 4),
+            }
+        return report
+
+    def comparison(self) -> dict:
+        """Train LR, Ridge, RF, XGBoost and return comparison data."""
+        self.fit(list(MODEL_NAMES))
+        # District avg prices for direction accuracy, mapped onto the test rows
+        district_avg_map = self.df_clean.groupby("quan", observed=True)["gia"].mean().to_dict()
+        test_districts = self.df_clean.loc[self.y_test.index, "quan"]
+        test_district_avgs = test_districts.map(district_avg_map).to_numpy(dtype="float64")
+        return comparison_payload(self.models, self.fit_seconds, self.X_test, self.y_test, test_district_avgs)
+
+
+def train_model(csv_path: str) -> tuple[XGBRegressor, float, pd.DataFrame, dict]:
+    """Full pipeline: load → clean → engineer → train. Returns (model, r2, df_clean, rank_map)."""
+    session = TrainingSession(csv_path)
+    model, r2 = session.serving_model()
+    return model, r2, session.df_clean, session.rank_map
+
+
+def train_all_models(csv_path: str) -> dict:
+    """Train LR, Ridge, RF, XGBoost and return comparison data."""
+    return TrainingSession(csv_path).comparison()
+
+
 def build_prediction_features(
     dien_tich: float, so_phong: int, so_wc: int,
     khoang_cach_q1_km: float, rank_quan: float,
@@ -213,3 +509,76 @@ def build_prediction_features(
         row[noi_that_col] = 1
 
     return pd.DataFrame([row])[FEATURE_COLS]
+
+
+class FeatureEncoder:
+    """Precompiled encoder from prediction inputs to float32 feature rows.
+
+    Column indices are resolved once from FEATURE_COLS / ONEHOT_PHAP_LY /
+    ONEHOT_NOI_THAT, and each thread reuses one preallocated (1, n_features)
+    row, so the single-row hot path never touches pandas. Rows feed straight
+    into ``Booster.inplace_predict``.
+    """
+
+    def __init__(self, feature_cols: list[str] = FEATURE_COLS):
+        index = {col: i for i, col in enumerate(feature_cols)}
+        self.n_features = len(feature_cols)
+        self._dien_tich = index["dien_tich"]
+        self._so_phong = index["so_phong"]
+        self._so_wc = index["so_wc"]
+        self._khoang_cach = index["khoang_cach_q1_km"]
+        self._rank_quan = index["rank_quan"]
+        self._tong_tien_ich = index["tong_tien_ich"]
+        # Category -> column; the dropped base level has no entry and stays 0
+        self._phap_ly = {col.removeprefix("phap_ly_"): index[col] for col in ONEHOT_PHAP_LY}
+        self._noi_that = {col.removeprefix("noi_that_"): index[col] for col in ONEHOT_NOI_THAT}
+        self._local = threading.local()
+
+    def encode(
+        self, dien_tich: float, so_phong: int, so_wc: int,
+        khoang_cach_q1_km: float, rank_quan: float,
+        phap_ly: str, noi_that: str,
+    ) -> np.ndarray:
+        """Encode one input into this thread's row buffer (valid until the next call)."""
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self._local.row = np.zeros((1, self.n_features), dtype=np.float32)
+        else:
+            row.fill(0)
+        values = row[0]
+        values[self._dien_tich] = dien_tich
+        values[self._so_phong] = so_phong
+        values[self._so_wc] = so_wc
+        values[self._khoang_cach] = khoang_cach_q1_km
+        values[self._rank_quan] = rank_quan
+        values[self._tong_tien_ich] = so_phong + so_wc
+        col = self._phap_ly.get(phap_ly)
+        if col is not None:
+            values[col] = 1
+        col = self._noi_that.get(noi_that)
+        if col is not None:
+            values[col] = 1
+        return row
+
+    def encode_batch(self, rows: list[dict]) -> np.ndarray:
+        """Build a new float32 feature matrix (one row per input) for batch prediction.
+
+        Each row needs the same keys as encode()'s arguments.
+        """
+        X = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        if not rows:
+            return X
+        X[:, self._dien_tich] = [r["dien_tich"] for r in rows]
+        X[:, self._so_phong] = [r["so_phong"] for r in rows]
+        X[:, self._so_wc] = [r["so_wc"] for r in rows]
+        X[:, self._khoang_cach] = [r["khoang_cach_q1_km"] for r in rows]
+        X[:, self._rank_quan] = [r["rank_quan"] for r in rows]
+        X[:, self._tong_tien_ich] = X[:, self._so_phong] + X[:, self._so_wc]
+        for key, lookup in (("phap_ly", self._phap_ly), ("noi_that", self._noi_that)):
+            cols = np.array([lookup.get(r[key], -1) for r in rows])
+            hit = cols >= 0
+            X[np.flatnonzero(hit), cols[hit]] = 1
+        return X
+
+
+feature_encoder = FeatureEncoder()
@@ -0,0 +1,174 @@
+"""Tree ensembles flattened into NumPy arrays, with a vectorized evaluator.
+
+Serving only needs tree traversal over FEATURE_COLS, so the trained XGBoost
+booster (and, for comparison, a scikit-learn random forest) is exported into
+one set of flat node arrays shared by all trees:
+
+    feature, threshold, left, right, default_left, value   (one entry per node)
+    roots                                                 (one entry per tree)
+
+Leaves point to themselves, so evaluating `depth` levels walks every row of
+every tree down to its leaf without branching. Only NumPy is needed at predict
+time; TreeEnsemble.save / load use a plain .npz file.
+
+Numerics follow the source library so predictions match exactly: XGBoost
+compares float32 features with `x < threshold` (NaN takes default_left) and
+adds leaf values one tree at a time in float32 onto base_score; scikit-learn
+uses `x <= threshold` and averages the trees in float64.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class TreeEnsemble:
+    feature: np.ndarray  # int32, split feature (0 for leaves)
+    threshold: np.ndarray  # float32 (XGBoost) / float64 (sklearn)
+    left: np.ndarray  # int32, global node index; leaves point to themselves
+    right: np.ndarray  # int32
+    default_left: np.ndarray  # bool, branch taken for NaN features
+    value: np.ndarray  # leaf values (0 for internal nodes)
+    roots: np.ndarray  # int32, root node of each tree
+    depth: int  # levels to walk so every row reaches a leaf
+    base_score: float
+    average: bool  # True: mean of trees (random forest); False: base_score + sum (boosting)
+    inclusive: bool  # True: go left on x <= threshold (sklearn); False: x < threshold (XGBoost)
+
+    # Rows evaluated per block, bounding the (rows, trees) temporaries for large batches
+    block_rows = 1024
+
+    def __post_init__(self):
+        # left/right interleaved, so one gather picks the child: children[2 * node + go_right]
+        children = np.empty(2 * len(self.left), dtype=np.int32)
+        children[0::2], children[1::2] = self.left, self.right
+        object.__setattr__(self, "_children", children)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node index reached by each row in each tree, shape (n_rows, n_trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)  # both libraries traverse float32 features
+        n_rows, n_features = X.shape
+        has_nan = bool(np.isnan(X).any())
+        out = np.empty((n_rows, self.n_trees), dtype=np.int32)
+        for start in range(0, n_rows, self.block_rows):
+            block = X[start:start + self.block_rows]
+            flat = block.ravel()
+            row_offset = (np.arange(len(block), dtype=np.int32) * n_features)[:, None]
+            node = np.broadcast_to(self.roots, (len(block), self.n_trees))
+            for _ in range(self.depth):
+                x = flat[row_offset + self.feature[node]]
+                threshold = self.threshold[node]
+                go_right = x > threshold if self.inclusive else ~(x < threshold)
+                if has_nan:  # NaN compares False both ways; route it by default_left
+                    missing = np.isnan(x)
+                    go_right = np.where(missing, ~self.default_left[node], go_right)
+                node = self._children[2 * node + go_right]
+            out[start:start + len(block)] = node
+        return out
+
+    def inplace_predict(self, X: np.ndarray) -> np.ndarray:
+        """Predictions for a 2-D feature matrix (same contract as Booster.inplace_predict)."""
+        values = self.value[self.leaves(X)]
+        # cumsum adds strictly left to right: base_score, tree 0, tree 1, ... like the source library
+        terms = np.concatenate([np.full((len(values), 1), self.base_score, dtype=values.dtype), values], axis=1)
+        out = np.cumsum(terms, axis=1, dtype=values.dtype)[:, -1]
+        return out / self.n_trees if self.average else out
+
+    def save(self, path: str) -> None:
+        np.savez(path, **{f.name: np.asarray(getattr(self, f.name)) for f in fields(self)})
+
+    @classmethod
+    def load(cls, path: str) -> TreeEnsemble:
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+        scalars = {"depth": int, "base_score": float, "average": bool, "inclusive": bool}
+        return cls(**{key: scalars[key](value) if key in scalars else value for key, value in arrays.items()})
+
+
+def _flatten(trees: list[dict], threshold_dtype, value_dtype) -> dict:
+    """Concatenate per-tree node arrays, offsetting child indices; leaves point to themselves."""
+    parts = {key: [] for key in ("feature", "threshold", "left", "right", "default_left", "value")}
+    roots, depth, offset = [], 0, 0
+    for tree in trees:
+        n = len(tree["left"])
+        own = np.arange(n)
+        leaf = tree["left"] < 0
+        parts["feature"].append(np.where(leaf, 0, tree["feature"]))
+        parts["threshold"].append(np.where(leaf, 0, tree["threshold"]))
+        parts["left"].append(np.where(leaf, own, tree["left"]) + offset)
+        parts["right"].append(np.where(leaf, own, tree["right"]) + offset)
+        parts["default_left"].append(np.asarray(tree["default_left"], dtype=bool))
+        parts["value"].append(np.where(leaf, tree["value"], 0))
+        roots.append(offset)
+        depth = max(depth, _depth(tree["left"], tree["right"]))
+        offset += n
+    return {
+        "feature": np.concatenate(parts["feature"]).astype(np.int32),
+        "threshold": np.concatenate(parts["threshold"]).astype(threshold_dtype),
+        "left": np.concatenate(parts["left"]).astype(np.int32),
+        "right": np.concatenate(parts["right"]).astype(np.int32),
+        "default_left": np.concatenate(parts["default_left"]),
+        "value": np.concatenate(parts["value"]).astype(value_dtype),
+        "roots": np.array(roots, dtype=np.int32),
+        "depth": depth,
+    }
+
+
+def _depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth, level = 0, np.array([0])
+    while True:
+        level = level[left[level] >= 0]
+        if not len(level):
+            return depth
+        level = np.concatenate([left[level], right[level]])
+        depth += 1
+
+
+def export_xgb(booster) -> TreeEnsemble:
+    """Flatten a single-target XGBoost gbtree booster with an identity link (reg:squarederror)."""
+    model = json.loads(booster.save_raw("json"))["learner"]
+    objective = model["objective"]["name"]
+    if objective != "reg:squarederror":
+        raise ValueError(f"Unsupported objective {objective!r} for native export")
+    trees = []
+    for tree in model["gradient_booster"]["model"]["trees"]:
+        if any(tree["split_type"]):
+            raise ValueError("Categorical splits are not supported by the native evaluator")
+        trees.append({
+            "feature": np.array(tree["split_indices"]),
+            # Leaves store their value in split_conditions
+            "threshold": np.array(tree["split_conditions"], dtype=np.float32),
+            "left": np.array(tree["left_children"]),
+            "right": np.array(tree["right_children"]),
+            "default_left": np.array(tree["default_left"]),
+            "value": np.array(tree["split_conditions"], dtype=np.float32),
+        })
+    base_score = float(np.float32(model["learner_model_param"]["base_score"]))
+    return TreeEnsemble(
+        **_flatten(trees, np.float32, np.float32), base_score=base_score, average=False, inclusive=False,
+    )
+
+
+def export_sklearn_forest(forest) -> TreeEnsemble:
+    """Flatten a fitted single-output RandomForestRegressor (or any forest of DecisionTreeRegressor)."""
+    trees = []
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        trees.append({
+            "feature": tree.feature,
+            "threshold": tree.threshold,
+            "left": tree.children_left,
+            "right": tree.children_right,
+            "default_left": np.zeros(tree.node_count, dtype=bool),
+            "value": tree.value[:, 0, 0],
+        })
+    flat = _flatten(trees, np.float64, np.float64)
+    return TreeEnsemble(**flat, base_score=0.0, average=True, inclusive=True)
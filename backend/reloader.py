@@ -0,0 +1,123 @@
+"""Background model reloads without restarting the server.
+
+A reload loads (or, on a cache miss, trains) an artifact on a background
+thread and hands it to a callback that swaps the serving snapshot. Reloads
+are triggered from the admin endpoint, by a watcher that polls the artifact
+store's LATEST pointer, or by the retrain schedule, which checks the source
+CSV on a fixed interval and retrains when it changed. Retraining is
+incremental by default (see incremental.py) and publishes the new version to
+LATEST, so other workers watching it load the same artifact. A serving-only
+reloader never trains: a reload without a version loads whatever LATEST names.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from artifacts import Artifact, load_artifact, load_or_build, publish_latest, read_latest
+
+
+def _csv_signature(csv_path: str) -> Optional[tuple[int, int]]:
+    try:
+        stat = os.stat(csv_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ModelReloader:
+    """Runs at most one reload at a time and records the outcome."""
+
+    def __init__(
+        self, csv_path: str, artifact_dir: str,
+        on_loaded: Callable[[Artifact], None], current_version: Callable[[], Optional[str]],
+        retrain_mode: str = "incremental", serving_only: bool = False, with_model: bool = True,
+    ):
+        self.csv_path = csv_path
+        self.artifact_dir = artifact_dir
+        self.on_loaded = on_loaded
+        self.current_version = current_version
+        self.retrain_mode = retrain_mode
+        self.serving_only = serving_only
+        self.with_model = with_model  # False: load artifacts without the XGBoost model (native serving)
+        self.status: dict = {"state": "idle", "requested": None, "version": None, "error": None, "finished_at": None}
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def trigger(self, version: Optional[str] = None) -> bool:
+        """Start a background reload of `version` (default: artifact for the current CSV).
+
+        Returns False if a reload is already running.
+        """
+        if not self._running.acquire(blocking=False):
+            return False
+        self.status = {"state": "running", "requested": version, "version": None, "error": None, "finished_at": None}
+        threading.Thread(target=self._run, args=(version,), name="model-reload", daemon=True).start()
+        return True
+
+    def _run(self, version: Optional[str]) -> None:
+        try:
+            if version is None and self.serving_only:
+                version = read_latest(self.artifact_dir) or self.current_version()
+            if version:
+                artifact = load_artifact(version, self.artifact_dir, self.with_model)
+                if artifact is None:
+                    raise FileNotFoundError(f"Artifact {version} not found in {self.artifact_dir}")
+            else:
+                artifact = self._retrain()
+            if artifact.version != self.current_version():
+                self.on_loaded(artifact)
+                print(f"Reloaded model artifact {artifact.version} (R² = {artifact.r2:.4f})")
+            self.status = {**self.status, "state": "done", "version": artifact.version, "finished_at": time.time()}
+        except Exception as e:  # keep serving the old snapshot
+            print(f"Model reload failed: {e!r}")
+            self.status = {**self.status, "state": "failed", "error": repr(e), "finished_at": time.time()}
+        finally:
+            self._running.release()
+
+    def _retrain(self) -> Artifact:
+        """Artifact for the current CSV: loaded, continued from the served one, or fully trained."""
+        base = None
+        if self.retrain_mode == "incremental" and self.current_version():
+            base = load_artifact(self.current_version(), self.artifact_dir)
+        artifact, built = load_or_build(self.csv_path, self.artifact_dir, base=base)
+        if built:
+            publish_latest(artifact.version, self.artifact_dir)
+        return artifact
+
+    def _start(self, target: Callable[[float], None], interval: float, name: str) -> None:
+        thread = threading.Thread(target=target, args=(interval,), name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def watch(self, interval: float) -> None:
+        """Poll LATEST every `interval` seconds and load the version it names."""
+        self._start(self._watch_loop, interval, "model-watch")
+
+    def schedule(self, interval: float) -> None:
+        """Check the CSV every `interval` seconds and retrain when it changed."""
+        self._start(self._schedule_loop, interval, "model-retrain")
+
+    def _watch_loop(self, interval: float) -> None:
+        seen = read_latest(self.artifact_dir)
+        while not self._stop.wait(interval):
+            latest = read_latest(self.artifact_dir)
+            # Only mark it seen once a reload actually starts, so a busy reloader retries
+            if latest != seen and (latest == self.current_version() or self.trigger(latest)):
+                seen = latest
+
+    def _schedule_loop(self, interval: float) -> None:
+        seen = _csv_signature(self.csv_path)
+        while not self._stop.wait(interval):
+            csv = _csv_signature(self.csv_path)
+            if csv != seen and self.trigger():
+                seen = csv
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
@@ -0,0 +1,66 @@
+"""Run the API with several uvicorn workers sharing one copy of the serving state.
+
+Usage:
+    python serve.py [--workers 4] [--host 127.0.0.1] [--port 8000]
+
+The model artifact is loaded once (trained on a cache miss, or only loaded
+prebuilt with SERVING_ONLY=1) and published into shared memory (see
+shared_state.py) by a short-lived child process, so the supervising parent
+never imports pandas or xgboost itself. uvicorn then starts with SHARED_STATE
+naming the block, and every worker attaches to it instead of loading its own
+copy. The block is removed when the server exits. All other settings are the
+usual environment variables of main.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import uvicorn
+
+
+def _publish() -> tuple[str, str]:
+    """Load the artifact and publish it (runs in the child). Returns (block name, version)."""
+    from artifacts import DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, load_or_build, load_prebuilt
+    from shared_state import publish
+
+    csv_path = os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH)
+    artifact_dir = os.environ.get("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+    # Same switches as main.py: workers serving natively never need the XGBoost model
+    with_model = os.environ.get("SERVING_BACKEND", "xgboost") != "native"
+    if os.environ.get("SERVING_ONLY", "0") == "1":
+        artifact = load_prebuilt(csv_path, artifact_dir, with_model)
+    else:
+        artifact, _ = load_or_build(csv_path, artifact_dir)
+    shm = publish(artifact, artifact_dir)
+    shm.close()  # the block outlives this process until the parent unlinks it
+    return shm.name, artifact.version
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run uvicorn workers over one shared copy of the model artifact.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        name, version = pool.submit(_publish).result()
+    shm = SharedMemory(name=name)
+    print(f"Published artifact {version} to shared memory {name} ({shm.size / 2**20:.1f} MiB)")
+
+    os.environ["SHARED_STATE"] = shm.name  # inherited by the spawned workers
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Immutable serving snapshot built from one model artifact.
+
+Everything a request reads (model, rank map, aggregates, chart index, response
+cache) lives on one frozen ServingState. main.py keeps a single module-level
+reference to the current snapshot; a reload builds a new snapshot off the
+request path and swaps that reference in one assignment, so in-flight
+requests keep the snapshot they started with and readers never take a lock.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional, Union
+
+import numpy as np
+
+from artifacts import Artifact
+from charts import ChartIndex, build_chart_index
+from grid import PredictionGrid
+from http_cache import ResponseCache
+from listings import ListingStore
+from native import TreeEnsemble
+
+if TYPE_CHECKING:
+    from xgboost import Booster
+
+
+@dataclass(frozen=True)
+class ServingState:
+    version: str  # artifact version, also the predict/response cache key
+    # Hot-path model: the XGBoost booster, or its NumPy export (native.TreeEnsemble)
+    # with SERVING_BACKEND=native; both expose inplace_predict
+    predictor: Union[Booster, TreeEnsemble]
+    r2: float
+    district_rank_map: dict[str, float]
+    fallback_rank: float  # median rank_quan, used for unknown districts
+    district_avg_price: dict[str, float]
+    district_data: list[dict]
+    cached_stats: dict
+    comparison_data: dict
+    listings: ListingStore  # the dataset columns serving reads, not the training DataFrame
+    chart_index: ChartIndex
+    response_cache: ResponseCache
+    training_mode: str  # "full" or "incremental"
+    training_seconds: dict[str, float]  # wall time per training phase, see Artifact.training
+    grid: Optional[PredictionGrid]  # precomputed predictions (grid.py), if built for this version
+    loaded_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_artifact(cls, artifact: Artifact, response_max_age: int = 0, backend: str = "xgboost") -> ServingState:
+        """Derive every per-request lookup structure from an artifact."""
+        if backend not in ("xgboost", "native"):
+            raise ValueError(f"Unknown serving backend {backend!r} (expected 'xgboost' or 'native')")
+        listings = ListingStore.from_frame(artifact.df_clean)
+        return cls(
+            version=artifact.version,
+            predictor=artifact.trees if backend == "native" else artifact.model.get_booster(),
+            r2=artifact.r2,
+            district_rank_map=artifact.rank_map,
+            fallback_rank=float(np.median(list(artifact.rank_map.values()))),
+            district_avg_price={d["name"]: d["avg_price"] for d in artifact.district_data},
+            district_data=artifact.district_data,
+            cached_stats=artifact.stats,
+            comparison_data=artifact.comparison,
+            listings=listings,
+            chart_index=build_chart_index(listings, np.array(artifact.feature_importances), artifact.district_data),
+            response_cache=ResponseCache(artifact.version, max_age=response_max_age),
+            training_mode=artifact.training["mode"],
+            training_seconds=artifact.training["seconds"],
+            grid=artifact.grid,
+        )
@@ -0,0 +1,154 @@
+"""Read-only serving state shared by all uvicorn workers on one host.
+
+serve.py loads (or trains) the model artifact once, before starting uvicorn,
+and publishes it into a single multiprocessing.shared_memory block. Workers
+started with SHARED_STATE=<block name> attach to that block instead of
+reading the artifact themselves. The block holds:
+
+- the cleaned dataset column by column (categoricals as their integer codes,
+  plus the row index),
+- the native tree arrays (native.TreeEnsemble),
+- the serialized XGBoost model,
+- a JSON manifest with the artifact metadata and every array's offset.
+
+Dataset columns and tree arrays are read-only NumPy views onto the block, so
+their pages exist once per host however many workers attach. The XGBoost
+booster is the exception: xgboost parses the shared bytes into memory of its
+own, one (small) copy per worker. The prediction grid is memory-mapped from
+the artifact directory and already shared through the page cache.
+
+Hot reloads (admin endpoint, LATEST watch, retraining) still load the new
+artifact into each worker privately; restart serve.py to share it again.
+
+Block layout: 8-byte little-endian manifest length, manifest JSON, then the
+arrays, each aligned to ALIGN bytes.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from dataclasses import fields
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from artifacts import Artifact, artifact_from_metadata, artifact_metadata
+from grid import load_grid
+from native import TreeEnsemble
+
+# Bump when the block layout changes; workers refuse blocks of another format
+SHARED_FORMAT = 1
+ALIGN = 64
+_HEADER = struct.Struct("<Q")
+_TREE_SCALARS = {"depth": int, "base_score": float, "average": bool, "inclusive": bool}
+
+# Blocks this worker attached to; kept open for its lifetime since the arrays are views onto them
+_attached: dict[str, SharedMemory] = {}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def _dataset_arrays(df: pd.DataFrame) -> tuple[list[dict], list[np.ndarray]]:
+    """Manifest entries and backing arrays for the index and every column of df."""
+    entries, arrays = [{"name": None}], [df.index.to_numpy()]  # name None: the row index
+    for name, series in df.items():
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entries.append({"name": name, "categories": series.cat.categories.tolist(), "ordered": series.cat.ordered})
+            arrays.append(series.cat.codes.to_numpy())
+        elif series.dtype.kind in "biuf":
+            entries.append({"name": name})
+            arrays.append(series.to_numpy())
+        else:
+            raise TypeError(f"Cannot share column {name!r} of dtype {series.dtype}")
+    return entries, arrays
+
+
+def publish(artifact: Artifact, artifact_dir: str) -> SharedMemory:
+    """Copy an artifact into a new shared memory block. The caller closes and unlinks it."""
+    entries, arrays = _dataset_arrays(artifact.df_clean)
+    trees = {}
+    for f in fields(TreeEnsemble):
+        value = getattr(artifact.trees, f.name)
+        if f.name in _TREE_SCALARS:
+            trees[f.name] = value
+        else:
+            trees[f.name] = {}
+            entries.append(trees[f.name])
+            arrays.append(np.asarray(value))
+    model = {}
+    if artifact.model is not None:
+        entries.append(model)
+        arrays.append(np.frombuffer(bytes(artifact.model.get_booster().save_raw("ubj")), dtype=np.uint8))
+
+    # Offsets are relative to the end of the manifest, whose own length is only known once it is written
+    offset = 0
+    for entry, array in zip(entries, arrays):
+        entry.update(offset=offset, dtype=array.dtype.str, shape=list(array.shape))
+        offset = _aligned(offset + array.nbytes)
+    manifest = json.dumps({
+        "format": SHARED_FORMAT,
+        "version": artifact.version,
+        "artifact_dir": artifact_dir,
+        "meta": artifact_metadata(artifact),
+        "columns": entries[:len(artifact.df_clean.columns) + 1],
+        "trees": trees,
+        "model": model or None,
+    }, ensure_ascii=False).encode("utf-8")
+    start = _aligned(_HEADER.size + len(manifest))
+
+    shm = SharedMemory(create=True, size=max(start + offset, 1))
+    _HEADER.pack_into(shm.buf, 0, len(manifest))
+    shm.buf[_HEADER.size:_HEADER.size + len(manifest)] = manifest
+    for entry, array in zip(entries, arrays):
+        view = np.ndarray(array.shape, array.dtype, buffer=shm.buf, offset=start + entry["offset"])
+        view[...] = array
+        del view  # no exported buffers may remain, or shm.close() fails
+    return shm
+
+
+def _view(shm: SharedMemory, start: int, entry: dict) -> np.ndarray:
+    array = np.ndarray(entry["shape"], np.dtype(entry["dtype"]), buffer=shm.buf, offset=start + entry["offset"])
+    array.flags.writeable = False
+    return array
+
+
+def attach(name: str, with_model: bool = True) -> Artifact:
+    """Artifact backed by the shared block `name` (zero-copy except the XGBoost booster).
+
+    with_model=False skips the booster and never imports xgboost, as in
+    artifacts.load_artifact.
+    """
+    shm = _attached.get(name) or SharedMemory(name=name)
+    _attached[name] = shm
+    (length,) = _HEADER.unpack_from(shm.buf, 0)
+    manifest = json.loads(bytes(shm.buf[_HEADER.size:_HEADER.size + length]).decode("utf-8"))
+    if manifest["format"] != SHARED_FORMAT:
+        raise RuntimeError(f"Shared state {name} has format {manifest['format']}, expected {SHARED_FORMAT}")
+    start = _aligned(_HEADER.size + length)
+
+    index_entry, *column_entries = manifest["columns"]
+    columns = {}
+    for entry in column_entries:
+        values = _view(shm, start, entry)
+        if "categories" in entry:
+            dtype = pd.CategoricalDtype(entry["categories"], ordered=entry["ordered"])
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        columns[entry["name"]] = values
+    df_clean = pd.DataFrame(columns, index=pd.Index(_view(shm, start, index_entry), copy=False), copy=False)
+
+    trees = TreeEnsemble(**{
+        key: _TREE_SCALARS[key](value) if key in _TREE_SCALARS else _view(shm, start, value)
+        for key, value in manifest["trees"].items()
+    })
+    model = None
+    if with_model and manifest["model"] is not None:
+        from xgboost import XGBRegressor
+
+        model = XGBRegressor()
+        model.load_model(bytearray(_view(shm, start, manifest["model"])))
+    version, artifact_dir = manifest["version"], manifest["artifact_dir"]
+    return artifact_from_metadata(version, manifest["meta"], model, df_clean, trees, load_grid(version, artifact_dir))
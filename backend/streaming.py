@@ -0,0 +1,481 @@
+"""Chunked, bounded-memory training pipeline for crawls larger than RAM.
+
+The in-memory pipeline needs global quantiles (IQR on gia, then on dien_tich
+over the gia-filtered rows), so the CSV is streamed in chunks several times:
+
+1. so_wc median and gia quantiles (rows with gia and dien_tich present)
+2. dien_tich quantiles over the rows that pass the gia IQR filter
+3. full filter + per-district running sums, writing each surviving chunk to an
+   on-disk feature store (one .npz per chunk plus a manifest.json): the
+   cleaned columns and the engineered float32 feature rows (FEATURE_COLS),
+   with rank_quan left empty until the district means are known
+
+Quantiles come from a mergeable sketch that stays exact (same linear
+interpolation as pandas) up to `max_exact` values and degrades to a t-digest
+beyond that, so results match load_and_clean exactly on datasets of moderate
+size and approximately on multi-year crawls.
+
+StreamingSession then trains the serving XGBoost from the store without a
+DataFrame: rank_quan is filled from the manifest's district sums part by
+part, and the parts feed an external-memory DMatrix through a DataIter (pages
+cached on disk). Rows go to the test split by a hash of their CSV row number,
+so the split needs no global permutation (it differs from train_test_split's).
+The LR / Ridge / RF comparison fits on a sample of at most
+TRAIN_COMPARISON_ROWS rows. Only the cleaned listings the artifact serves
+(FeatureStore.to_frame) are still assembled in memory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import cached_property
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset import DEFAULT_CACHE_DIR, read_csv_typed, typed_cache_key
+from model import (
+    FEATURE_COLS, MODEL_NAMES, MODEL_PARAMS, NOI_THAT_MAP, PHAP_LY_MAP, TRAIN_COMPARISON_ROWS, XGB_NTHREAD,
+    comparison_payload, fit_models, new_model, xgb_options,
+)
+
+if TYPE_CHECKING:
+    from xgboost import XGBRegressor
+
+DEFAULT_CHUNKSIZE = 200_000
+# Bump when the part/manifest layout or the encoding written into it changes
+STORE_FORMAT = 2
+PHAP_LY_LABELS = [*PHAP_LY_MAP.values(), "Khac"]
+NOI_THAT_LABELS = [*NOI_THAT_MAP.values(), "Khong_noi_that"]
+_STORE_COLUMNS = ["gia", "gia_m2", "dien_tich", "so_phong", "so_wc", "khoang_cach_q1_km"]
+_FEATURE_INDEX = {col: i for i, col in enumerate(FEATURE_COLS)}
+_SUM_KEYS = ("gia_m2", "gia_m2_count", "gia", "count")
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch: exact below max_exact values, t-digest above."""
+
+    def __init__(self, max_exact: int = 5_000_000, compression: float = 1000.0):
+        self.max_exact = max_exact
+        self.compression = compression
+        self._values: list[np.ndarray] = []
+        self._count = 0
+        self._means: Optional[np.ndarray] = None  # set once the sketch is compressed
+        self._weights: Optional[np.ndarray] = None
+
+    @property
+    def exact(self) -> bool:
+        return self._means is None
+
+    def add(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self._values.append(values)
+        self._count += len(values)
+        if self.exact and self._count > self.max_exact:
+            self._compress()
+        elif not self.exact and sum(len(v) for v in self._values) > self.compression * 10:
+            self._compress()
+
+    def merge(self, other: QuantileSketch) -> None:
+        self._values.extend(other._values)
+        self._count += other._count
+        if not other.exact:
+            self._means = np.concatenate([m for m in (self._means, other._means) if m is not None])
+            self._weights = np.concatenate([w for w in (self._weights, other._weights) if w is not None])
+        if not self.exact or self._count > self.max_exact:
+            self._compress()
+
+    def _compress(self) -> None:
+        """Fold raw values into t-digest centroids (k1 scale function)."""
+        means = np.concatenate([*self._values, *([self._means] if self._means is not None else [])])
+        weights = np.concatenate([np.ones(sum(len(v) for v in self._values)), *([self._weights] if self._weights is not None else [])])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cum = np.cumsum(weights)
+        q = (cum - weights / 2) / cum[-1]
+        group = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        w = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / w
+        self._weights = w
+        self._values = []
+
+    def quantile(self, q: float) -> float:
+        if self._count == 0:
+            return float("nan")
+        if self.exact:
+            return float(np.quantile(np.concatenate(self._values), q))
+        if self._values:
+            self._compress()
+        cum = np.cumsum(self._weights)
+        centers = (cum - self._weights / 2) / cum[-1]
+        return float(np.interp(q, centers, self._means))
+
+
+def _iqr_bounds(sketch: QuantileSketch) -> tuple[float, float]:
+    q1, q3 = sketch.quantile(0.25), sketch.quantile(0.75)
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def _chunks(csv_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Typed CSV chunks, indexed by absolute row number like a full read_csv."""
+    offset = 0
+    for chunk in read_csv_typed(csv_path, chunksize=chunksize):
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
+
+
+def _present(chunk: pd.DataFrame) -> pd.DataFrame:
+    return chunk[chunk["gia"].notna() & chunk["dien_tich"].notna()]
+
+
+def _label_codes(codes: pd.Series, mapping: dict, labels: list[str]) -> np.ndarray:
+    """Raw numeric codes -> index into labels (unmapped -> last label)."""
+    mapped = codes.map(mapping).fillna(labels[-1])
+    return mapped.map({label: i for i, label in enumerate(labels)}).to_numpy(np.int8)
+
+
+def _encode_features(arrays: dict[str, np.ndarray], phap_ly: np.ndarray, noi_that: np.ndarray) -> np.ndarray:
+    """engineer_features of a cleaned chunk as float32 FEATURE_COLS rows, rank_quan left NaN."""
+    X = np.zeros((len(phap_ly), len(FEATURE_COLS)), dtype=np.float32)
+    for col in ("dien_tich", "so_phong", "so_wc", "khoang_cach_q1_km"):
+        X[:, _FEATURE_INDEX[col]] = arrays[col]
+    X[:, _FEATURE_INDEX["rank_quan"]] = np.nan
+    X[:, _FEATURE_INDEX["tong_tien_ich"]] = arrays["so_phong"] + arrays["so_wc"]
+    # One-hot with the first label dropped, like get_dummies(drop_first=True)
+    for prefix, codes, labels in (("phap_ly", phap_ly, PHAP_LY_LABELS), ("noi_that", noi_that, NOI_THAT_LABELS)):
+        for i, label in enumerate(labels):
+            col = _FEATURE_INDEX.get(f"{prefix}_{label}")
+            if col is not None:
+                X[codes == i, col] = 1
+    return X
+
+
+def _row_uniform(rows: np.ndarray, seed: int) -> np.ndarray:
+    """Deterministic U[0, 1) per CSV row number (splitmix64 of row and seed)."""
+    with np.errstate(over="ignore"):
+        z = rows.astype(np.uint64) + np.uint64(seed + 1) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+
+def hashed_test_mask(rows: np.ndarray, split: dict) -> np.ndarray:
+    """Test-split membership of CSV row numbers: row hash (seeded with split["random_state"]) below split["test_size"]."""
+    return _row_uniform(rows, split["random_state"]) < split["test_size"]
+
+
+def build_feature_store(csv_path: str, store_dir: str, chunksize: int = DEFAULT_CHUNKSIZE) -> FeatureStore:
+    """Stream the CSV through the cleaning pipeline into an on-disk feature store."""
+    # Pass 1: so_wc median (all rows), gia quantiles (rows that survive dropna)
+    so_wc_sketch, gia_sketch = QuantileSketch(), QuantileSketch()
+    for chunk in _chunks(csv_path, chunksize):
+        so_wc_sketch.add(chunk["so_wc"].to_numpy())
+        gia_sketch.add(_present(chunk)["gia"].to_numpy())
+    so_wc_median = so_wc_sketch.quantile(0.5)
+    gia_lo, gia_hi = _iqr_bounds(gia_sketch)
+
+    # Pass 2: dien_tich quantiles after the gia filter (sequential IQR semantics)
+    area_sketch = QuantileSketch()
+    for chunk in _chunks(csv_path, chunksize):
+        chunk = _present(chunk)
+        area_sketch.add(chunk.loc[chunk["gia"].between(gia_lo, gia_hi), "dien_tich"].to_numpy())
+    area_lo, area_hi = _iqr_bounds(area_sketch)
+
+    # Pass 3: filter, encode, write chunks, accumulate per-district sums
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.makedirs(store_dir)
+    districts: dict[str, int] = {}
+    sums = {key: np.zeros(0) for key in _SUM_KEYS}
+    total = dict.fromkeys(_SUM_KEYS, 0.0)  # every row, including those without a district
+    parts, rows, offset = [], 0, 0
+    for chunk in _chunks(csv_path, chunksize):
+        offset = chunk.index.stop
+        chunk = _present(chunk)
+        keep = (
+            chunk["gia"].between(gia_lo, gia_hi) & chunk["dien_tich"].between(area_lo, area_hi)
+            & (chunk["gia"] > 500_000_000) & (chunk["dien_tich"] > 20)
+        )
+        chunk = chunk[keep]
+        if chunk.empty:
+            continue
+        # Chunk-local categories -> global district codes (-1 = missing district)
+        quan = chunk["quan"].cat.remove_unused_categories()
+        lookup = [districts.setdefault(d, len(districts)) for d in quan.cat.categories]
+        codes = np.array([*lookup, -1], dtype=np.int32)[quan.cat.codes.to_numpy()]
+
+        known = codes >= 0
+        gia_m2 = chunk["gia_m2"].to_numpy()[known]
+        per_district = {
+            "gia_m2": np.nan_to_num(gia_m2),
+            "gia_m2_count": ~np.isnan(gia_m2),
+            "gia": chunk["gia"].to_numpy()[known],
+            "count": None,
+        }
+        for key, weights in per_district.items():
+            totals = np.bincount(codes[known], weights=weights, minlength=len(districts))
+            sums[key] = np.pad(sums[key], (0, len(districts) - len(sums[key]))) + totals
+
+        all_gia_m2 = chunk["gia_m2"].to_numpy()
+        total["gia_m2"] += float(np.nansum(all_gia_m2))
+        total["gia_m2_count"] += float(np.count_nonzero(~np.isnan(all_gia_m2)))
+        total["gia"] += float(chunk["gia"].sum())
+        total["count"] += float(len(chunk))
+
+        arrays = {col: chunk[col].to_numpy() for col in _STORE_COLUMNS}
+        arrays["so_wc"] = chunk["so_wc"].fillna(so_wc_median).to_numpy(np.float32)
+        phap_ly = _label_codes(chunk["phap_ly"], PHAP_LY_MAP, PHAP_LY_LABELS)
+        noi_that = _label_codes(chunk["noi_that"], NOI_THAT_MAP, NOI_THAT_LABELS)
+        part = f"part-{len(parts):05d}.npz"
+        np.savez(
+            os.path.join(store_dir, part),
+            row=chunk.index.to_numpy(np.int64), quan=codes, phap_ly=phap_ly, noi_that=noi_that,
+            X=_encode_features(arrays, phap_ly, noi_that), **arrays,
+        )
+        parts.append(part)
+        rows += len(chunk)
+
+    manifest = {
+        "source": os.path.abspath(csv_path),
+        "source_rows": offset,
+        "rows": rows,
+        "parts": parts,
+        "districts": list(districts),
+        "so_wc_median": so_wc_median,
+        "bounds": {"gia": [gia_lo, gia_hi], "dien_tich": [area_lo, area_hi]},
+        "exact_quantiles": gia_sketch.exact and area_sketch.exact,
+        "district_sums": {
+            name: {key: float(values[i]) for key, values in sums.items()} for name, i in districts.items()
+        },
+        "total_sums": total,
+    }
+    with open(os.path.join(store_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    return FeatureStore(store_dir)
+
+
+class FeatureStore:
+    """Read side of the on-disk store written by build_feature_store."""
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+    @property
+    def rank_map(self) -> dict[str, float]:
+        """Mean gia_m2 per district, from the running sums."""
+        return {
+            name: s["gia_m2"] / s["gia_m2_count"] if s["gia_m2_count"] else float("nan")
+            for name, s in self.manifest["district_sums"].items()
+        }
+
+    def listing_sums(self) -> dict:
+        """The running sums in artifacts.listing_sums' shape."""
+        return {"districts": self.manifest["district_sums"], "total": self.manifest["total_sums"]}
+
+    def iter_parts(self) -> Iterator[dict[str, np.ndarray]]:
+        for part in self.manifest["parts"]:
+            with np.load(os.path.join(self.store_dir, part)) as data:
+                yield dict(data)
+
+    def iter_features(
+        self, split: dict, fraction: float = 1.0,
+    ) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Per part: (X, y, district codes, test mask), rank_quan filled from the district sums.
+
+        A row is in the test split when the hash of its CSV row number (seeded
+        with split["random_state"]) is below split["test_size"]; `fraction` < 1
+        keeps an independently hashed sample of the rows.
+        """
+        rank = np.array([*(self.rank_map[d] for d in self.manifest["districts"]), np.nan])  # code -1 -> NaN
+        seed = split["random_state"]
+        for part in self.iter_parts():
+            X, y, codes, rows = part["X"], part["gia"], part["quan"], part["row"]
+            if fraction < 1:
+                keep = _row_uniform(rows, seed + 1) < fraction
+                X, y, codes, rows = X[keep], y[keep], codes[keep], rows[keep]
+            X[:, _FEATURE_INDEX["rank_quan"]] = rank[codes]
+            yield X, y, codes, hashed_test_mask(rows, split)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Cleaned listings with the same columns/dtypes/index as load_and_clean."""
+        parts = list(self.iter_parts())
+        if not parts:
+            return pd.DataFrame(columns=["gia", "gia_m2", "dien_tich", "noi_that", "phap_ly", "so_phong", "so_wc", "quan", "khoang_cach_q1_km"])
+        data = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+        def labels(codes: np.ndarray, vocab: list[str]) -> pd.Categorical:
+            values = np.where(codes >= 0, np.asarray(vocab, dtype=object)[codes], np.nan)
+            return pd.Categorical(values, categories=sorted({v for v in values if isinstance(v, str)}))
+
+        return pd.DataFrame(
+            {
+                "gia": data["gia"],
+                "gia_m2": data["gia_m2"],
+                "dien_tich": data["dien_tich"],
+                "noi_that": labels(data["noi_that"], NOI_THAT_LABELS),
+                "phap_ly": labels(data["phap_ly"], PHAP_LY_LABELS),
+                "so_phong": data["so_phong"],
+                "so_wc": data["so_wc"],
+                "quan": labels(data["quan"], self.manifest["districts"]),
+                "khoang_cach_q1_km": data["khoang_cach_q1_km"],
+            },
+            index=pd.Index(data["row"]),
+        )
+
+
+def default_store_dir(csv_path: str) -> str:
+    """Store directory keyed by the typed CSV (typed_cache_key), STORE_FORMAT and FEATURE_COLS."""
+    key = hashlib.sha256(json.dumps([typed_cache_key(csv_path), STORE_FORMAT, FEATURE_COLS]).encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(DEFAULT_CACHE_DIR, f"{name}.{key}.features")
+
+
+def train_xgb_from_store(store: FeatureStore, params: dict, split: dict, cache_dir: str) -> XGBRegressor:
+    """Fit an XGBRegressor on the store's training rows through an external-memory DMatrix.
+
+    xgboost pulls the parts through a DataIter and pages them to `cache_dir`
+    (removed afterwards), so only one part is in memory at a time.
+    """
+    import xgboost
+
+    class Parts(xgboost.DataIter):
+        def __init__(self):
+            self._parts = store.iter_features(split)
+            super().__init__(cache_prefix=os.path.join(cache_dir, "dtrain"))
+
+        def next(self, input_data) -> int:
+            for X, y, _, test in self._parts:
+                if not test.all():
+                    input_data(data=X[~test], label=y[~test], feature_names=FEATURE_COLS)
+                    return 1
+            return 0
+
+        def reset(self) -> None:
+            self._parts = store.iter_features(split)
+
+    model = new_model("xgb", params)
+    if XGB_NTHREAD > 0:
+        model.set_params(n_jobs=XGB_NTHREAD)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(cache_dir)
+    try:
+        dtrain = xgboost.DMatrix(Parts())
+        booster = xgboost.train(model.get_xgb_params(), dtrain, num_boost_round=params["n_estimators"] or 100)
+        del dtrain
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    fitted = xgboost.XGBRegressor(**model.get_params())
+    fitted.load_model(bytearray(booster.save_raw("ubj")))
+    return fitted
+
+
+def store_r2(model: XGBRegressor, store: FeatureStore, split: dict) -> float:
+    """Test R² over the store's test rows, one part at a time (Chan's parallel variance)."""
+    booster = model.get_booster()
+    n = mean = m2 = sse = 0.0
+    for X, y, _, test in store.iter_features(split):
+        y = y[test]
+        if not len(y):
+            continue
+        sse += float(np.sum((y - booster.inplace_predict(X[test])) ** 2))
+        k, k_mean = len(y), float(y.mean())
+        delta = k_mean - mean
+        m2 += float(np.sum((y - k_mean) ** 2)) + delta**2 * n * k / (n + k)
+        mean += delta * k / (n + k)
+        n += k
+    return 1.0 - sse / m2
+
+
+class StreamingSession:
+    """TrainingSession counterpart over a feature store (TRAIN_CHUNKSIZE > 0).
+
+    Offers what build_artifact reads from a TrainingSession without an
+    in-memory feature matrix: the serving XGBoost is fitted from the store
+    (train_xgb_from_store), LR / Ridge / RF on a hashed sample of at most
+    TRAIN_COMPARISON_ROWS rows, and the stats come from the manifest's running
+    sums. df_clean, the listings the artifact serves, is assembled on first use.
+    """
+
+    def __init__(
+        self, csv_path: str, chunksize: int = DEFAULT_CHUNKSIZE, params: dict = MODEL_PARAMS,
+        store_dir: Optional[str] = None,
+    ):
+        start = time.perf_counter()
+        self.params = params
+        self.store = build_feature_store(csv_path, store_dir or default_store_dir(csv_path), chunksize)
+        self.seconds = {"clean": time.perf_counter() - start}  # chunked read + clean + encode
+        manifest = self.store.manifest
+        self.cleaning = {key: manifest[key] for key in ("so_wc_median", "bounds")}
+        self.source_rows = manifest["source_rows"]
+        self.rank_map = self.store.rank_map
+        self.models: dict = {}
+        self.fit_seconds: dict[str, float] = {}
+        self._r2: Optional[float] = None
+
+    @cached_property
+    def df_clean(self) -> pd.DataFrame:
+        return self.store.to_frame()
+
+    def listing_sums(self) -> dict:
+        return self.store.listing_sums()
+
+    def serving_model(self) -> tuple[XGBRegressor, float]:
+        """The XGBoost model served by the API (fitted from the store once) and its test R²."""
+        if "xgb" not in self.models:
+            start = time.perf_counter()
+            cache_dir = os.path.join(self.store.store_dir, "xgb-cache")
+            self.models["xgb"] = train_xgb_from_store(self.store, self.params["xgb"], self.params["split"], cache_dir)
+            self.fit_seconds["xgb"] = time.perf_counter() - start
+            self._r2 = store_r2(self.models["xgb"], self.store, self.params["split"])
+        return self.models["xgb"], self._r2
+
+    def comparison(self) -> dict:
+        """Comparison table on the hashed sample: LR / Ridge / RF fitted on it, all four scored on it."""
+        model, _ = self.serving_model()
+        fraction = min(1.0, TRAIN_COMPARISON_ROWS / max(1, self.store.manifest["rows"]))
+        parts = list(self.store.iter_features(self.params["split"], fraction))
+        X = pd.DataFrame(np.concatenate([p[0] for p in parts]), columns=FEATURE_COLS)
+        y = np.concatenate([p[1] for p in parts])
+        codes = np.concatenate([p[2] for p in parts])
+        test = np.concatenate([p[3] for p in parts])
+        pending = {key: new_model(key, self.params.get(key)) for key in MODEL_NAMES if key != "xgb"}
+        for key, mdl, seconds in fit_models(pending, X[~test], y[~test]):
+            self.models[key] = mdl
+            self.fit_seconds[key] = seconds
+        sums = self.store.manifest["district_sums"]
+        district_avg = np.array([*(sums[d]["gia"] / sums[d]["count"] for d in self.store.manifest["districts"]), np.nan])
+        return comparison_payload(self.models, self.fit_seconds, X[test], y[test], district_avg[codes[test]])
+
+    def xgb_report(self) -> dict:
+        """TrainingSession.xgb_report of the external-memory fit (no early stopping or QuantileDMatrix)."""
+        model, r2 = self.serving_model()
+        return {
+            "options": {
+                **xgb_options(), "early_stopping_rounds": 0, "validation_fraction": None,
+                "quantile_dmatrix": False, "external_memory": True,
+            },
+            "trees": model.get_booster().num_boosted_rounds(),
+            "max_trees": self.params["xgb"]["n_estimators"],
+            "seconds": round(self.fit_seconds["xgb"], 3),
+            "r2": round(float(r2), 4),
+        }
+
+
+def load_and_clean_streaming(
+    csv_path: str, chunksize: int = DEFAULT_CHUNKSIZE, store_dir: Optional[str] = None,
+) -> pd.DataFrame:
+    """Drop-in replacement for model.load_and_clean that never holds the raw CSV in memory."""
+    return build_feature_store(csv_path, store_dir or default_store_dir(csv_path), chunksize).to_frame()
@@ -0,0 +1,288 @@
+"""Synthetic apartment listings for scale testing, learned from the real CSV.
+
+Per district, the modelled columns (gia, dien_tich, khoang_cach_q1_km,
+so_phong, so_wc, phap_ly, noi_that) are sampled from a Gaussian copula:
+
+- marginals are the district's empirical distributions (linear interpolation
+  between observed values for the continuous columns, observed values only
+  for the discrete ones), so skew, outliers and code frequencies carry over;
+- dependence reproduces the district's Spearman rank correlations (shrunk
+  towards the all-district ones for districts with few listings): the latent
+  normal correlation of each column pair is calibrated by simulation so that,
+  after the discrete marginals introduce ties, the sampled rank correlation
+  matches the observed one (NORTA).
+
+phap_ly / noi_that are nominal codes with NaN as a level of its own; their
+levels are ordered by mean gia_m2 so the copula can express "better legal
+status, higher price". Missing so_wc (and any other missing numeric value) is
+re-drawn at the district's missing rate. District shares follow the source.
+
+The remaining columns are copied from a random real listing of the same
+district (project, street, ward, coordinates, date, seller, ...), while
+gia_m2, gia_hien_thi, tieu_de and link are derived from the sampled values, so
+output files have exactly the source header and dtypes. Files are written in
+chunks (CSV, or Parquet row groups with pyarrow), so any size fits in memory.
+
+Usage (from backend/):
+    python synthetic.py --rows 1000000 --out data/.cache/listings-1m.csv [--format parquet] [--seed 0]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+from scipy.stats import rankdata
+
+CONTINUOUS = ("gia", "dien_tich", "khoang_cach_q1_km")
+ORDINAL = ("so_phong", "so_wc")
+NOMINAL = ("phap_ly", "noi_that")  # NaN is a level
+MODELLED = (*CONTINUOUS, *ORDINAL, *NOMINAL)
+# Recomputed from the sampled values rather than copied
+DERIVED = ("gia_m2", "gia_hien_thi", "tieu_de", "link")
+# Districts with this many listings get half their own rank correlations, half the pooled ones
+SHRINKAGE_ROWS = 50
+# Simulated draws and bisection steps per column pair when calibrating the copula
+CALIBRATION_DRAWS = 4000
+CALIBRATION_STEPS = 14
+DEFAULT_CHUNK_ROWS = 200_000
+
+
+def _spearman(frame: pd.DataFrame) -> np.ndarray:
+    """Rank correlation over pairwise complete rows; 0 where a column is constant."""
+    corr = frame.corr("spearman").to_numpy()
+    corr = np.nan_to_num(corr)
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+def _latent_correlation(
+    target: float, x: np.ndarray, y: np.ndarray, method_y: str, z1: np.ndarray, z2: np.ndarray,
+) -> float:
+    """Normal correlation whose copula sample has rank correlation `target` (NORTA).
+
+    x holds the ranks of the first column's sample for z1; the second column is
+    sampled from rho * z1 + sqrt(1 - rho²) * z2 through its marginal `y`. The
+    rank correlation grows monotonically with rho, so bisection finds it; the
+    same draws are reused for every step. Ties in discrete columns make the
+    rank correlation smaller than rho, which is why it cannot be used directly.
+    """
+    def achieved(rho: float) -> float:
+        sample = np.quantile(y, ndtr(rho * z1 + np.sqrt(1 - rho * rho) * z2), method=method_y)
+        return float(np.corrcoef(x, rankdata(sample))[0, 1])
+
+    lo, hi = -1.0, 1.0
+    for _ in range(CALIBRATION_STEPS):
+        mid = (lo + hi) / 2
+        if achieved(mid) < target:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def _calibrate(target: np.ndarray, values: list[np.ndarray], rng: np.random.Generator) -> np.ndarray:
+    """Latent correlation matrix reproducing the target rank correlations under these marginals."""
+    methods = ["linear" if col in CONTINUOUS else "inverted_cdf" for col in MODELLED]
+    z = rng.standard_normal((CALIBRATION_DRAWS, 2))
+    latent = np.eye(len(MODELLED))
+    for i in range(len(MODELLED)):
+        if len(np.unique(values[i])) < 2:
+            continue
+        x = rankdata(np.quantile(values[i], ndtr(z[:, 0]), method=methods[i]))
+        for j in range(i + 1, len(MODELLED)):
+            if len(np.unique(values[j])) < 2:
+                continue
+            latent[i, j] = latent[j, i] = _latent_correlation(target[i, j], x, values[j], methods[j], z[:, 0], z[:, 1])
+    return latent
+
+
+def _cholesky(corr: np.ndarray) -> np.ndarray:
+    """Cholesky factor, clipping negative eigenvalues if corr is not quite PSD."""
+    try:
+        return np.linalg.cholesky(corr)
+    except np.linalg.LinAlgError:
+        eigenvalues, vectors = np.linalg.eigh(corr)
+        fixed = vectors @ np.diag(np.clip(eigenvalues, 1e-6, None)) @ vectors.T
+        scale = np.sqrt(np.diag(fixed))
+        return np.linalg.cholesky(fixed / np.outer(scale, scale))
+
+
+@dataclass
+class DistrictModel:
+    share: float
+    chol: np.ndarray  # Cholesky factor of the normal-score correlation (MODELLED order)
+    values: list[np.ndarray]  # sorted non-missing values per MODELLED column
+    missing: np.ndarray  # missing rate per MODELLED column
+    context: pd.DataFrame  # copied columns of the district's real listings
+
+    def sample(self, n: int, rng: np.random.Generator) -> dict[str, np.ndarray]:
+        u = ndtr(rng.standard_normal((n, len(MODELLED))) @ self.chol.T)
+        out = {}
+        for j, col in enumerate(MODELLED):
+            values = self.values[j]
+            if not len(values):
+                out[col] = np.full(n, np.nan)
+                continue
+            method = "linear" if col in CONTINUOUS else "inverted_cdf"
+            column = np.quantile(values, u[:, j], method=method)
+            if self.missing[j]:
+                column = np.where(rng.random(n) < self.missing[j], np.nan, column)
+            out[col] = column
+        return out
+
+
+@dataclass
+class ListingModel:
+    """Per-district copulas plus everything needed to write schema-identical rows."""
+
+    columns: list[str]
+    dtypes: dict[str, np.dtype]
+    levels: dict[str, list[float]]  # nominal column -> codes by rank (NaN included)
+    districts: dict[str, DistrictModel]
+
+    @classmethod
+    def fit(cls, csv_path: str, seed: int = 0) -> ListingModel:
+        rng = np.random.default_rng(seed)  # calibration draws
+        raw = pd.read_csv(csv_path, encoding="utf-8-sig")
+        raw = raw[raw["quan"].notna()].reset_index(drop=True)
+        gia_m2 = raw["gia"] / raw["dien_tich"]
+
+        levels, encoded = {}, raw[list(MODELLED)].astype("float64")
+        for col in NOMINAL:
+            key = raw[col].fillna(-1)  # NaN -> its own level
+            order = gia_m2.groupby(key).mean().sort_values().index
+            levels[col] = [np.nan if code == -1 else float(code) for code in order]
+            encoded[col] = key.map({code: rank for rank, code in enumerate(order)}).astype("float64")
+
+        pooled = _spearman(encoded)
+        context_cols = [c for c in raw.columns if c not in (*MODELLED, *DERIVED)]
+        districts = {}
+        for name, rows in encoded.groupby(raw["quan"], sort=True):
+            weight = len(rows) / (len(rows) + SHRINKAGE_ROWS)
+            target = weight * _spearman(rows) + (1 - weight) * pooled if len(rows) > 2 else pooled
+            values = [np.sort(rows[c].dropna().to_numpy()) for c in MODELLED]
+            districts[name] = DistrictModel(
+                share=len(rows) / len(raw),
+                chol=_cholesky(_calibrate(target, values, rng)),
+                values=values,
+                missing=rows[list(MODELLED)].isna().mean().to_numpy(),
+                context=raw.loc[rows.index, context_cols].reset_index(drop=True),
+            )
+        return cls(list(raw.columns), raw.dtypes.to_dict(), levels, districts)
+
+    def sample(self, n: int, rng: np.random.Generator, first_id: int = 0) -> pd.DataFrame:
+        """n listings with the source columns and dtypes; first_id numbers their links."""
+        names = list(self.districts)
+        counts = rng.multinomial(n, [self.districts[name].share for name in names])
+        parts = []
+        for name, count in zip(names, counts):
+            if not count:
+                continue
+            district = self.districts[name]
+            part = district.context.iloc[rng.integers(len(district.context), size=count)].reset_index(drop=True)
+            for col, values in district.sample(count, rng).items():
+                part[col] = values
+            part["quan"] = name
+            parts.append(part)
+        df = pd.concat(parts, ignore_index=True).iloc[rng.permutation(n)].reset_index(drop=True)
+
+        for col in NOMINAL:
+            df[col] = np.asarray(self.levels[col])[df[col].to_numpy(dtype=np.int64)]
+        gia = df["gia"].to_numpy()
+        df["gia"] = np.where(gia >= 1e9, np.round(gia, -7), np.round(gia, -6))  # display precision of the source
+        df["dien_tich"] = df["dien_tich"].round(1)
+        df["khoang_cach_q1_km"] = df["khoang_cach_q1_km"].round(2)
+        df["gia_m2"] = df["gia"] / df["dien_tich"] / 1e6
+        df["gia_hien_thi"] = [_display_price(v) for v in df["gia"].to_numpy()]
+        df["tieu_de"] = [
+            f"Bán căn hộ {rooms:.0f}PN {area:g}m2 {project if isinstance(project, str) else district}"
+            for rooms, area, project, district in zip(df["so_phong"], df["dien_tich"], df["ten_du_an"], df["quan"])
+        ]
+        df["link"] = [f"https://synthetic.invalid/{i}.htm" for i in range(first_id, first_id + n)]
+        return df[self.columns].astype(self.dtypes)
+
+    def chunks(self, rows: int, seed: int = 0, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """`rows` listings in chunks of at most chunk_rows; deterministic for a given seed and chunk size."""
+        rng = np.random.default_rng(seed)
+        for start in range(0, rows, chunk_rows):
+            yield self.sample(min(chunk_rows, rows - start), rng, first_id=start)
+
+
+def _display_price(gia: float) -> str:
+    """'3,68 tỷ' / '850 triệu', like the source's gia_hien_thi."""
+    if gia >= 1e9:
+        return f"{gia / 1e9:.2f}".rstrip("0").rstrip(".").replace(".", ",") + " tỷ"
+    return f"{gia / 1e6:.0f} triệu"
+
+
+def write_listings(
+    model: ListingModel, rows: int, path: str, fmt: Optional[str] = None,
+    seed: int = 0, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> str:
+    """Stream `rows` synthetic listings to a CSV or Parquet file (atomic rename). Returns path."""
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "csv")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".synthetic-", dir=directory)
+    os.close(fd)
+    try:
+        if fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+            writer = None
+            try:
+                for chunk in model.chunks(rows, seed, chunk_rows):
+                    table = pa.Table.from_pandas(chunk, schema=writer and writer.schema, preserve_index=False)
+                    writer = writer or pq.ParquetWriter(tmp, table.schema)
+                    writer.write_table(table)
+            finally:
+                if writer is not None:
+                    writer.close()
+        elif fmt == "csv":
+            with open(tmp, "w", encoding="utf-8-sig", newline="") as f:  # BOM like the source export
+                for i, chunk in enumerate(model.chunks(rows, seed, chunk_rows)):
+                    chunk.to_csv(f, header=i == 0, index=False)
+        else:
+            raise ValueError(f"Unknown format {fmt!r} (expected 'csv' or 'parquet')")
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return path
+
+
+def main() -> None:
+    from artifacts import DEFAULT_CSV_PATH
+
+    parser = argparse.ArgumentParser(description="Generate synthetic apartment listings")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--out", required=True, help="Output .csv or .parquet file")
+    parser.add_argument("--format", choices=("csv", "parquet"), help="Default: from the --out extension")
+    parser.add_argument("--source-csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = ListingModel.fit(args.source_csv)
+    write_listings(model, args.rows, args.out, args.format, args.seed, args.chunk_rows)
+    print(
+        f"Wrote {args.rows} listings ({len(model.districts)} districts) to {args.out}"
+        f" ({os.path.getsize(args.out) / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
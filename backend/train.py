@@ -0,0 +1,92 @@
+"""Build model artifacts offline so API workers start without retraining.
+
+Usage:
+    python train.py [--csv data/apartments.csv] [--artifact-dir artifacts] [--force | --incremental] [--grid]
+    python train.py --tune [--tune-models xgb rf] [--strategy halving] [--trials 20] [--folds 5] [--space space.json]
+
+The built version is published to <artifact-dir>/LATEST, which running API
+workers started with RELOAD_WATCH_INTERVAL load without a restart. --grid also
+precomputes the prediction grid (grid.py) for that version if it has none yet;
+it is written before LATEST moves, so reloading workers pick up both together.
+
+--tune first searches hyperparameters for XGBoost and RF with k-fold
+cross-validation (tuning.py) and stores the best in <artifact-dir>/TUNED; the
+artifact built right after, and every later one in that directory, uses them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+
+from artifacts import (
+    DEFAULT_ARTIFACT_DIR, DEFAULT_CSV_PATH, TUNED_FILE, load_artifact, load_or_build, publish_latest, publish_tuned,
+    read_latest, read_tuned,
+)
+from grid import build_grid, save_grid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train models and write a versioned artifact.")
+    parser.add_argument("--csv", default=os.environ.get("APARTMENTS_CSV", DEFAULT_CSV_PATH), help="Input listings CSV")
+    parser.add_argument("--artifact-dir", default=os.environ.get("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR), help="Artifact store directory")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--force", action="store_true", help="Retrain even if a matching artifact exists")
+    mode.add_argument("--incremental", action="store_true", help="Continue the LATEST artifact on rows appended to the CSV")
+    parser.add_argument("--grid", action="store_true", help="Also precompute the prediction grid (grid.py) if missing")
+    tuning = parser.add_argument_group("hyperparameter search (tuning.py; defaults from the TUNE_* variables)")
+    tuning.add_argument("--tune", action="store_true", help="Tune XGBoost/RF with k-fold CV before building")
+    tuning.add_argument("--tune-models", nargs="+", choices=["xgb", "rf"], default=["xgb", "rf"])
+    tuning.add_argument("--strategy", choices=["halving", "random"])
+    tuning.add_argument("--trials", type=int, help="Candidate configs per model")
+    tuning.add_argument("--folds", type=int, help="Cross-validation folds")
+    tuning.add_argument("--space", help="JSON file replacing the search space of the models it lists")
+    args = parser.parse_args()
+
+    if args.tune:
+        import tuning as tuner
+
+        spaces = dict(tuner.SEARCH_SPACES)
+        if args.space:
+            with open(args.space, encoding="utf-8") as f:
+                spaces.update(json.load(f))
+        tuned = tuner.tune(
+            args.csv, tuple(args.tune_models), spaces, args.strategy or tuner.TUNE_STRATEGY,
+            args.trials or tuner.TUNE_TRIALS, args.folds or tuner.TUNE_FOLDS,
+        )
+        previous = read_tuned(args.artifact_dir)
+        if previous is not None:  # keep the tuned params of models not re-tuned this time
+            tuned["params"] = {**previous["params"], **tuned["params"]}
+            tuned["cv"]["models"] = {**previous["cv"]["models"], **tuned["cv"]["models"]}
+        publish_tuned(tuned, args.artifact_dir)
+        print(f"Tuned in {tuned['cv']['seconds']:.1f}s, saved to {os.path.join(args.artifact_dir, TUNED_FILE)}")
+
+    start = time.perf_counter()
+    latest = read_latest(args.artifact_dir) if args.incremental else None
+    base = load_artifact(latest, args.artifact_dir) if latest else None
+    artifact, built = load_or_build(args.csv, args.artifact_dir, force=args.force, base=base)
+    elapsed = time.perf_counter() - start
+    action = f"Built ({artifact.training['mode']})" if built else "Up to date:"
+    print(f"{action} artifact {artifact.version} in {elapsed:.2f}s (R² = {artifact.r2:.4f}, rows = {len(artifact.df_clean)})")
+    if built and artifact.training["mode"] == "incremental":
+        appended = artifact.training["appended"]
+        print(
+            f"Incremental step {artifact.training['steps']} on {artifact.training['parent']}: "
+            f"+{appended['rows']} rows ({appended['cleaned']} after cleaning)"
+        )
+    if args.grid and artifact.grid is None:
+        grid_start = time.perf_counter()
+        grid = build_grid(artifact)
+        save_grid(grid, args.artifact_dir)
+        print(
+            f"Built prediction grid in {time.perf_counter() - grid_start:.2f}s: {grid.prices.shape} "
+            f"({(grid.prices.nbytes + grid.error.nbytes) / 2**20:.1f} MiB)"
+        )
+    publish_latest(artifact.version, args.artifact_dir)  # running workers with RELOAD_WATCH_INTERVAL pick it up
+    print(f"Path: {os.path.join(args.artifact_dir, artifact.version)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Hyperparameter search with k-fold cross-validation for the XGBoost and RF models.
+
+`train.py --tune` runs it on the training split of the CSV; the held-out test
+split stays untouched and still gives the artifact's R².
+
+1. The training rows are split into TUNE_FOLDS folds once. Each fold's feature
+   matrices are engineered once (rank_quan target-encoded from that fold's
+   training rows only) and cached as .npy files under data/.cache, which every
+   trial memory-maps instead of recomputing them.
+2. Candidate configs are drawn at random from SEARCH_SPACES (or a JSON file of
+   the same shape); the model.py defaults are always candidate 0.
+3. "random": every candidate is scored on all folds. "halving" (successive
+   halving): every candidate starts with a small n_estimators budget, and after
+   each rung only the best 1/TUNE_ETA go on, with TUNE_ETA times the budget.
+4. Trials (candidate x fold) fan out over a loky process pool, with the cores
+   split between concurrent fits like model.fit_models. XGBoost trials hold
+   out TUNE_VALIDATION_FRACTION of the fold's training rows and stop early
+   once their RMSE has not improved for TUNE_EARLY_STOPPING rounds, so the
+   validation fold that scores the trial stays unseen; the winner's
+   n_estimators becomes the mean best iteration over its folds, so the final
+   fit needs no validation set. With XGB_QUANTILE_DMATRIX=1 each worker builds
+   one QuantileDMatrix pair per fold and reuses it for every candidate.
+
+The best config per model (highest mean R² over the folds, the defaults if
+nothing beats them) is written to <artifact_dir>/TUNED (artifacts.publish_tuned),
+and every later artifact in that directory is trained with it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset import DEFAULT_CACHE_DIR, file_sha256, typed_cache_key
+from model import (
+    FEATURE_COLS, MODEL_PARAMS, XGB_QUANTILE_DMATRIX, TrainingSession, engineer_features, new_model, train_xgb, xgb_matrices,
+)
+
+# Cross-validation folds over the training split
+TUNE_FOLDS = int(os.environ.get("TUNE_FOLDS", "5"))
+# Candidate configs per model, including the model.py defaults
+TUNE_TRIALS = int(os.environ.get("TUNE_TRIALS", "20"))
+# "halving" (successive halving on n_estimators) or "random" (every candidate at full budget)
+TUNE_STRATEGY = os.environ.get("TUNE_STRATEGY", "halving")
+# Successive halving: keep the best 1/ETA candidates per rung, multiply their budget by ETA
+TUNE_ETA = int(os.environ.get("TUNE_ETA", "3"))
+# XGBoost trials stop after this many rounds without improvement on an inner hold-out; 0 = off
+TUNE_EARLY_STOPPING = int(os.environ.get("TUNE_EARLY_STOPPING", "20"))
+# Share of each fold's training rows held out for that early stopping (never the scored fold)
+TUNE_VALIDATION_FRACTION = float(os.environ.get("TUNE_VALIDATION_FRACTION", "0.1"))
+# Concurrent trials; -1 = one per CPU
+TUNE_N_JOBS = int(os.environ.get("TUNE_N_JOBS", "-1"))
+TUNE_SEED = int(os.environ.get("TUNE_SEED", "42"))
+
+# Per model: param -> ["int", lo, hi] | ["uniform", lo, hi] | ["log", lo, hi] | ["choice", [options]].
+# n_estimators is also the successive-halving budget (its hi is the last rung's budget).
+SEARCH_SPACES = {
+    "xgb": {
+        "n_estimators": ["int", 100, 1000],
+        "learning_rate": ["log", 0.02, 0.3],
+        "max_depth": ["int", 3, 10],
+        "min_child_weight": ["log", 1, 20],
+        "subsample": ["uniform", 0.6, 1.0],
+        "colsample_bytree": ["uniform", 0.6, 1.0],
+        "reg_lambda": ["log", 0.1, 10],
+    },
+    "rf": {
+        "n_estimators": ["int", 100, 500],
+        "max_depth": ["choice", [None, 8, 12, 16, 24]],
+        "min_samples_leaf": ["int", 1, 10],
+        "max_features": ["choice", [1.0, 0.5, "sqrt"]],
+    },
+}
+MIN_BUDGET = 10
+
+
+def sample_params(space: dict, rng: np.random.Generator) -> dict:
+    """One random config from a search space (floats rounded to 4 significant digits)."""
+    params = {}
+    for name, (kind, *args) in space.items():
+        if kind == "int":
+            params[name] = int(rng.integers(args[0], args[1] + 1))
+        elif kind == "uniform":
+            params[name] = float(f"{rng.uniform(args[0], args[1]):.4g}")
+        elif kind == "log":
+            params[name] = float(f"{math.exp(rng.uniform(math.log(args[0]), math.log(args[1]))):.4g}")
+        elif kind == "choice":
+            params[name] = args[0][rng.integers(len(args[0]))]
+        else:
+            raise ValueError(f"Unknown search space kind {kind!r} for {name}")
+    return params
+
+
+def halving_budgets(candidates: int, max_budget: int, eta: int) -> list[int]:
+    """n_estimators per rung: enough rungs to narrow `candidates` down to about one."""
+    rungs = int(math.log(candidates, eta) + 1e-9) + 1 if candidates > 1 else 1
+    return [max(MIN_BUDGET, round(max_budget / eta ** (rungs - 1 - i))) for i in range(rungs)]
+
+
+# --- Fold cache ---
+FOLD_ARRAYS = ("X_train", "y_train", "X_val", "y_val")
+# Bump when _fold_arrays changes what it writes, so stale fold caches are ignored
+FOLD_FORMAT = 1
+
+
+def fold_cache_dir(csv_path: str, folds: int, seed: int) -> str:
+    """Fold cache keyed by the typed CSV (typed_cache_key), split, folds, seed, FEATURE_COLS and FOLD_FORMAT."""
+    key = [typed_cache_key(csv_path), MODEL_PARAMS["split"], folds, seed, FEATURE_COLS, FOLD_FORMAT]
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(DEFAULT_CACHE_DIR, f"{name}.folds-{hashlib.sha256(json.dumps(key).encode()).hexdigest()[:16]}")
+
+
+def _fold_arrays(train: pd.DataFrame, val: pd.DataFrame) -> dict[str, np.ndarray]:
+    """Feature matrices of one fold, rank_quan encoded from the fold's training rows only."""
+    rank_map = train.groupby("quan", observed=True)["gia_m2"].mean().to_dict()
+    fallback = float(np.median(list(rank_map.values())))  # like ServingState.fallback_rank
+    arrays = {}
+    for part, rows in (("train", train), ("val", val)):
+        X, y, _ = engineer_features(rows, rank_map)
+        X["rank_quan"] = X["rank_quan"].fillna(fallback)
+        arrays[f"X_{part}"] = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+        arrays[f"y_{part}"] = y.to_numpy(dtype=np.float64)
+    return arrays
+
+
+def prepare_folds(df_train: pd.DataFrame, cache_dir: str, folds: int = TUNE_FOLDS, seed: int = TUNE_SEED) -> list[str]:
+    """Engineer and cache every fold (once per CSV / fold count / seed). Returns the fold directories."""
+    paths = [os.path.join(cache_dir, f"fold{k}") for k in range(folds)]
+    if os.path.isdir(cache_dir):
+        return paths
+    from sklearn.model_selection import KFold
+
+    parent = os.path.dirname(cache_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".folds-", dir=parent)
+    try:
+        splits = KFold(folds, shuffle=True, random_state=seed).split(df_train)
+        for k, (train_pos, val_pos) in enumerate(splits):
+            os.makedirs(os.path.join(tmp, f"fold{k}"))
+            arrays = _fold_arrays(df_train.iloc[train_pos], df_train.iloc[val_pos])
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f"fold{k}", f"{name}.npy"), array)
+        os.rename(tmp, cache_dir)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(cache_dir):  # another process cached the same folds first -> fine
+            raise
+    return paths
+
+
+@lru_cache(maxsize=None)
+def _load_fold(path: str) -> tuple[np.ndarray, ...]:
+    """A cached fold, memory-mapped once per worker process."""
+    return tuple(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in FOLD_ARRAYS)
+
+
+@lru_cache(maxsize=None)
+def _early_stopping_rows(path: str) -> tuple[np.ndarray, ...]:
+    """(X_fit, y_fit, X_stop, y_stop): a fold's training rows split for early stopping."""
+    from sklearn.model_selection import train_test_split
+
+    X_train, y_train, _, _ = _load_fold(path)
+    fit, stop = train_test_split(np.arange(len(y_train)), test_size=TUNE_VALIDATION_FRACTION, random_state=TUNE_SEED)
+    return X_train[fit], y_train[fit], X_train[stop], y_train[stop]
+
+
+def _xgb_rows(path: str) -> tuple:
+    """Training rows of an XGBoost trial: (X, y, X_stop, y_stop), the last two None without early stopping."""
+    if TUNE_EARLY_STOPPING > 0:
+        return _early_stopping_rows(path)
+    X_train, y_train, _, _ = _load_fold(path)
+    return X_train, y_train, None, None
+
+
+@lru_cache(maxsize=None)
+def _fold_matrices(path: str, max_bin: Optional[int]) -> tuple:
+    """QuantileDMatrix pair of a fold's XGBoost training rows, built once per worker process and bin count."""
+    return xgb_matrices(*_xgb_rows(path), max_bin=max_bin)
+
+
+# --- Trials ---
+def run_trial(key: str, params: dict, fold: str, n_threads: int) -> dict:
+    """Fit one config on one fold. Returns its validation-fold R², trees used and fit seconds."""
+    from sklearn.metrics import r2_score
+    from threadpoolctl import threadpool_limits
+
+    X_train, y_train, X_val, y_val = _load_fold(fold)
+    model = new_model(key, params)
+    model.set_params(n_jobs=n_threads)
+    start = time.perf_counter()
+    with threadpool_limits(limits=n_threads):
+        if key == "xgb":
+            matrices = _fold_matrices(fold, params.get("max_bin")) if XGB_QUANTILE_DMATRIX else None
+            model = train_xgb(model, *_xgb_rows(fold), TUNE_EARLY_STOPPING, matrices)
+            trees = model.get_booster().num_boosted_rounds()  # cut to the best iteration when early-stopped
+        else:
+            model.fit(X_train, y_train)
+            trees = params["n_estimators"]
+        r2 = r2_score(y_val, model.predict(X_val))
+    return {"r2": float(r2), "trees": int(trees), "seconds": time.perf_counter() - start}
+
+
+def _score(key: str, configs: list[dict], folds: list[str], parallel, n_threads: int) -> list[dict]:
+    """Cross-validate every config (all trials in one parallel batch)."""
+    from joblib import delayed
+
+    results = parallel(delayed(run_trial)(key, params, fold, n_threads) for params in configs for fold in folds)
+    scored = []
+    for i, params in enumerate(configs):
+        runs = results[i * len(folds):(i + 1) * len(folds)]
+        r2 = [run["r2"] for run in runs]
+        scored.append({
+            "params": params,
+            "r2": float(np.mean(r2)),
+            "r2_std": float(np.std(r2)),
+            "trees": round(float(np.mean([run["trees"] for run in runs]))),
+            "seconds": sum(run["seconds"] for run in runs),
+        })
+    return scored
+
+
+def search(
+    key: str, folds: list[str], parallel, n_threads: int, space: dict,
+    strategy: str = TUNE_STRATEGY, trials: int = TUNE_TRIALS, eta: int = TUNE_ETA, seed: int = TUNE_SEED,
+) -> dict:
+    """Tune one model. Returns its best params and the cross-validation summary."""
+    if strategy not in ("halving", "random"):
+        raise ValueError(f"Unknown tuning strategy {strategy!r} (expected 'halving' or 'random')")
+    start = time.perf_counter()
+    defaults = MODEL_PARAMS[key]
+    rng = np.random.default_rng(seed)
+    candidates = [defaults] + [{**defaults, **sample_params(space, rng)} for _ in range(trials - 1)]
+
+    baseline = _score(key, [defaults], folds, parallel, n_threads)[0]  # reference at the default budget
+    evaluated = 1
+    rungs = []
+    if strategy == "random":
+        scored = _score(key, candidates[1:], folds, parallel, n_threads) + [baseline]
+        evaluated += len(candidates) - 1
+        rungs.append({"budget": None, "candidates": len(candidates), "best_r2": max(s["r2"] for s in scored)})
+    else:
+        budgets = halving_budgets(len(candidates), space["n_estimators"][2], eta)
+        for i, budget in enumerate(budgets):
+            scored = _score(key, [{**c, "n_estimators": budget} for c in candidates], folds, parallel, n_threads)
+            evaluated += len(candidates)
+            scored.sort(key=lambda s: s["r2"], reverse=True)
+            rungs.append({"budget": budget, "candidates": len(candidates), "best_r2": scored[0]["r2"]})
+            print(f"  {key} rung {i + 1}/{len(budgets)}: {len(candidates)} candidates x {budget} trees, best CV R² {scored[0]['r2']:.4f}")
+            if i < len(budgets) - 1:
+                candidates = [s["params"] for s in scored[:max(1, math.ceil(len(scored) / eta))]]
+        scored.append(baseline)
+
+    best = max(scored, key=lambda s: s["r2"])
+    params = dict(best["params"])
+    if key == "xgb" and TUNE_EARLY_STOPPING > 0:
+        params["n_estimators"] = best["trees"]  # early-stopped length, so the final fit needs no eval set
+    return {
+        "params": params,
+        "cv": {
+            "r2": round(best["r2"], 6),
+            "r2_std": round(best["r2_std"], 6),
+            "baseline_r2": round(baseline["r2"], 6),
+            "configs_evaluated": evaluated,
+            "rungs": rungs,
+            "seconds": round(time.perf_counter() - start, 2),
+        },
+    }
+
+
+def tune(
+    csv_path: str, keys: tuple[str, ...] = ("xgb", "rf"), spaces: Optional[dict] = None,
+    strategy: str = TUNE_STRATEGY, trials: int = TUNE_TRIALS, folds: int = TUNE_FOLDS,
+    n_jobs: int = TUNE_N_JOBS, seed: int = TUNE_SEED,
+) -> dict:
+    """Cross-validated search for each model in `keys`. Returns the TUNED record (see artifacts.publish_tuned)."""
+    from joblib import Parallel
+
+    start = time.perf_counter()
+    spaces = spaces or SEARCH_SPACES
+    session = TrainingSession(csv_path)
+    df_train = session.df_clean.loc[session.X_train.index]
+    fold_paths = prepare_folds(df_train, fold_cache_dir(csv_path, folds, seed), folds, seed)
+    print(f"Tuning {', '.join(keys)} on {len(df_train)} training rows: {folds} folds, {strategy}, {trials} candidates")
+
+    cpus = os.cpu_count() or 1
+    workers = cpus if n_jobs < 1 else min(n_jobs, cpus)
+    n_threads = max(1, cpus // workers)
+    results = {}
+    with Parallel(n_jobs=workers, backend="loky") as parallel:
+        for key in keys:
+            results[key] = search(key, fold_paths, parallel, n_threads, spaces[key], strategy, trials, TUNE_ETA, seed)
+            cv = results[key]["cv"]
+            print(
+                f"{key}: CV R² {cv['baseline_r2']:.4f} (defaults) -> {cv['r2']:.4f} ± {cv['r2_std']:.4f} "
+                f"({cv['configs_evaluated']} configs in {cv['seconds']:.1f}s): {results[key]['params']}"
+            )
+    return {
+        "params": {key: result["params"] for key, result in results.items()},
+        "cv": {
+            "strategy": strategy, "folds": folds, "trials": trials, "seed": seed,
+            "early_stopping": {"rounds": TUNE_EARLY_STOPPING, "validation_fraction": TUNE_VALIDATION_FRACTION},
+            "models": {key: result["cv"] for key, result in results.items()},
+            "seconds": round(time.perf_counter() - start, 2),
+        },
+        "source": {"sha256": file_sha256(csv_path), "rows": len(df_train)},
+        "created_at": time.time(),
+    }
@@ -43,7 +43,7 @@ export interface PredictionResult {
 }
 
 export interface ModelComparisonResponse {
-  metrics: { name: string; r2: number; rmse: number; mae: number }[];
+  metrics: { name: string; r2: number; rmse: number; mae: number; fit_seconds: number }[];
   predictions: { actual: number; lr: number; ridge: number; rf: number; xgb: number }[];
   direction_accuracy: { name: string; accuracy: number }[];
   feature_importance: { feature: string; rf: number; xgb: number }[];